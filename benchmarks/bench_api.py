@@ -0,0 +1,231 @@
+"""
+bench_api.py
+Load test of the serving API's /predict: closed-loop clients at each
+concurrency level send JSON batches of each size for a fixed time, and the
+throughput and p50/p95/p99 latency of every (batch size, concurrency) cell
+are printed and saved as JSON (with the git commit) to diff across commits.
+
+The app runs in this process (httpx over ASGI, no sockets) or under uvicorn
+in a child process (real HTTP, --server-workers processes). Either way no
+external services are needed: the model comes from src/models/registry.json.
+The prediction cache is off unless --cache, so every row hits the model.
+
+    python benchmarks/bench_api.py [--mode inprocess|uvicorn] [--batch-sizes 1 16 256 4096]
+                                   [--concurrency 1 8 32] [--duration 5] [--compare old.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+FEATURES_PATH = ROOT / "data" / "features" / "features.parquet"
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+BATCH_SIZES = (1, 16, 256, 4096)
+CONCURRENCY = (1, 8, 32)
+# distinct request bodies per cell, capped so the pre-serialized pool stays around 64k rows
+PAYLOAD_ROWS = 65_536
+MAX_PAYLOADS = 64
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="/predict load test")
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=list(BATCH_SIZES))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=list(CONCURRENCY))
+    parser.add_argument("--duration", type=float, default=5.0, help="Timed seconds per cell")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Untimed seconds before each cell")
+    parser.add_argument("--server-workers", type=int, default=1, help="uvicorn --workers")
+    parser.add_argument("--cache", action="store_true", help="Keep the prediction cache on (repeated rows hit it)")
+    parser.add_argument("--output", help="Results JSON (default benchmarks/results/bench_api-<commit>-<mode>.json)")
+    parser.add_argument("--compare", help="Earlier results JSON to print the change against")
+    return parser.parse_args()
+
+
+# --------- Payloads ---------
+
+def make_payloads(features, batch_size, seed=0):
+    """Pre-serialized /predict bodies of batch_size rows sampled from the feature table,
+    so client-side JSON encoding is not part of the measured latency."""
+    rng = np.random.default_rng(seed)
+    n = max(1, min(MAX_PAYLOADS, PAYLOAD_ROWS // batch_size))
+    payloads = []
+    for _ in range(n):
+        rows = features.iloc[rng.integers(0, len(features), batch_size)]
+        payloads.append(json.dumps({"instances": rows.to_dict(orient="records")}).encode())
+    return payloads
+
+
+# --------- Load generation ---------
+
+def summarize(latencies, errors, elapsed, batch_size, concurrency):
+    latencies = np.asarray(latencies) * 1e3
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (np.nan,) * 3
+    return {
+        "batch_size": batch_size,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": elapsed,
+        "requests_per_s": len(latencies) / elapsed,
+        "rows_per_s": len(latencies) * batch_size / elapsed,
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "max_ms": float(latencies.max()) if len(latencies) else float("nan"),
+    }
+
+async def run_cell(client, payloads, batch_size, concurrency, duration, warmup=0.0):
+    """Closed loop: `concurrency` clients each send the next request as soon as the
+    previous one is answered. Only requests started after the warm-up are timed."""
+    latencies, errors = [], 0
+    loop = asyncio.get_running_loop()
+    timed_from = loop.time() + warmup
+    end = timed_from + duration
+    headers = {"content-type": "application/json"}
+
+    async def worker(offset):
+        nonlocal errors
+        i = offset
+        while (now := loop.time()) < end:
+            body = payloads[i % len(payloads)]
+            i += concurrency
+            res = await client.post("/predict", content=body, headers=headers)
+            if now < timed_from:
+                continue
+            if res.status_code != 200:
+                errors += 1
+                continue
+            latencies.append(loop.time() - now)
+
+    await asyncio.gather(*(worker(k) for k in range(concurrency)))
+    return summarize(latencies, errors, max(loop.time(), end) - timed_from, batch_size, concurrency)
+
+async def run_all(client, features, args):
+    results = []
+    print(f"{'batch':>6}{'conc':>6}{'req/s':>10}{'rows/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for batch_size in args.batch_sizes:
+        payloads = make_payloads(features, batch_size)
+        for concurrency in args.concurrency:
+            r = await run_cell(client, payloads, batch_size, concurrency, args.duration, args.warmup)
+            print(f"{batch_size:>6}{concurrency:>6}{r['requests_per_s']:>10.1f}{r['rows_per_s']:>12.0f}"
+                  f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['errors']:>8}")
+            results.append(r)
+    return results
+
+
+# --------- Servers ---------
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def bench_inprocess(features, args):
+    from src.api.app import app     # after the environment is set up in main()
+    limits = httpx.Limits(max_connections=None)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits, timeout=None) as client:
+        return await run_all(client, features, args)
+
+async def bench_uvicorn(features, args):
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "src.api.app:app", "--host", "127.0.0.1",
+                               "--port", str(port), "--workers", str(args.server_workers), "--log-level", "warning",
+                               "--no-access-log"], cwd=ROOT, env=os.environ.copy())
+    try:
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=None) as client:
+            deadline = time.monotonic() + 60
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn did not become healthy within 60s")
+                await asyncio.sleep(0.2)
+            return await run_all(client, features, args)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+# --------- Results ---------
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, dirty
+
+def compare(results, baseline_path):
+    baseline = {(r["batch_size"], r["concurrency"]): r for r in json.loads(Path(baseline_path).read_text())["results"]}
+    print(f"\nvs {baseline_path}")
+    print(f"{'batch':>6}{'conc':>6}{'req/s':>10}{'p50':>10}{'p99':>10}")
+    for r in results:
+        old = baseline.get((r["batch_size"], r["concurrency"]))
+        if old is None or not old["requests"] or not r["requests"]:
+            continue
+        print(f"{r['batch_size']:>6}{r['concurrency']:>6}"
+              f"{r['requests_per_s'] / old['requests_per_s'] - 1:>+10.1%}"
+              f"{r['p50_ms'] / old['p50_ms'] - 1:>+10.1%}{r['p99_ms'] / old['p99_ms'] - 1:>+10.1%}")
+
+def main(args):
+    os.environ["MODEL_RELOAD_INTERVAL"] = "0"
+    if not args.cache:
+        os.environ["PREDICTION_CACHE_SIZE"] = "0"
+    features = pd.read_parquet(FEATURES_PATH).drop(columns=["total_kwh"])
+
+    bench = bench_inprocess if args.mode == "inprocess" else bench_uvicorn
+    print(f"/predict load test ({args.mode}, {args.duration:g}s per cell, cache {'on' if args.cache else 'off'})")
+    results = asyncio.run(bench(features, args))
+
+    commit, dirty = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "mode": args.mode,
+            "server_workers": args.server_workers if args.mode == "uvicorn" else None,
+            "cache": args.cache,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "env": {k: v for k, v in os.environ.items() if k.startswith(("MICRO_BATCH_", "COMPILED_", "USE_COMPILED"))},
+        },
+        "results": results,
+    }
+    output = Path(args.output or RESULTS_DIR / f"bench_api-{commit}{'-dirty' if dirty else ''}-{args.mode}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Saved results: {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main(parse_args())
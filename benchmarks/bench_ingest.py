@@ -0,0 +1,41 @@
+"""
+bench_ingest.py
+Streaming CSV -> Parquet ingest (ingest.stream_csv_to_parquet) on a synthetic
+export in the raw format (semicolons, comma decimals, day-first dates).
+Runs the ingest in a fresh process so its peak RSS is not the generator's.
+
+    python benchmarks/bench_ingest.py [--rows 5000000] [--block-size-mb 16]
+"""
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+from benchmarks.synthetic_sessions import write_csv
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Streaming ingest benchmark")
+    parser.add_argument("--rows", type=int, default=5_000_000, help="Synthetic sessions in the CSV")
+    parser.add_argument("--block-size-mb", type=float, default=16)
+    return parser.parse_args()
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / "sessions.csv"
+        start = time.perf_counter()
+        write_csv(csv_path, args.rows)
+        print(f"Wrote {args.rows:,} rows ({csv_path.stat().st_size / 2**20:,.0f} MiB) "
+              f"in {time.perf_counter() - start:.1f}s")
+        subprocess.run([sys.executable, str(ROOT / "src" / "pipeline" / "ingest.py"), "--csv", str(csv_path),
+                        "--output", str(Path(tmp) / "sessions"), "--block-size-mb", str(args.block_size_mb)],
+                       check=True)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,202 @@
+"""
+bench_scaling.py
+How the offline pipeline scales: for each scale (multiples of the real export,
+default 1x, 10x, 100x) a synthetic raw-export CSV is generated and run through
+ingest -> cleaning -> engineering -> train, every stage in its own process, so
+its peak RSS (from wait4) is that stage's alone. Wall time, rows in/out and
+peak memory per (scale, stage) are printed and saved as JSON with the git commit.
+
+    python benchmarks/bench_scaling.py [--scales 1 10 100] [--models lr dt xgb lgb]
+                                       [--compare benchmarks/results/bench_scaling-<commit>.json]
+
+Stage times exclude reading the previous stage's output (reported as load_seconds);
+peak RSS includes it.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+from benchmarks.synthetic_sessions import BASE_ROWS, write_csv
+
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+SCALES = (1, 10, 100)
+STAGES = ("ingest", "cleaning", "engineering", "train")
+MODELS = ["lr", "dt", "xgb", "lgb"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline pipeline scaling benchmark")
+    parser.add_argument("--scales", type=float, nargs="+", default=list(SCALES),
+                        help=f"Multiples of the real export ({BASE_ROWS:,} sessions)")
+    parser.add_argument("--models", nargs="+", default=MODELS, help="Models fitted by the train stage")
+    parser.add_argument("--missing-rate", type=float, default=0.005)
+    parser.add_argument("--output", help="Results JSON (default benchmarks/results/bench_scaling-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results JSON to print the change against")
+    # internal: run one stage in this process (see run_stage)
+    parser.add_argument("--run-stage", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+# --------- Stages (each run in a child process) ---------
+
+def stage_ingest(workdir, args):
+    from src.pipeline.ingest import ingest
+
+    start = time.perf_counter()
+    rows, _ = ingest([workdir / "sessions.csv"], workdir / "sessions", incremental=False)
+    return {"seconds": time.perf_counter() - start, "load_seconds": 0.0, "rows_in": rows, "rows_out": rows}
+
+def stage_cleaning(workdir, args):
+    import pandas as pd
+    from src.pipeline.features import clean_sessions
+
+    start = time.perf_counter()
+    df = pd.read_parquet(workdir / "sessions")
+    loaded = time.perf_counter()
+    rows_in = len(df)
+    df = clean_sessions(df)
+    seconds = time.perf_counter() - loaded
+    df.to_parquet(workdir / "clean.parquet")
+    return {"seconds": seconds, "load_seconds": loaded - start, "rows_in": rows_in, "rows_out": len(df)}
+
+def stage_engineering(workdir, args):
+    import pandas as pd
+    from src.pipeline.features import build_features, empty_state, hourly_aggregates
+
+    start = time.perf_counter()
+    df = pd.read_parquet(workdir / "clean.parquet")
+    loaded = time.perf_counter()
+    # what features.engineering() computes, without writing into the pipeline's dataset
+    features, _ = build_features(hourly_aggregates(df), empty_state())
+    features = features.dropna()
+    seconds = time.perf_counter() - loaded
+    features.to_parquet(workdir / "features.parquet")
+    return {"seconds": seconds, "load_seconds": loaded - start, "rows_in": len(df), "rows_out": len(features)}
+
+def stage_train(workdir, args):
+    import pandas as pd
+    from src.pipeline.train import build_model, holdout_mask
+
+    start = time.perf_counter()
+    df = pd.read_parquet(workdir / "features.parquet")
+    loaded = time.perf_counter()
+    train = df[~holdout_mask(df)]
+    X, y = train.drop(columns=["total_kwh"]), train["total_kwh"]
+    models = {}
+    for name in args.models:
+        fit_start = time.perf_counter()
+        build_model(name).fit(X, y)
+        models[name] = time.perf_counter() - fit_start
+    return {"seconds": time.perf_counter() - loaded, "load_seconds": loaded - start, "rows_in": len(df),
+            "rows_out": len(train), "models": models}
+
+STAGE_FUNCTIONS = {"ingest": stage_ingest, "cleaning": stage_cleaning, "engineering": stage_engineering,
+                   "train": stage_train}
+
+def run_stage(args):
+    workdir = Path(args.workdir)
+    result = STAGE_FUNCTIONS[args.run_stage](workdir, args)
+    (workdir / f"{args.run_stage}.result.json").write_text(json.dumps(result))
+
+
+# --------- Driver ---------
+
+def measure(stage, workdir, args):
+    """Run one stage in a child process; its result plus wall time and peak RSS."""
+    cmd = [sys.executable, str(Path(__file__).resolve()), "--run-stage", stage, "--workdir", str(workdir),
+           "--models", *args.models]
+    with open(workdir / f"{stage}.log", "w") as log:
+        start = time.perf_counter()
+        child = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, cwd=ROOT)
+        # wait4: the rusage of this child only (RUSAGE_CHILDREN would be the max over all of them)
+        _, status, rusage = os.wait4(child.pid, 0)
+        wall = time.perf_counter() - start
+    child.returncode = os.waitstatus_to_exitcode(status)
+    if child.returncode != 0:
+        raise RuntimeError(f"stage {stage} failed:\n{(workdir / f'{stage}.log').read_text()[-2000:]}")
+    result = json.loads((workdir / f"{stage}.result.json").read_text())
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    peak = rusage.ru_maxrss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10)
+    return {"stage": stage, **result, "process_seconds": wall, "peak_rss_mb": peak}
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, dirty
+
+def compare(results, baseline_path):
+    baseline = {(r["scale"], r["stage"]): r for r in json.loads(Path(baseline_path).read_text())["results"]}
+    print(f"\nvs {baseline_path}")
+    print(f"{'scale':>7}  {'stage':<12}{'time':>10}{'peak RSS':>10}")
+    for r in results:
+        old = baseline.get((r["scale"], r["stage"]))
+        if old is None:
+            continue
+        print(f"{r['scale']:>6g}x  {r['stage']:<12}{r['seconds'] / old['seconds'] - 1:>+10.1%}"
+              f"{r['peak_rss_mb'] / old['peak_rss_mb'] - 1:>+10.1%}")
+
+def main(args):
+    results = []
+    print(f"{'scale':>7}{'sessions':>12}  {'stage':<12}{'rows in':>10}{'rows out':>10}{'time s':>9}"
+          f"{'load s':>8}{'x 1st':>7}{'peak MiB':>10}")
+    first = {}
+    for scale in args.scales:
+        rows = int(round(BASE_ROWS * scale))
+        with tempfile.TemporaryDirectory() as tmp:
+            workdir = Path(tmp)
+            start = time.perf_counter()
+            write_csv(workdir / "sessions.csv", rows, args.missing_rate)
+            print(f"{scale:>6g}x{rows:>12,}  generated {(workdir / 'sessions.csv').stat().st_size / 2**20:,.1f} MiB "
+                  f"CSV in {time.perf_counter() - start:.1f}s")
+            for stage in STAGES:
+                r = {"scale": scale, "sessions": rows, **measure(stage, workdir, args)}
+                first.setdefault(stage, r["seconds"])
+                print(f"{scale:>6g}x{rows:>12,}  {stage:<12}{r['rows_in']:>10,}{r['rows_out']:>10,}"
+                      f"{r['seconds']:>9.2f}{r['load_seconds']:>8.2f}{r['seconds'] / first[stage]:>6.1f}x"
+                      f"{r['peak_rss_mb']:>10.0f}")
+                results.append(r)
+
+    commit, dirty = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "base_rows": BASE_ROWS,
+            "models": args.models,
+            "missing_rate": args.missing_rate,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    output = Path(args.output or RESULTS_DIR / f"bench_scaling-{commit}{'-dirty' if dirty else ''}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Saved results: {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.run_stage:
+        run_stage(args)
+    else:
+        main(args)
@@ -0,0 +1,44 @@
+"""
+bench_segments.py
+Per-segment feature engineering (features.segmented_engineering) on a
+synthetic session log with thousands of garages.
+
+    python benchmarks/bench_segments.py [--rows 2000000] [--segments 2000] [--workers N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+from benchmarks.synthetic_sessions import make_sessions
+from src.pipeline.features import clean_sessions, segmented_engineering
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Segmented feature engineering benchmark")
+    parser.add_argument("--rows", type=int, default=2_000_000, help="Synthetic sessions to generate")
+    parser.add_argument("--segments", type=int, default=2000, help="Garages to spread them over")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    return parser.parse_args()
+
+
+def main(args):
+    clean = clean_sessions(make_sessions(args.rows, n_garages=args.segments))
+    print(f"{len(clean):,} sessions over {clean['garage_id'].nunique():,} garages, "
+          f"{clean['hour'].nunique():,} distinct hours")
+
+    with tempfile.TemporaryDirectory() as out:
+        start = time.perf_counter()
+        written = segmented_engineering(clean, "garage_id", output_dir=out, workers=args.workers)
+        elapsed = time.perf_counter() - start
+    rows = sum(written.values())
+    print(f"{args.workers} workers: {elapsed:.2f}s -> {len(written) / elapsed:,.0f} segments/s, "
+          f"{rows / elapsed:,.0f} feature rows/s")
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,220 @@
+"""
+bench_startup.py
+Cold start of the serving code: every run is a fresh interpreter that imports
+the API (which loads the production model at import) and answers its first
+/predict, or imports the Lambda handler and scores its first row group.
+Interpreter start, import and first-prediction times and the heavy modules
+that ended up loaded are printed per scenario (median of --repeat runs) and
+saved as JSON with the git commit.
+
+    python benchmarks/bench_startup.py [--scenarios api api-estimator lambda] [--repeat 5]
+                                       [--importtime] [--compare benchmarks/results/bench_startup-<commit>.json]
+
+Scenarios:
+  api            the API as deployed (compiled export verified at training time)
+  api-estimator  the API with USE_COMPILED_MODELS=0: the joblib estimator is unpickled at startup
+  lambda         lambda_infer: registry lookup + one row group (no S3 calls)
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+SCENARIOS = {
+    "api": {"USE_COMPILED_MODELS": "1"},
+    "api-estimator": {"USE_COMPILED_MODELS": "0"},
+    "lambda": {},
+}
+HEAVY_MODULES = ("pandas", "pyarrow", "joblib", "scipy", "sklearn", "xgboost", "lightgbm")
+TIMINGS = ("python_start_seconds", "import_seconds", "first_prediction_seconds", "time_to_first_prediction")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Cold start benchmark")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh processes per scenario")
+    parser.add_argument("--importtime", action="store_true",
+                        help="Also print the slowest imports of each scenario (python -X importtime)")
+    parser.add_argument("--output", help="Results JSON (default benchmarks/results/bench_startup-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results JSON to print the change against")
+    # internal: the measured child process (see run_child)
+    parser.add_argument("--child", choices=list(SCENARIOS), help=argparse.SUPPRESS)
+    parser.add_argument("--spawned-at", type=float, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+# --------- Child process ---------
+
+async def asgi_post(app, path, body):
+    """One POST straight through the ASGI app: no HTTP client to import or time."""
+    import asyncio
+
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+             "headers": [(b"content-type", b"application/json")], "client": ("127.0.0.1", 0),
+             "server": ("bench", 80)}
+    response = {"status": None, "body": b""}
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.Future()   # the client never disconnects
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response["status"], response["body"]
+
+def first_api_prediction():
+    import asyncio
+    from src.api import app as app_module
+
+    imported = time.perf_counter()
+    body = json.dumps({"instances": [dict.fromkeys(app_module.FEATURE_COLUMNS, 0)]}).encode()
+    status, _ = asyncio.run(asgi_post(app_module.app, "/predict", body))
+    if status != 200:
+        raise RuntimeError(f"/predict answered {status}")
+    return imported
+
+def first_lambda_prediction():
+    import pyarrow as pa
+    from src.aws import lambda_infer
+
+    imported = time.perf_counter()
+    cache = lambda_infer.get_production_model()
+    # what the handler does with each row group (pyarrow's conversion imports pandas)
+    table = pa.table({c: [0.0] for c in lambda_infer.FEATURE_COLUMNS})
+    lambda_infer.predict_batch(cache, table.select(lambda_infer.FEATURE_COLUMNS).to_pandas())
+    return imported
+
+def run_child(args):
+    started = time.perf_counter()
+    started_wall = time.time()
+    sys.path.insert(0, str(ROOT))
+    imported = first_lambda_prediction() if args.child == "lambda" else first_api_prediction()
+    done = time.perf_counter()
+    result = {
+        "python_start_seconds": started_wall - args.spawned_at,
+        "import_seconds": imported - started,
+        "first_prediction_seconds": done - imported,
+        "time_to_first_prediction": started_wall - args.spawned_at + done - started,
+        "heavy_modules": [m for m in HEAVY_MODULES if m in sys.modules],
+    }
+    # stdout carries the app's own prints; the result is the last line
+    print(json.dumps(result))
+
+
+# --------- Driver ---------
+
+def child_env(scenario):
+    env = {**os.environ, "MODEL_RELOAD_INTERVAL": "0", **SCENARIOS[scenario]}
+    env.pop("FEATURE_STORE_SEED", None)
+    return env
+
+def measure(scenario):
+    """One cold start of `scenario` in a fresh interpreter."""
+    cmd = [sys.executable, str(Path(__file__).resolve()), "--child", scenario, "--spawned-at", str(time.time())]
+    proc = subprocess.run(cmd, cwd=ROOT, env=child_env(scenario), capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{scenario} failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def slowest_imports(scenario, top=12):
+    """(cumulative seconds, module) of the slowest imports at the top two levels."""
+    cmd = [sys.executable, "-X", "importtime", str(Path(__file__).resolve()), "--child", scenario,
+           "--spawned-at", str(time.time())]
+    proc = subprocess.run(cmd, cwd=ROOT, env=child_env(scenario), capture_output=True, text=True)
+    imports = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if len(name) - len(name.lstrip()) <= 3:
+            imports.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+def summarize(scenario, runs):
+    summary = {"scenario": scenario, "runs": len(runs), "heavy_modules": runs[-1]["heavy_modules"]}
+    for key in TIMINGS:
+        values = [r[key] for r in runs]
+        summary[key] = statistics.median(values)
+        summary[f"{key}_min"] = min(values)
+    return summary
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, dirty
+
+def compare(results, baseline_path):
+    baseline = {r["scenario"]: r for r in json.loads(Path(baseline_path).read_text())["results"]}
+    print(f"\nvs {baseline_path}")
+    print(f"{'scenario':<15}{'import':>10}{'1st pred':>10}{'total':>10}")
+    for r in results:
+        old = baseline.get(r["scenario"])
+        if old is None:
+            continue
+        print(f"{r['scenario']:<15}{r['import_seconds'] / old['import_seconds'] - 1:>+10.1%}"
+              f"{r['first_prediction_seconds'] / old['first_prediction_seconds'] - 1:>+10.1%}"
+              f"{r['time_to_first_prediction'] / old['time_to_first_prediction'] - 1:>+10.1%}")
+
+def main(args):
+    results = []
+    print(f"{'scenario':<15}{'python s':>10}{'import s':>10}{'1st pred s':>12}{'total s':>9}  heavy modules loaded")
+    for scenario in args.scenarios:
+        r = summarize(scenario, [measure(scenario) for _ in range(args.repeat)])
+        print(f"{scenario:<15}{r['python_start_seconds']:>10.3f}{r['import_seconds']:>10.3f}"
+              f"{r['first_prediction_seconds']:>12.3f}{r['time_to_first_prediction']:>9.3f}  "
+              f"{', '.join(r['heavy_modules']) or '-'}")
+        results.append(r)
+    if args.importtime:
+        for scenario in args.scenarios:
+            print(f"\nslowest imports ({scenario}):")
+            for seconds, name in slowest_imports(scenario):
+                print(f"{seconds:>8.3f}s  {name}")
+
+    commit, dirty = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    output = Path(args.output or RESULTS_DIR / f"bench_startup-{commit}{'-dirty' if dirty else ''}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Saved results: {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.child:
+        run_child(args)
+    else:
+        main(args)
@@ -0,0 +1,69 @@
+"""
+bench_train_all.py
+One train.py + eval.py process per model (the old pipeline) vs train_all.py
+training and evaluating every model in one process, on the same features.
+MLflow logs to a throwaway file store and nothing is uploaded, so both sides
+pay the same model fitting/logging and differ only in startup and reads.
+
+    python benchmarks/bench_train_all.py [--input data/features/features.parquet] [--workers 1]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+PIPELINE = ROOT / "src" / "pipeline"
+MODELS = ["lr", "dt", "xgb", "lgb"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Per-process vs in-process training benchmark")
+    parser.add_argument("--input", default=str(ROOT / "data" / "features" / "features.parquet"))
+    parser.add_argument("--models", nargs="+", default=MODELS)
+    parser.add_argument("--workers", type=int, default=1, help="train_all.py --workers")
+    return parser.parse_args()
+
+
+def timed(cmd, env):
+    start = time.perf_counter()
+    result = subprocess.run(cmd, capture_output=True, text=True, env=env, cwd=PIPELINE)
+    if result.returncode != 0 or "[ERROR]" in result.stdout:
+        raise RuntimeError(f"{' '.join(cmd)} failed:\n{result.stdout[-2000:]}\n{result.stderr[-2000:]}")
+    return time.perf_counter() - start
+
+
+def main(args):
+    env = dict(os.environ, MLFLOW_ALLOW_FILE_STORE="true")
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        mlflow_uri = (tmp / "mlruns").as_uri()
+
+        startup = timed([sys.executable, "-c", "import train, eval"], env)
+        print(f"Interpreter start + train/eval imports: {startup:.2f}s per process")
+
+        per_process = 0.0
+        for model in args.models:
+            output = tmp / "per_process" / "models"
+            per_process += timed([sys.executable, "train.py", "--input", args.input, "--model", model,
+                                  "--output", str(output), "--mlflow_uri", mlflow_uri, "--no-upload"], env)
+            model_path = max(output.glob(f"{model}_model_*.joblib"), key=os.path.getmtime)
+            per_process += timed([sys.executable, "eval.py", "--model", str(model_path), "--test-data", args.input,
+                                  "--output-dir", str(tmp / "per_process" / "reports"),
+                                  "--mlflow-uri", mlflow_uri], env)
+        print(f"One process per train/eval job: {per_process:.1f}s")
+
+        in_process = timed([sys.executable, "train_all.py", "--input", args.input, "--models", *args.models,
+                            "--output", str(tmp / "in_process" / "models"),
+                            "--reports-dir", str(tmp / "in_process" / "reports"),
+                            "--mlflow-uri", mlflow_uri, "--no-upload", "--workers", str(args.workers)], env)
+        print(f"train_all.py (--workers {args.workers}): {in_process:.1f}s")
+        print(f"Saved {per_process - in_process:.1f}s ({1 - in_process / per_process:.0%}) "
+              f"for {len(args.models)} models")
+
+
+if __name__ == "__main__":
+    main(parse_args())
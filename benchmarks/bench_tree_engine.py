@@ -0,0 +1,61 @@
+"""
+bench_tree_engine.py
+Latency of estimator.predict vs the compiled NumPy engine at batch sizes 1, 32 and 10k.
+
+    python benchmarks/bench_tree_engine.py [--models src/models/*.joblib] [--repeat 50]
+"""
+import argparse
+import glob
+import sys
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+from src.inference.tree_engine import check_parity, compile_model
+
+FEATURES_PATH = ROOT / "data" / "features" / "features.parquet"
+BATCH_SIZES = (1, 32, 10_000)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compiled tree engine benchmark")
+    parser.add_argument("--models", nargs="+", default=sorted(glob.glob(str(ROOT / "src" / "models" / "*.joblib"))))
+    parser.add_argument("--repeat", type=int, default=50, help="Timed calls per batch size")
+    return parser.parse_args()
+
+
+def time_call(fn, X, repeat):
+    fn(X)   # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def main(args):
+    features = pd.read_parquet(FEATURES_PATH).drop(columns=["total_kwh"])
+    print(f"{'model':<28}{'batch':>8}{'original (ms)':>16}{'compiled (ms)':>16}{'speedup':>10}")
+    for model_path in args.models:
+        model = joblib.load(model_path)
+        compiled = compile_model(model)
+        diff = check_parity(model, compiled, features)
+        name = Path(model_path).stem
+        for batch in BATCH_SIZES:
+            X = features.sample(batch, replace=batch > len(features), random_state=0)
+            X_np = X.to_numpy()
+            repeat = max(3, args.repeat // (10 if batch >= 10_000 else 1))
+            original = time_call(model.predict, X, repeat)
+            fast = time_call(compiled.predict, X_np, repeat)
+            print(f"{name:<28}{batch:>8}{original * 1e3:>16.3f}{fast * 1e3:>16.3f}{original / fast:>9.1f}x")
+        print(f"{'':<28}max |diff| vs original: {diff:.2e}")
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,166 @@
+"""
+synthetic_sessions.py
+Synthetic charging sessions in the ingest.py output schema (what
+data/raw/ingest.parquet holds), generated fully vectorized so 10M+ rows
+are cheap to produce.
+
+As a script, writes a session log at a multiple of the real export's size,
+as Parquet (the ingest.py output) or as a raw-export CSV (the ingest.py input):
+
+    python benchmarks/synthetic_sessions.py --scale 10 --output data/synthetic/sessions_10x.parquet
+    python benchmarks/synthetic_sessions.py --scale 100 --output sessions.csv --missing-rate 0.01
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PLUGIN_CATEGORIES = [
+    (0, 3, "early night (midnight-3)"),
+    (3, 6, "late night (3-6)"),
+    (6, 9, "early morning (6-9)"),
+    (9, 12, "late morning (9-12)"),
+    (12, 15, "early afternoon (12-15)"),
+    (15, 18, "late afternoon (15-18)"),
+    (18, 21, "early evening (18-21)"),
+    (21, 24, "late evening (21-midnight)"),
+]
+DURATION_CATEGORIES = [
+    (18, "More than 18 hours"),
+    (15, "Between 15 and 18 hours"),
+    (12, "Between 12 and 15 hours"),
+    (9, "Between 9 and 12 hours"),
+    (6, "Between 6 and 9  hours"),      # sic: the raw export has a double space here
+    (3, "Between 3 and 6 hours"),
+]
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MAX_SPAN_DAYS = 3650
+N_GARAGES = 24
+N_USERS = 97
+N_SHARED = 12
+# sessions in the real export (data/raw/ingest.parquet): scale 1
+BASE_ROWS = 6878
+# CSVs are written this many sessions at a time
+CHUNK_ROWS = 500_000
+
+# arrival hour distribution: afternoon/evening peak like the real data
+HOUR_WEIGHTS = np.array([2, 1, 1, 1, 1, 1, 2, 3, 4, 5, 5, 6, 7, 8, 9, 12, 14, 13, 11, 9, 7, 6, 4, 3], dtype=float)
+
+
+def make_sessions(n_sessions, start="2018-12-21", seed=0, missing_rate=0.005, n_garages=N_GARAGES):
+    """DataFrame of `n_sessions` sessions with the raw column names.
+
+    About `missing_rate` of the sessions have End_plugout, End_plugout_hour,
+    Duration_hours and Duration_category missing together, like the real export.
+    Sessions are spread evenly over `n_garages` garages (segments).
+    """
+    rng = np.random.default_rng(seed)
+    n = n_sessions
+
+    # ~13 months per 7k sessions like the source data, capped at 10 years
+    # (larger logs are denser, i.e. more stations, rather than longer)
+    span_days = min(MAX_SPAN_DAYS, max(30, int(400 * n / 7000)))
+    days = rng.integers(0, span_days, n)
+    hours = rng.choice(24, n, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum())
+    minutes = rng.integers(0, 60, n)
+    start_plugin = (pd.Timestamp(start)
+                    + pd.to_timedelta(days, unit="D")
+                    + pd.to_timedelta(hours, unit="h")
+                    + pd.to_timedelta(minutes, unit="min"))
+    order = np.argsort(start_plugin.values, kind="stable")
+    start_plugin = pd.DatetimeIndex(start_plugin.values[order]).as_unit("ns")
+    hours = hours[order]
+
+    duration = np.round(rng.gamma(1.2, 9.5, n), 6) + 1 / 60
+    el_kwh = np.round(np.minimum(duration * rng.uniform(0.5, 3.5, n), 90) + 0.01, 2)
+    end_plugout = start_plugin + pd.to_timedelta(np.round(duration * 60), unit="min")
+
+    user = rng.integers(0, N_USERS, n)
+    garage = user % n_garages if n_garages == N_GARAGES else rng.integers(0, n_garages, n)
+    shared = rng.random(n) < 0.2
+    width = max(2, len(str(n_garages - 1)))
+    garage_ids = [f"G{g:0{width}d}" for g in range(n_garages)]
+    user_ids = [f"G{u % N_GARAGES:02d}-{u}" for u in range(N_USERS)]
+    shared_ids = [f"Shared-{s + 1}" for s in range(N_SHARED)]
+
+    plugin_codes = np.searchsorted([hi for _, hi, _ in PLUGIN_CATEGORIES], hours, side="right")
+    duration_labels = [label for _, label in DURATION_CATEGORIES] + ["Less than 3 hours"]
+    duration_codes = np.select([duration > b for b, _ in DURATION_CATEGORIES],
+                               list(range(len(DURATION_CATEGORIES))), default=len(DURATION_CATEGORIES))
+
+    # low-cardinality text columns are categoricals (like a dictionary-encoded Parquet read);
+    # 10M object strings would not fit in memory next to the cleaned copy
+    cat = pd.Categorical.from_codes
+    df = pd.DataFrame({
+        "session_ID": np.arange(1, n + 1, dtype=np.int64),
+        "Garage_ID": cat(garage, garage_ids),
+        "User_ID": cat(user, user_ids),
+        "User_type": cat(shared.astype(np.int8), ["Private", "Shared"]),
+        "Shared_ID": cat(np.where(shared, user % N_SHARED, -1), shared_ids),
+        "Start_plugin": start_plugin,
+        "Start_plugin_hour": start_plugin.hour.astype(np.int64),
+        "End_plugout": end_plugout,
+        "End_plugout_hour": end_plugout.hour.astype(np.float64),
+        "El_kWh": el_kwh,
+        "Duration_hours": duration,
+        "month_plugin": cat(start_plugin.month - 1, MONTHS),
+        "weekdays_plugin": cat(start_plugin.dayofweek, WEEKDAYS),
+        "Plugin_category": cat(plugin_codes, [label for _, _, label in PLUGIN_CATEGORIES]),
+        "Duration_category": cat(duration_codes, duration_labels),
+    })
+
+    # sessions still plugged in at export time: end, duration and category unknown
+    missing = rng.random(n) < missing_rate
+    df.loc[missing, ["End_plugout"]] = pd.NaT
+    df.loc[missing, ["End_plugout_hour", "Duration_hours"]] = np.nan
+    df.loc[missing, "Duration_category"] = np.nan
+    return df
+
+
+def as_strings(df):
+    """Same frame with categorical columns as plain strings (the CSV ingest dtypes)."""
+    return df.astype({c: "str" for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)})
+
+
+def write_csv(path, rows, missing_rate=0.005, seed=0):
+    """Raw-export CSV (semicolons, comma decimals, day-first dates), written in chunks
+    so generating it does not need the whole frame."""
+    for i, start in enumerate(range(0, rows, CHUNK_ROWS)):
+        chunk = make_sessions(min(CHUNK_ROWS, rows - start), seed=seed + i, missing_rate=missing_rate)
+        chunk["session_ID"] += start
+        chunk.to_csv(path, sep=";", decimal=",", date_format="%d.%m.%Y %H:%M", na_rep="NA",
+                     index=False, header=i == 0, mode="w" if i == 0 else "a")
+
+
+def write_parquet(path, rows, missing_rate=0.005, seed=0):
+    make_sessions(rows, seed=seed, missing_rate=missing_rate).to_parquet(path, index=False)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Synthetic charging session generator")
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--scale", type=float, default=1.0, help=f"Multiple of the real export ({BASE_ROWS:,} sessions)")
+    size.add_argument("--rows", type=int, help="Exact number of sessions")
+    parser.add_argument("--output", required=True, help="Output file: .parquet or .csv")
+    parser.add_argument("--missing-rate", type=float, default=0.005,
+                        help="Share of sessions still plugged in (no end time, duration or category)")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def main(args):
+    rows = args.rows or int(round(BASE_ROWS * args.scale))
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    write = write_csv if output.suffix == ".csv" else write_parquet
+    start = time.perf_counter()
+    write(output, rows, args.missing_rate, args.seed)
+    print(f"[OK] Wrote {rows:,} sessions to {output} ({output.stat().st_size / 2**20:,.1f} MiB) "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main(parse_args())
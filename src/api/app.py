@@ -1,15 +1,27 @@
 import time
-from fastapi import FastAPI
+from datetime import datetime
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from pathlib import Path
 import json
-import joblib
-import pandas as pd
+import numpy as np
 from prometheus_fastapi_instrumentator import Instrumentator
 import os
+import threading
 
-from prometheus_client import Counter, Histogram
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+
+from src.api.batching import MicroBatcher
+from src.inference.tree_engine import check_parity, export_matches, load_compiled
+from src.api.feature_store import OnlineFeatureStore, InsufficientHistoryError
+from src.api.model_pool import ModelPool
+from src.api.prediction_cache import PredictionCache
+from src.api.model_watcher import RegistryWatcher, ServingModel, utcnow
+from src.api.request_metrics import RequestMetrics
+from src.pipeline.instrument import peak_rss
 
 PREDICTION_COUNTER = Counter(
     "ev_predictions_total",
@@ -22,6 +34,59 @@ PREDICTION_LATENCY = Histogram(
     "Time spent in prediction endpoint"
 )
 
+PREDICTION_CACHE_HITS = Counter(
+    "ev_prediction_cache_hits_total",
+    "Prediction rows served from the cache",
+    ["model_name"]
+)
+
+PREDICTION_CACHE_MISSES = Counter(
+    "ev_prediction_cache_misses_total",
+    "Prediction rows that had to be sent to the model",
+    ["model_name"]
+)
+
+MODEL_PREDICT_LATENCY = Histogram(
+    "ev_model_predict_latency_seconds",
+    "Time spent in model.predict per model",
+    ["model_name"]
+)
+
+PREDICTION_BATCH_SIZE = Histogram(
+    "ev_prediction_batch_rows",
+    "Rows per coalesced model.predict call",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+)
+
+PREDICTION_BATCH_WAIT = Histogram(
+    "ev_prediction_batch_wait_seconds",
+    "Time a /predict request waited in the micro-batch queue",
+    buckets=(0.0001, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1)
+)
+
+MODEL_LOAD_SECONDS = Gauge(
+    "ev_model_load_seconds",
+    "Time to load, check and warm up a model",
+    ["model_name"]
+)
+
+MODEL_MEMORY = Gauge(
+    "ev_model_memory_bytes",
+    "Resident memory the process grew by while loading a model",
+    ["model_name"]
+)
+
+PROCESS_MEMORY = Gauge(
+    "ev_process_memory_bytes",
+    "Resident memory of the API process (kind=rss|peak_rss), labelled with the production model",
+    ["kind", "model_name"]
+)
+
+# per-phase latency, rows per request and rows predicted (ev_request_phase_seconds,
+# ev_request_rows, ev_predicted_rows_total): cheap on the request path, see request_metrics.py
+request_metrics = RequestMetrics()
+REGISTRY.register(request_metrics)
+
 
 BASE_DIR = Path(__file__).resolve().parents[1]  # mlops/src
 MODELS_DIR = BASE_DIR / "models"
@@ -51,6 +116,32 @@ FEATURE_COLUMNS = [
     "hour_dow_mean",
 ]
 
+# seconds between registry.json checks; 0 disables hot reload
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "5"))
+
+# micro-batching of concurrent /predict calls
+MICRO_BATCH_ENABLED = os.getenv("MICRO_BATCH_ENABLED", "1") == "1"
+MICRO_BATCH_MAX_ROWS = int(os.getenv("MICRO_BATCH_MAX_ROWS", "256"))
+MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "2"))
+
+# prediction cache; size 0 disables it
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "300"))
+
+# serve the NumPy node-table export (<model>.npz) instead of the estimator when present
+USE_COMPILED_MODELS = os.getenv("USE_COMPILED_MODELS", "1") == "1"
+# larger batches go to the estimator, whose native code wins once per-call overhead is amortized
+COMPILED_MAX_ROWS = int(os.getenv("COMPILED_MAX_ROWS", "1024"))
+
+# memory budget for challenger models loaded via /predict?model=
+MODEL_POOL_BUDGET_MB = float(os.getenv("MODEL_POOL_BUDGET_MB", "512"))
+
+# longest /forecast horizon, in hours
+FORECAST_MAX_HORIZON = int(os.getenv("FORECAST_MAX_HORIZON", "168"))
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+FLOAT32_MEDIA_TYPE = "application/octet-stream"
+
 
 
 # --------- Registry / Model Loading ---------
@@ -60,35 +151,212 @@ def load_registry():
         return json.load(f)
     
 
-def load_production_model():
-    registry = load_registry()
-    prod = registry["production"]
+def production_model_path(prod):
     raw_path = prod["model_path"]
-    
+
     # Robust way to get filename from ANY path string (Windows or Linux)
     # Split by \ first (Windows), then by / (Linux/Mac)
     model_filename = raw_path.split("\\")[-1].split("/")[-1]
-    
+
     # Construct the clean path
-    model_path_in_container = (MODELS_DIR / model_filename).resolve()
-    
-    print(f"Loading model from: {model_path_in_container}")
-    
-    model = joblib.load(model_path_in_container)
-    return model, prod
+    return (MODELS_DIR / model_filename).resolve()
+
+class LazyEstimator:
+    """The joblib estimator of a served model, unpickled on first use.
+
+    Unpickling imports sklearn / xgboost / lightgbm, most of a cold start. A model
+    whose compiled export was verified against this joblib at training time
+    (tree_engine.export_matches) is served by the export alone until a batch
+    above COMPILED_MAX_ROWS asks for the estimator, which then loads in the
+    background while the export keeps answering."""
+
+    def __init__(self, path, model=None):
+        self.path = path
+        self._model = model
+        self._lock = threading.Lock()
+        self._loader = None
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def get(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import joblib
+                    print(f"Loading estimator from: {self.path}")
+                    model = joblib.load(self.path)
+                    warm_up(model)
+                    self._model = model
+        return self._model
+
+    def load_in_background(self):
+        with self._lock:
+            if self._loader is None:
+                self._loader = threading.Thread(target=self.get, name="estimator-loader", daemon=True)
+                self._loader.start()
+
+    def predict(self, X):
+        return self.get().predict(X)
+
+def usable_compiled(model_path):
+    """The compiled export of model_path if it exists and fits FEATURE_COLUMNS, else None."""
+    if not USE_COMPILED_MODELS:
+        return None
+    compiled = load_compiled(model_path)
+    if compiled is not None and compiled.feature_names != FEATURE_COLUMNS:
+        print(f"[WARN] Ignoring compiled export of {model_path.name}: feature order differs from FEATURE_COLUMNS")
+        return None
+    return compiled
+
+def check_compiled(model, compiled, model_path):
+    """`compiled` if it agrees with the estimator on random rows, else None."""
+    import pandas as pd
+    X = pd.DataFrame(np.random.default_rng(0).normal(0, 20, (64, len(FEATURE_COLUMNS))), columns=FEATURE_COLUMNS)
+    try:
+        check_parity(model, compiled, X)
+    except ValueError as e:
+        print(f"[WARN] Ignoring compiled export of {model_path.name}: {e}")
+        return None
+    return compiled
+
+def warm_up(model):
+    # first predict call pays lazy init costs (threadpools, feature checks); do it off the request path
+    import pandas as pd
+    model.predict(pd.DataFrame(np.zeros((1, len(FEATURE_COLUMNS))), columns=FEATURE_COLUMNS))
+
+def process_rss():
+    """Current resident memory in bytes (peak on platforms without /proc, NaN if unknown)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return process_peak_rss()
+
+def process_peak_rss():
+    # instrument's probe: VmHWM, else ru_maxrss in bytes, else None (Windows)
+    peak = peak_rss()
+    return float("nan") if peak is None else peak
+
+def record_model_load(model_name, seconds, rss_before):
+    MODEL_LOAD_SECONDS.labels(model_name=model_name).set(seconds)
+    grown = process_rss() - rss_before
+    if not np.isnan(grown):
+        MODEL_MEMORY.labels(model_name=model_name).set(max(0, grown))
+
+def track_process_memory(model_name):
+    # read at scrape time; relabelled when the production model changes
+    PROCESS_MEMORY.clear()
+    PROCESS_MEMORY.labels(kind="rss", model_name=model_name).set_function(process_rss)
+    PROCESS_MEMORY.labels(kind="peak_rss", model_name=model_name).set_function(process_peak_rss)
+
+def load_model(model_path, info):
+    start = time.time()
+    rss_before = process_rss()
+    print(f"Loading model from: {model_path}")
+    compiled = usable_compiled(model_path)
+    if compiled is not None and export_matches(compiled, model_path):
+        print(f"Using compiled model: {model_path.with_suffix('.npz').name} (verified at export)")
+        estimator = LazyEstimator(model_path)
+        compiled.predict(np.zeros((1, len(FEATURE_COLUMNS))))
+    else:
+        import joblib
+        model = joblib.load(model_path)
+        if compiled is not None:
+            compiled = check_compiled(model, compiled, model_path)
+            if compiled is not None:
+                print(f"Using compiled model: {model_path.with_suffix('.npz').name}")
+        warm_up(model)
+        estimator = LazyEstimator(model_path, model)
+    load_seconds = time.time() - start
+    record_model_load(info["model_name"], load_seconds, rss_before)
+    return ServingModel(model=estimator, info=info, loaded_at=utcnow(), load_seconds=load_seconds,
+                        compiled=compiled)
+
+def load_serving_model():
+    prod = load_registry()["production"]
+    return load_model(production_model_path(prod), prod)
+
+def load_pool_model(path, model_name):
+    return load_model(path, {"model_name": model_name, "model_path": str(path)})
+
+def reload_if_changed():
+    prod = load_registry()["production"]
+    if (prod["model_name"], prod["model_path"]) == (serving.info["model_name"], serving.info["model_path"]):
+        return None
+    return load_serving_model()
 
-model, prod_info = load_production_model()
+def swap_serving_model(new):
+    # rebinding one global is atomic; requests hold their own reference to the old one
+    global serving
+    serving = new
+    prediction_cache.clear()
+    track_process_memory(new.info["model_name"])
+
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL)
+
+serving = load_serving_model()
+track_process_memory(serving.info["model_name"])
+
+model_pool = ModelPool(MODELS_DIR, load_pool_model, budget_bytes=int(MODEL_POOL_BUDGET_MB * 1024 * 1024))
+
+# --------- Online Feature Store ---------
+
+feature_store = OnlineFeatureStore()
+
+# Optional warm start: parquet of hourly actuals (hour, total_kwh, n_sessions, avg_kwh)
+FEATURE_STORE_SEED = os.getenv("FEATURE_STORE_SEED")
+if FEATURE_STORE_SEED:
+    import pandas as pd
+    seed = pd.read_parquet(FEATURE_STORE_SEED)
+    if "hour" in seed.columns:
+        seed = seed.set_index("hour")
+    feature_store.ingest_frame(seed)
+    print(f"Feature store seeded with {len(seed)} hours from: {FEATURE_STORE_SEED}")
 
 # --------- FastAPI Setup ---------
 
+@asynccontextmanager
+async def lifespan(app):
+    watcher = None
+    if MODEL_RELOAD_INTERVAL > 0:
+        watcher = RegistryWatcher(REGISTRY_PATH, reload_if_changed, swap_serving_model,
+                                  interval=MODEL_RELOAD_INTERVAL)
+        watcher.start()
+    yield
+    if watcher is not None:
+        watcher.stop()
+
 app = FastAPI(
     title="EV Charging Demand API",
     version="0.1.0",
-    description="Serve hourly total_kwh predictions using the production model."
+    description="Serve hourly total_kwh predictions using the production model.",
+    lifespan=lifespan,
 )
 # Add Prometheus instrumentation
 Instrumentator().instrument(app).expose(app)
 
+class RequestStartMiddleware:
+    """Stamps each request's arrival in its scope (outermost middleware), so the
+    handlers can time what happens before they run: receiving, parsing and
+    validating the body."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            scope["ev_received_at"] = time.perf_counter()
+        await self.app(scope, receive, send)
+
+app.add_middleware(RequestStartMiddleware)
+
+def json_response(model_name, preds):
+    # built by hand: FastAPI would re-validate the float list against PredictResponse first
+    return Response(json.dumps({"model_name": model_name, "predictions": preds.tolist()}),
+                    media_type="application/json")
+
 class FeatureVector(BaseModel):
     n_sessions_lag1: float
     avg_kwh_lag1: float
@@ -122,24 +390,304 @@ class PredictResponse(BaseModel):
     model_name: str
     predictions: List[float]
 
+class ForecastResponse(BaseModel):
+    model_name: str
+    timestamps: List[datetime]
+    predictions: List[float]
+
+class HourlyActual(BaseModel):
+    timestamp: datetime
+    total_kwh: float
+    n_sessions: float
+    avg_kwh: float
+
+class IngestRequest(BaseModel):
+    hours: List[HourlyActual]
+
+class NextPredictRequest(BaseModel):
+    timestamp: datetime
+
 # --------- API Endpoints ---------
 # we can add more endpoints later like available models, metrics , features etc ...
 @app.get("/health")
 def health():
-    return {"status": "ok", "model_name": prod_info["model_name"]}
+    current = serving
+    return {
+        "status": "ok",
+        "model_name": current.info["model_name"],
+        "model_loaded_at": current.loaded_at.isoformat(),
+    }
+
+def predict_matrix(current, X):
+    if current.compiled is not None and (len(X) <= COMPILED_MAX_ROWS or not current.model.loaded):
+        if len(X) > COMPILED_MAX_ROWS:
+            current.model.load_in_background()
+        return current.compiled.predict(X)
+    import pandas as pd
+    # one zero-copy frame over the whole block keeps the fitted feature names happy
+    return current.model.predict(pd.DataFrame(X, columns=FEATURE_COLUMNS, copy=False))
+
+def instances_to_matrix(instances):
+    rows = [[getattr(f, c) for c in FEATURE_COLUMNS] for f in instances]
+    return np.array(rows, dtype=np.float64).reshape(-1, len(FEATURE_COLUMNS))
+
+def predict_with(current, X):
+    start = time.perf_counter()
+    preds = predict_matrix(current, X)
+    MODEL_PREDICT_LATENCY.labels(model_name=current.info["model_name"]).observe(time.perf_counter() - start)
+    return preds, current.info["model_name"]
+
+def predict_with_serving_model(X):
+    return predict_with(serving, X)
+
+async def resolve_model(name, segment=None):
+    """None for the production model, otherwise the challenger's (or segment model's) ServingModel.
+    A segment without a model name gets the production model's family."""
+    production = serving.info["model_name"]
+    if segment is None and (name is None or name == production):
+        return None
+    if segment is not None and name is None:
+        name = production.split("_model_")[0]
+    try:
+        # a family name that resolves to production is served by `serving`, not a second copy in the pool
+        if segment is None and await run_in_threadpool(model_pool.lookup, name) == production:
+            return None
+        return await run_in_threadpool(model_pool.get, name, segment)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+
+batcher = MicroBatcher(
+    predict_with_serving_model,
+    max_rows=MICRO_BATCH_MAX_ROWS,
+    max_wait_ms=MICRO_BATCH_MAX_WAIT_MS,
+    batch_size_metric=PREDICTION_BATCH_SIZE,
+    wait_metric=PREDICTION_BATCH_WAIT,
+)
+
+async def predict_rows(X, challenger=None):
+    if challenger is not None:
+        return await run_in_threadpool(predict_with, challenger, X)
+    if MICRO_BATCH_ENABLED:
+        return await batcher.submit(X)
+    return await run_in_threadpool(predict_with_serving_model, X)
+
+async def predict_rows_cached(X, challenger=None):
+    model_name = (challenger or serving).info["model_name"]
+    preds, miss, keys = prediction_cache.lookup(X, model_name)
+    n_miss = int(miss.sum())
+    PREDICTION_CACHE_HITS.labels(model_name=model_name).inc(len(X) - n_miss)
+    PREDICTION_CACHE_MISSES.labels(model_name=model_name).inc(n_miss)
+    if n_miss == 0:
+        return preds, model_name
+
+    # only the uncached rows go to the model
+    miss_preds, predicted_by = await predict_rows(X[miss], challenger)
+    if predicted_by != model_name:
+        # model was swapped while we waited; answer with the new model for every row
+        return await predict_rows(X, challenger)
+    preds[miss] = miss_preds
+    prediction_cache.store([k for k, m in zip(keys, miss) if m], miss_preds)
+    return preds, model_name
 
 @app.post("/predict", response_model=PredictResponse)
-def predict(req: PredictRequest):
+async def predict(req: PredictRequest, request: Request, model: Optional[str] = Query(None),
+                  segment: Optional[str] = Query(None)):
+    handler_start = time.perf_counter()
+    start = time.time()
+    challenger = await resolve_model(model, segment)
+    frame_start = time.perf_counter()
+    X = instances_to_matrix(req.instances)
+    if len(X) == 0:
+        return PredictResponse(model_name=(challenger or serving).info["model_name"], predictions=[])
+    predict_start = time.perf_counter()
+    if prediction_cache.enabled:
+        preds, model_name = await predict_rows_cached(X, challenger)
+    else:
+        preds, model_name = await predict_rows(X, challenger)
+    duration = time.time() - start
+
+    PREDICTION_COUNTER.labels(model_name=model_name).inc()
+    PREDICTION_LATENCY.observe(duration)
+
+    serialize_start = time.perf_counter()
+    response = json_response(model_name, preds)
+    end = time.perf_counter()
+    received = request.scope.get("ev_received_at", handler_start)
+    request_metrics.observe("predict", model_name, len(X), (
+        handler_start - received, predict_start - frame_start, serialize_start - predict_start,
+        end - serialize_start, end - received))
+    return response
+
+@app.get("/models")
+def list_models(segment: Optional[str] = Query(None)):
+    production = serving.info["model_name"]
+    try:
+        available = model_pool.available(segment)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    models = []
+    for name, path in available.items():
+        models.append({
+            "model_name": name,
+            "family": name.rsplit("/", 1)[-1].split("_model_")[0],
+            "production": name == production,
+            "loaded": name == production or model_pool.is_loaded(name),
+            "size_bytes": path.stat().st_size,
+        })
+    return {
+        "production": production,
+        "pool_loaded_bytes": model_pool.loaded_bytes(),
+        "pool_budget_bytes": model_pool.budget_bytes,
+        "segments": model_pool.segments(),
+        "models": models,
+    }
+
+@app.post("/ingest")
+def ingest(req: IngestRequest):
+    try:
+        # all or nothing: a rejected hour leaves the store unchanged
+        feature_store.ingest_batch([(h.timestamp, h.total_kwh, h.n_sessions, h.avg_kwh) for h in req.hours])
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return feature_store.status()
+
+@app.post("/predict/next", response_model=PredictResponse)
+def predict_next(req: NextPredictRequest, request: Request):
+    current = serving
+    handler_start = time.perf_counter()
+    start = time.time()
+    try:
+        features = feature_store.build_features(req.timestamp)
+    except InsufficientHistoryError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    X = np.array([[features[c] for c in FEATURE_COLUMNS]], dtype=np.float64)
+    predict_start = time.perf_counter()
+    preds = predict_matrix(current, X)
+    duration = time.time() - start
+
+    model_name = current.info["model_name"]
+    PREDICTION_COUNTER.labels(model_name=model_name).inc()
+    PREDICTION_LATENCY.observe(duration)
+
+    serialize_start = time.perf_counter()
+    response = json_response(model_name, preds)
+    end = time.perf_counter()
+    received = request.scope.get("ev_received_at", handler_start)
+    request_metrics.observe("predict_next", model_name, 1, (
+        handler_start - received, predict_start - handler_start, serialize_start - predict_start,
+        end - serialize_start, end - received))
+    return response
+
+@app.get("/forecast", response_model=ForecastResponse)
+def forecast(request: Request, horizon: int = Query(24, ge=1, le=FORECAST_MAX_HORIZON)):
+    """The next `horizon` hours after the last ingested one, predicted recursively:
+    the same numbers as alternating /predict/next and /ingest of each prediction
+    (n_sessions / avg_kwh held at their last actuals), in one call."""
+    current = serving
+    handler_start = time.perf_counter()
+    start = time.time()
+    model_seconds = 0.0
+
+    def predict_fn(X):
+        nonlocal model_seconds
+        t = time.perf_counter()
+        preds = predict_matrix(current, X)
+        model_seconds += time.perf_counter() - t
+        return preds
+
+    try:
+        timestamps, preds, _ = feature_store.forecast(horizon, predict_fn, FEATURE_COLUMNS)
+    except InsufficientHistoryError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    forecast_seconds = time.perf_counter() - handler_start
+    duration = time.time() - start
+
+    model_name = current.info["model_name"]
+    PREDICTION_COUNTER.labels(model_name=model_name).inc()
+    PREDICTION_LATENCY.observe(duration)
+
+    serialize_start = time.perf_counter()
+    response = Response(json.dumps({
+        "model_name": model_name,
+        "timestamps": [t.isoformat() for t in timestamps],
+        "predictions": preds.tolist(),
+    }), media_type="application/json")
+    end = time.perf_counter()
+    received = request.scope.get("ev_received_at", handler_start)
+    # frame_build: feature rows and state updates between the per-hour model calls
+    request_metrics.observe("forecast", model_name, horizon, (
+        handler_start - received, forecast_seconds - model_seconds, model_seconds,
+        end - serialize_start, end - received))
+    return response
+
+# --------- Columnar batch endpoint ---------
+
+def decode_arrow_batch(body):
+    """Arrow IPC stream -> contiguous (n_rows, n_features) float64 matrix."""
+    import pyarrow as pa
+    table = pa.ipc.open_stream(body).read_all()
+    missing = [c for c in FEATURE_COLUMNS if c not in table.column_names]
+    if missing:
+        raise ValueError(f"missing feature columns: {missing}")
+    X = np.empty((table.num_rows, len(FEATURE_COLUMNS)), dtype=np.float64)
+    for j, col in enumerate(FEATURE_COLUMNS):
+        X[:, j] = table.column(col).to_numpy()
+    return X
+
+def decode_float32_batch(body):
+    """Packed float32 column buffers (column after column, FEATURE_COLUMNS order)
+    -> (n_rows, n_features) matrix."""
+    values = np.frombuffer(body, dtype="<f4")
+    if values.size % len(FEATURE_COLUMNS):
+        raise ValueError(
+            f"buffer of {values.size} float32 values is not a multiple of {len(FEATURE_COLUMNS)} columns"
+        )
+    return values.reshape(len(FEATURE_COLUMNS), -1).T.astype(np.float64)
+
+@app.post("/predict/batch")
+async def predict_batch(request: Request):
+    # imported here, not at startup: only this endpoint needs pyarrow
+    import pyarrow as pa
+    current = serving
+    content_type = request.headers.get("content-type", ARROW_STREAM_MEDIA_TYPE).split(";")[0].strip()
+    body = await request.body()
+
+    decode_start = time.perf_counter()
     start = time.time()
-    df = pd.DataFrame([f.model_dump() for f in req.instances])
-    df = df[FEATURE_COLUMNS]
-    preds = model.predict(df)
+    try:
+        if content_type == ARROW_STREAM_MEDIA_TYPE:
+            X = decode_arrow_batch(body)
+        elif content_type == FLOAT32_MEDIA_TYPE:
+            X = decode_float32_batch(body)
+        else:
+            raise HTTPException(status_code=415, detail=f"unsupported content type: {content_type}")
+    except (ValueError, pa.ArrowInvalid) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    predict_start = time.perf_counter()
+    preds = await run_in_threadpool(predict_matrix, current, X)
     duration = time.time() - start
 
-    PREDICTION_COUNTER.labels(model_name=prod_info["model_name"]).inc()
+    model_name = current.info["model_name"]
+    PREDICTION_COUNTER.labels(model_name=model_name).inc()
     PREDICTION_LATENCY.observe(duration)
 
-    return PredictResponse(
-        model_name=prod_info["model_name"],
-        predictions=preds.tolist()
-    )
+    serialize_start = time.perf_counter()
+    headers = {"X-Model-Name": model_name}
+    if content_type == ARROW_STREAM_MEDIA_TYPE:
+        out = pa.table({"prediction": pa.array(preds, type=pa.float64())})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, out.schema) as writer:
+            writer.write_table(out)
+        response = Response(sink.getvalue().to_pybytes(), media_type=ARROW_STREAM_MEDIA_TYPE, headers=headers)
+    else:
+        response = Response(np.asarray(preds, dtype="<f4").tobytes(), media_type=FLOAT32_MEDIA_TYPE,
+                            headers=headers)
+    end = time.perf_counter()
+    # the body is raw columns: receiving it is the parse phase, decoding it the frame build
+    received = request.scope.get("ev_received_at", decode_start)
+    request_metrics.observe("predict_batch", model_name, len(X), (
+        decode_start - received, predict_start - decode_start, serialize_start - predict_start,
+        end - serialize_start, end - received))
+    return response
@@ -0,0 +1,88 @@
+"""
+batching.py
+Adaptive micro-batching for /predict.
+
+Concurrent requests are queued on the event loop and flushed together as one
+vectorized model call once `max_rows` rows are waiting or `max_wait_ms` has
+passed since the first queued request, whichever comes first. Results are
+scattered back to each caller in submission order.
+"""
+import asyncio
+import time
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+
+class MicroBatcher:
+    def __init__(self, predict_fn, max_rows=256, max_wait_ms=2.0,
+                 batch_size_metric=None, wait_metric=None):
+        """
+        predict_fn(X) -> (predictions, model_name), called in the threadpool
+        with the stacked (n_rows, n_features) matrix of a whole batch.
+        """
+        self.predict_fn = predict_fn
+        self.max_rows = max_rows
+        self.max_wait = max_wait_ms / 1000
+        self.batch_size_metric = batch_size_metric
+        self.wait_metric = wait_metric
+        self._loop = None
+        # the loop only keeps weak references to tasks: hold in-flight batches until they finish
+        self._tasks = set()
+        self._reset()
+
+    def _reset(self):
+        self._pending = []      # (X, future, enqueued_at)
+        self._rows = 0
+        self._timer = None
+
+    async def submit(self, X):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # new event loop (e.g. server restart in the same process): drop stale state
+            self._loop = loop
+            self._tasks = set()
+            self._reset()
+
+        fut = loop.create_future()
+        self._pending.append((X, fut, time.perf_counter()))
+        self._rows += len(X)
+        if self._rows >= self.max_rows:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await fut
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        batch = self._pending
+        self._reset()
+        if batch:
+            task = self._loop.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        flushed_at = time.perf_counter()
+        if self.wait_metric is not None:
+            for _, _, enqueued_at in batch:
+                self.wait_metric.observe(flushed_at - enqueued_at)
+
+        X = batch[0][0] if len(batch) == 1 else np.vstack([x for x, _, _ in batch])
+        if self.batch_size_metric is not None:
+            self.batch_size_metric.observe(len(X))
+        try:
+            preds, model_name = await run_in_threadpool(self.predict_fn, X)
+        except Exception as e:
+            for _, fut, _ in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        offset = 0
+        for x, fut, _ in batch:
+            n = len(x)
+            if not fut.done():
+                fut.set_result((preds[offset:offset + n], model_name))
+            offset += n
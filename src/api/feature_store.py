@@ -0,0 +1,254 @@
+"""
+feature_store.py
+In-process online feature store for the serving API.
+
+Keeps just enough state to rebuild the FEATURE_COLUMNS vector that
+features.engineering() produces for the *next* hourly row:
+  - a ring buffer with the last 168 hourly total_kwh values
+  - running sums for the 3h/6h/24h/168h windows (+ sum of squares for 24h)
+  - the last n_sessions / avg_kwh (for the *_lag1 features)
+  - per (hour_of_day, day_of_week) counts and sums (for hour_dow_mean)
+
+Every ingest and every feature build is O(1).
+
+forecast() runs the same updates on a copy of the state to predict the next
+H hours recursively, each prediction standing in for that hour's actual.
+"""
+import math
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+MAX_LAG = 168
+ROLL_WINDOWS = (3, 6, 24, 168)
+
+
+class InsufficientHistoryError(Exception):
+    """Raised when the store cannot build a complete feature vector yet."""
+
+
+class OnlineFeatureStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer = np.zeros(MAX_LAG, dtype=np.float64)
+        self._pos = 0          # next write slot in the ring buffer
+        self._count = 0        # number of hours ingested so far
+        self._sums = {w: 0.0 for w in ROLL_WINDOWS}
+        self._sumsq_24 = 0.0
+        self._last_n_sessions = None
+        self._last_avg_kwh = None
+        self._last_timestamp = None
+        self._hour_dow_count = np.zeros((24, 7), dtype=np.int64)
+        self._hour_dow_sum = np.zeros((24, 7), dtype=np.float64)
+
+    # --------- State updates ---------
+
+    def _value_back(self, k):
+        """total_kwh observed k rows ago (k=1 is the most recent row)."""
+        return self._buffer[(self._pos - k) % MAX_LAG]
+
+    def ingest(self, timestamp, total_kwh, n_sessions, avg_kwh):
+        """Push one hour of actuals into the store."""
+        self.ingest_batch([(timestamp, total_kwh, n_sessions, avg_kwh)])
+
+    def ingest_batch(self, hours):
+        """Push (timestamp, total_kwh, n_sessions, avg_kwh) hours, oldest first.
+
+        All or nothing: the whole batch is validated before any state changes,
+        so a rejected hour leaves the store as it was.
+        """
+        rows = [(_floor_hour(ts), float(total), float(n), float(avg)) for ts, total, n, avg in hours]
+        with self._lock:
+            previous, source = self._last_timestamp, "the last ingested hour"
+            for timestamp, *_ in rows:
+                if previous is not None and timestamp <= previous:
+                    raise ValueError(
+                        f"timestamp {timestamp.isoformat()} is not after "
+                        f"{source} {previous.isoformat()}"
+                    )
+                previous, source = timestamp, "the previous hour of the batch"
+            for row in rows:
+                self._push(*row)
+
+    def _push(self, timestamp, total_kwh, n_sessions, avg_kwh):
+        """One validated hour; the caller holds the lock."""
+        # slide every rolling window by one row
+        for w in ROLL_WINDOWS:
+            if self._count >= w:
+                self._sums[w] -= self._value_back(w)
+            self._sums[w] += total_kwh
+        if self._count >= 24:
+            dropped = self._value_back(24)
+            self._sumsq_24 -= dropped * dropped
+        self._sumsq_24 += total_kwh * total_kwh
+
+        self._buffer[self._pos] = total_kwh
+        self._pos = (self._pos + 1) % MAX_LAG
+        self._count += 1
+
+        self._hour_dow_count[timestamp.hour, timestamp.weekday()] += 1
+        self._hour_dow_sum[timestamp.hour, timestamp.weekday()] += total_kwh
+
+        self._last_n_sessions = n_sessions
+        self._last_avg_kwh = avg_kwh
+        self._last_timestamp = timestamp
+
+    def ingest_frame(self, hourly):
+        """Seed the store from an hourly frame (index = hour, columns
+        total_kwh / n_sessions / avg_kwh), e.g. features.engineering's groupby."""
+        hourly = hourly.sort_index()
+        self.ingest_batch(zip(hourly.index, hourly["total_kwh"], hourly["n_sessions"], hourly["avg_kwh"]))
+
+    # --------- Feature building ---------
+
+    def build_features(self, timestamp):
+        """Return the feature dict for the row at `timestamp`, using only
+        hours already ingested (same semantics as the shift(1) features)."""
+        timestamp = _floor_hour(timestamp)
+        hour, dow, month = timestamp.hour, timestamp.weekday(), timestamp.month
+
+        with self._lock:
+            if self._count < MAX_LAG:
+                raise InsufficientHistoryError(
+                    f"need {MAX_LAG} ingested hours, have {self._count}"
+                )
+            if self._last_timestamp is not None and timestamp <= self._last_timestamp:
+                raise ValueError(
+                    f"timestamp {timestamp.isoformat()} must be after the last "
+                    f"ingested hour {self._last_timestamp.isoformat()}"
+                )
+            hd_count = self._hour_dow_count[hour, dow]
+            if hd_count == 0:
+                raise InsufficientHistoryError(
+                    f"no history for hour_of_day={hour}, day_of_week={dow}"
+                )
+
+            lag_1 = self._value_back(1)
+            sum_24 = self._sums[24]
+            var_24 = (self._sumsq_24 - sum_24 * sum_24 / 24) / 23
+            features = {
+                "n_sessions_lag1": self._last_n_sessions,
+                "avg_kwh_lag1": self._last_avg_kwh,
+                "lag_1": lag_1,
+                "lag_24": self._value_back(24),
+                "lag_168": self._value_back(168),
+                "diff_lag1": lag_1 - self._value_back(2),
+                "roll_mean_3h": self._sums[3] / 3,
+                "roll_mean_6h": self._sums[6] / 6,
+                "roll_mean_24h": sum_24 / 24,
+                "roll_std_24h": math.sqrt(max(var_24, 0.0)),
+                "roll_mean_168h": self._sums[168] / 168,
+                "hour_dow_mean": self._hour_dow_sum[hour, dow] / hd_count,
+            }
+
+        features.update({
+            "hour_of_day": hour,
+            "day_of_week": dow,
+            "month": month,
+            "is_weekend": int(dow in (5, 6)),
+            "hour_sin": math.sin(2 * math.pi * hour / 24),
+            "hour_cos": math.cos(2 * math.pi * hour / 24),
+            "dow_sin": math.sin(2 * math.pi * dow / 7),
+            "dow_cos": math.cos(2 * math.pi * dow / 7),
+            "month_sin": math.sin(2 * math.pi * (month - 1) / 12),
+            "month_cos": math.cos(2 * math.pi * (month - 1) / 12),
+        })
+        return {k: v if isinstance(v, int) else float(v) for k, v in features.items()}
+
+    # --------- Recursive forecasting ---------
+
+    def forecast(self, horizon, predict_fn, columns):
+        """Predict the `horizon` hours after the last ingested one.
+
+        Each hour's prediction is fed back as its total_kwh (n_sessions and avg_kwh
+        stay at their last actual values), exactly as if it were ingest()-ed before
+        building the next hour's features, so the result matches calling
+        build_features / predict / ingest hour by hour. The live store is not changed.
+
+        predict_fn((1, n_features) matrix in `columns` order) -> predictions.
+        Returns (timestamps, predictions, feature matrix).
+        """
+        with self._lock:
+            if self._count < MAX_LAG:
+                raise InsufficientHistoryError(f"need {MAX_LAG} ingested hours, have {self._count}")
+            # oldest first, so history[p - k] is k rows before row p
+            history = np.empty(MAX_LAG + horizon)
+            history[:MAX_LAG] = np.roll(self._buffer, -self._pos)
+            sums = dict(self._sums)
+            sumsq_24 = self._sumsq_24
+            hd_count = self._hour_dow_count.copy()
+            hd_sum = self._hour_dow_sum.copy()
+            last_n_sessions, last_avg_kwh = self._last_n_sessions, self._last_avg_kwh
+            start = self._last_timestamp + timedelta(hours=1)
+
+        # everything that does not depend on earlier predictions is filled in up front
+        timestamps = [start + timedelta(hours=h) for h in range(horizon)]
+        hours = np.array([t.hour for t in timestamps])
+        dows = np.array([t.weekday() for t in timestamps])
+        months = np.array([t.month for t in timestamps])
+        col = {name: j for j, name in enumerate(columns)}
+        X = np.empty((horizon, len(columns)))
+        X[:, col["hour_of_day"]] = hours
+        X[:, col["day_of_week"]] = dows
+        X[:, col["month"]] = months
+        X[:, col["is_weekend"]] = dows >= 5
+        for name, values, period, offset in (("hour", hours, 24, 0), ("dow", dows, 7, 0), ("month", months, 12, 1)):
+            # math.sin/cos per distinct value, as build_features computes them
+            angles = [2 * math.pi * (v - offset) / period for v in range(period + offset)]
+            X[:, col[f"{name}_sin"]] = np.array([math.sin(a) for a in angles])[values]
+            X[:, col[f"{name}_cos"]] = np.array([math.cos(a) for a in angles])[values]
+        X[:, col["n_sessions_lag1"]] = last_n_sessions
+        X[:, col["avg_kwh_lag1"]] = last_avg_kwh
+
+        # the rest needs the previous hours' predictions: one row at a time, O(1) each
+        lag_1, lag_24, lag_168, diff_lag1 = col["lag_1"], col["lag_24"], col["lag_168"], col["diff_lag1"]
+        roll = {w: col[f"roll_mean_{w}h"] for w in ROLL_WINDOWS}
+        roll_std_24h, hour_dow_mean = col["roll_std_24h"], col["hour_dow_mean"]
+        predictions = np.empty(horizon)
+        for i in range(horizon):
+            p = MAX_LAG + i
+            hour, dow = hours[i], dows[i]
+            if hd_count[hour, dow] == 0:
+                raise InsufficientHistoryError(f"no history for hour_of_day={hour}, day_of_week={dow}")
+            row = X[i]
+            row[lag_1] = history[p - 1]
+            row[diff_lag1] = history[p - 1] - history[p - 2]
+            row[lag_24] = history[p - 24]
+            row[lag_168] = history[p - MAX_LAG]
+            for w in ROLL_WINDOWS:
+                row[roll[w]] = sums[w] / w
+            var_24 = (sumsq_24 - sums[24] * sums[24] / 24) / 23
+            row[roll_std_24h] = math.sqrt(max(var_24, 0.0))
+            row[hour_dow_mean] = hd_sum[hour, dow] / hd_count[hour, dow]
+
+            y = float(predict_fn(X[i:i + 1])[0])
+            predictions[i] = y
+            # ingest(y), in the same order of operations
+            for w in ROLL_WINDOWS:
+                sums[w] -= history[p - w]
+                sums[w] += y
+            dropped = history[p - 24]
+            sumsq_24 -= dropped * dropped
+            sumsq_24 += y * y
+            history[p] = y
+            hd_count[hour, dow] += 1
+            hd_sum[hour, dow] += y
+        return timestamps, predictions, X
+
+    def status(self):
+        with self._lock:
+            return {
+                "hours_ingested": self._count,
+                "last_timestamp": self._last_timestamp.isoformat() if self._last_timestamp else None,
+                "ready": self._count >= MAX_LAG,
+            }
+
+
+def _floor_hour(timestamp):
+    """Naive hour bucket; timezone-aware timestamps are converted to UTC first."""
+    if not isinstance(timestamp, datetime):
+        timestamp = datetime.fromisoformat(str(timestamp))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
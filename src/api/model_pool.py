@@ -0,0 +1,129 @@
+"""
+model_pool.py
+Lazily loaded pool of challenger models served next to production.
+
+Models are looked up in models/ by full name (e.g. "xgb_model_20251117_2233")
+or by family ("xgb" -> newest model of that family). Per-segment models
+(train.py --segment garage_id=Bl2) live in models/segments/<key>=<value>/ and
+are pooled as "<key>=<value>/<model name>". Loaded models live in an LRU
+bounded by a memory budget; the on-disk artifact size is used as the estimate
+of a model's footprint.
+
+A request for a loaded model never scans the directory: full names are looked
+up in the pool, and a family's newest model is remembered until the directory
+changes (one stat per request).
+"""
+import re
+import threading
+from collections import OrderedDict
+
+MODEL_FAMILIES = ("lr", "dt", "xgb", "lgb")
+SEGMENTS_DIR = "segments"
+SEGMENT_PATTERN = re.compile(r"[A-Za-z_]+=[\w\-. ]+")
+
+
+class ModelPool:
+    def __init__(self, models_dir, load_fn, budget_bytes=512 * 1024 * 1024):
+        """load_fn(path, model_name) -> ServingModel"""
+        self.models_dir = models_dir
+        self.load_fn = load_fn
+        self.budget_bytes = budget_bytes
+        self._loaded = OrderedDict()     # model_name -> (ServingModel, size_bytes)
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._families = {}              # (family, segment) -> (directory mtime_ns, model_name)
+
+    def available(self, segment=None):
+        if segment is None:
+            return {p.stem: p for p in sorted(self.models_dir.glob("*.joblib"))}
+        # one path component, so a segment can never point outside models/segments/
+        if not SEGMENT_PATTERN.fullmatch(segment):
+            raise KeyError(f"invalid segment: {segment} (expected <key>=<value>)")
+        segment_dir = self.models_dir / SEGMENTS_DIR / segment
+        return {f"{segment}/{p.stem}": p for p in sorted(segment_dir.glob("*.joblib"))}
+
+    def segments(self):
+        return sorted(p.name for p in (self.models_dir / SEGMENTS_DIR).glob("*=*") if p.is_dir())
+
+    def resolve(self, name, segment=None):
+        """Full model name or family shorthand (within `segment`, if given) -> pooled model name."""
+        available = self.available(segment)
+        prefix = "" if segment is None else f"{segment}/"
+        if prefix + name in available:
+            return prefix + name
+        if name in MODEL_FAMILIES:
+            family = sorted(n for n in available if n.startswith(f"{prefix}{name}_model_"))
+            if family:
+                return family[-1]
+        raise KeyError(f"unknown model: {name}" + (f" for segment {segment}" if segment else ""))
+
+    def _directory(self, segment):
+        return self.models_dir if segment is None else self.models_dir / SEGMENTS_DIR / segment
+
+    def lookup(self, name, segment=None):
+        """resolve() without the directory scan when the answer is already known."""
+        prefix = "" if segment is None else f"{segment}/"
+        with self._lock:
+            if prefix + name in self._loaded:
+                return prefix + name
+        if name not in MODEL_FAMILIES or (segment is not None and not SEGMENT_PATTERN.fullmatch(segment)):
+            return self.resolve(name, segment)
+        try:
+            mtime = self._directory(segment).stat().st_mtime_ns
+        except (OSError, ValueError):
+            return self.resolve(name, segment)
+        cached = self._families.get((name, segment))
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        model_name = self.resolve(name, segment)
+        self._families[(name, segment)] = (mtime, model_name)
+        return model_name
+
+    def loaded_bytes(self):
+        with self._lock:
+            return sum(size for _, size in self._loaded.values())
+
+    def is_loaded(self, model_name):
+        with self._lock:
+            return model_name in self._loaded
+
+    def get(self, name, segment=None):
+        model_name = self.lookup(name, segment)
+        with self._lock:
+            entry = self._loaded.get(model_name)
+            if entry is not None:
+                self._loaded.move_to_end(model_name)
+                return entry[0]
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+
+        # one loader per model; other callers wait for it instead of loading twice
+        with load_lock:
+            try:
+                with self._lock:
+                    entry = self._loaded.get(model_name)
+                    if entry is not None:
+                        return entry[0]
+                path = self.available(segment)[model_name]
+                serving_model = self.load_fn(path, model_name)
+                size = path.stat().st_size
+                with self._lock:
+                    self._loaded[model_name] = (serving_model, size)
+                    self._evict(keep=model_name)
+                return serving_model
+            finally:
+                # waiters already hold the lock object; later callers find the model loaded
+                with self._lock:
+                    if self._load_locks.get(model_name) is load_lock:
+                        del self._load_locks[model_name]
+
+    def _evict(self, keep):
+        total = sum(size for _, size in self._loaded.values())
+        for name in list(self._loaded):
+            if total <= self.budget_bytes:
+                break
+            if name == keep:
+                continue
+            _, size = self._loaded.pop(name)
+            self._load_locks.pop(name, None)
+            total -= size
+            print(f"[INFO] Evicted model from pool: {name}")
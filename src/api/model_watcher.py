@@ -0,0 +1,80 @@
+"""
+model_watcher.py
+Background watcher that hot-reloads the production model when
+models/registry.json changes.
+
+The new model is loaded and warmed up on the watcher thread, then handed to
+`swap_fn` which rebinds a single reference. Requests that already grabbed the
+old ServingModel keep using it until they finish.
+"""
+import threading
+from datetime import datetime, timezone
+from typing import Any, NamedTuple
+
+
+class ServingModel(NamedTuple):
+    model: Any
+    info: dict
+    loaded_at: datetime
+    load_seconds: float
+    compiled: Any = None    # CompiledModel used for small batches, if exported
+
+
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
+class RegistryWatcher:
+    def __init__(self, registry_path, load_fn, swap_fn, interval=5.0):
+        """
+        load_fn() -> ServingModel or None (None = nothing new to serve)
+        swap_fn(ServingModel) installs the new model
+        """
+        self.registry_path = registry_path
+        self.load_fn = load_fn
+        self.swap_fn = swap_fn
+        self.interval = interval
+        self._last_signature = self._signature()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _signature(self):
+        try:
+            st = self.registry_path.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def check_once(self):
+        """Reload if the registry changed since the last check. Returns True on swap."""
+        signature = self._signature()
+        if signature is None or signature == self._last_signature:
+            return False
+        # remember it even on failure so a broken registry is not retried every tick;
+        # the next write to the file changes the signature again
+        self._last_signature = signature
+        try:
+            new = self.load_fn()
+        except Exception as e:
+            print(f"[WARN] Model reload failed, keeping current model: {e}")
+            return False
+        if new is None:
+            return False
+        self.swap_fn(new)
+        print(f"[OK] Hot-reloaded production model: {new.info['model_name']}")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check_once()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="registry-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
@@ -0,0 +1,65 @@
+"""
+prediction_cache.py
+Bounded LRU + TTL cache of single-row predictions.
+
+Entries are keyed by (model_name, raw bytes of the FEATURE_COLUMNS row), so a
+new production model never sees predictions from the previous one.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PredictionCache:
+    def __init__(self, max_entries=10000, ttl_seconds=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()   # key -> (prediction, expires_at)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _keys(X, model_name):
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        return [(model_name, row.tobytes()) for row in X]
+
+    def lookup(self, X, model_name):
+        """Return (predictions, miss_mask, keys). Missed rows hold NaN."""
+        keys = self._keys(X, model_name)
+        preds = np.full(len(keys), np.nan)
+        miss = np.ones(len(keys), dtype=bool)
+        now = time.monotonic()
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                value, expires_at = entry
+                if expires_at < now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                preds[i] = value
+                miss[i] = False
+        return preds, miss, keys
+
+    def store(self, keys, preds):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for key, value in zip(keys, preds):
+                self._entries[key] = (float(value), expires_at)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,82 @@
+"""
+request_metrics.py
+Per-phase latency, rows per request and rows predicted for the prediction
+endpoints, labelled by endpoint and model name.
+
+prometheus_client histograms cost ~2-4 us per labelled observe (label lookup,
+lock, bucket scan), ~15 us for the five phases and the row count of every
+request. Here a request is one call that bisects each value into plain bucket
+lists under a single lock (~3-4 us in all); the Prometheus metric families
+are built from those lists only when /metrics is scraped.
+"""
+import threading
+from bisect import bisect_left
+
+from prometheus_client.core import CounterMetricFamily, HistogramMetricFamily
+
+PHASES = ("parse_validate", "frame_build", "predict", "serialize", "total")
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5)
+ROW_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384, 65536)
+
+
+class _Series:
+    __slots__ = ("phase_counts", "phase_sums", "row_counts", "rows")
+
+    def __init__(self):
+        self.phase_counts = [[0] * (len(LATENCY_BUCKETS) + 1) for _ in PHASES]
+        self.phase_sums = [0.0] * len(PHASES)
+        self.row_counts = [0] * (len(ROW_BUCKETS) + 1)
+        self.rows = 0
+
+
+def _histogram_buckets(bounds, counts):
+    """Per-bucket counts -> Prometheus cumulative [(le, count)], ending with +Inf."""
+    buckets, total = [], 0
+    for bound, count in zip(bounds, counts):
+        total += count
+        buckets.append((str(bound), total))
+    buckets.append(("+Inf", total + counts[-1]))
+    return buckets
+
+
+class RequestMetrics:
+    """A prometheus_client collector: register it with REGISTRY.register()."""
+
+    def __init__(self):
+        self._series = {}       # (endpoint, model_name) -> _Series
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, model_name, rows, timings):
+        """timings: seconds per PHASES entry, None for a phase the endpoint does not have."""
+        with self._lock:
+            series = self._series.get((endpoint, model_name))
+            if series is None:
+                series = self._series[(endpoint, model_name)] = _Series()
+            for i, value in enumerate(timings):
+                if value is not None:
+                    series.phase_counts[i][bisect_left(LATENCY_BUCKETS, value)] += 1
+                    series.phase_sums[i] += value
+            series.row_counts[bisect_left(ROW_BUCKETS, rows)] += 1
+            series.rows += rows
+
+    def collect(self):
+        with self._lock:
+            snapshot = {key: ([list(c) for c in s.phase_counts], list(s.phase_sums), list(s.row_counts), s.rows)
+                        for key, s in self._series.items()}
+        phases = HistogramMetricFamily("ev_request_phase_seconds",
+                                       "Time per phase of a prediction request (parse_validate covers receiving "
+                                       "and validating the body)", labels=["endpoint", "phase", "model_name"])
+        request_rows = HistogramMetricFamily("ev_request_rows", "Rows per prediction request",
+                                             labels=["endpoint", "model_name"])
+        predicted = CounterMetricFamily("ev_predicted_rows", "Rows predicted", labels=["endpoint", "model_name"])
+        for (endpoint, model_name), (phase_counts, phase_sums, row_counts, rows) in snapshot.items():
+            for phase, counts, total in zip(PHASES, phase_counts, phase_sums):
+                if any(counts):
+                    phases.add_metric([endpoint, phase, model_name], _histogram_buckets(LATENCY_BUCKETS, counts),
+                                      total)
+            request_rows.add_metric([endpoint, model_name], _histogram_buckets(ROW_BUCKETS, row_counts), rows)
+            predicted.add_metric([endpoint, model_name], rows)
+        yield phases
+        yield request_rows
+        yield predicted
@@ -1,85 +1,249 @@
-import boto3
-import joblib
+import io
+import os
+import sys
 import json
-import pandas as pd
-from io import BytesIO
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
 from datetime import datetime
 
+# make the `src` package importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from src.aws import storage
+from src.inference.tree_engine import export_matches, load_compiled
 
-# S3 configuration for LocalStack
 
-s3 = boto3.client("s3", endpoint_url="http://localhost:4566",
-                  aws_access_key_id="test", aws_secret_access_key="test")
+# S3 configuration for LocalStack: the shared client, kept across warm invocations
+s3 = storage.client()
 BUCKET = "ev-data"
 
-# Path to model registry 
+# row groups up to this many rows use the compiled NumPy engine; larger ones the estimator
+COMPILED_MAX_ROWS = 1024
+
+# ranged GET size when reading the input, and multipart part size when writing the output
+READ_BLOCK_SIZE = 1024 * 1024
+UPLOAD_PART_SIZE = int(os.getenv("UPLOAD_PART_SIZE", 8 * 1024 * 1024))  # S3 minimum is 5 MB
+
+# Path to model registry
 BASE_DIR = Path(__file__).resolve().parents[2]  # mlops/
 REGISTRY_PATH = BASE_DIR / "src/models/registry.json"
+MODELS_DIR = BASE_DIR / "src/models"
+
+FEATURE_COLUMNS = [
+    "n_sessions_lag1",
+    "avg_kwh_lag1",
+    "hour_of_day",
+    "day_of_week",
+    "month",
+    "is_weekend",
+    "hour_sin",
+    "hour_cos",
+    "dow_sin",
+    "dow_cos",
+    "month_sin",
+    "month_cos",
+    "lag_1",
+    "lag_24",
+    "lag_168",
+    "diff_lag1",
+    "roll_mean_3h",
+    "roll_mean_6h",
+    "roll_mean_24h",
+    "roll_std_24h",
+    "roll_mean_168h",
+    "hour_dow_mean",
+]
+
+
+# --------- Warm model cache ---------
+# Module state survives between invocations of a warm Lambda container, so the
+# model is only (re)loaded when registry.json changes.
+
+_model_cache = {"registry_mtime": None, "model_path": None, "model": None, "compiled": None}
+
+
+def resolve_model_path(raw_path):
+    # registry paths may come from another machine (e.g. Windows); fall back to models/<filename>
+    if Path(raw_path).exists():
+        return Path(raw_path)
+    return MODELS_DIR / raw_path.split("\\")[-1].split("/")[-1]
+
+
+def verified_compiled(model_path):
+    """The compiled export of model_path if it was parity-checked against this very
+    joblib and fits FEATURE_COLUMNS, else None (the estimator serves every row group)."""
+    compiled = load_compiled(model_path)
+    if compiled is None:
+        return None
+    if compiled.feature_names != FEATURE_COLUMNS:
+        print(f"[WARN] Ignoring compiled export of {model_path.name}: feature order differs from FEATURE_COLUMNS")
+        return None
+    if not export_matches(compiled, model_path):
+        print(f"[WARN] Ignoring compiled export of {model_path.name}: not verified against this model file")
+        return None
+    return compiled
+
+
+def get_production_model():
+    mtime = REGISTRY_PATH.stat().st_mtime_ns
+    if _model_cache["registry_mtime"] == mtime:
+        return _model_cache
+
+    with open(REGISTRY_PATH) as f:
+        reg = json.load(f)
+    model_path = resolve_model_path(reg['production']['model_path'])
+    if model_path != _model_cache["model_path"]:
+        print(f"Loading model from: {model_path}")
+        _model_cache["model"] = None
+        _model_cache["compiled"] = verified_compiled(model_path)
+        _model_cache["model_path"] = model_path
+    _model_cache["registry_mtime"] = mtime
+    return _model_cache
+
+
+def predict_batch(cache, features):
+    """Compiled engine for small row groups, the estimator (loaded on first need) otherwise.
+    joblib is imported only then: with an export, a cold start never unpickles sklearn / xgboost / lightgbm."""
+    if cache["compiled"] is not None and len(features) <= COMPILED_MAX_ROWS:
+        return cache["compiled"].predict(features)
+    if cache["model"] is None:
+        import joblib
+        cache["model"] = joblib.load(cache["model_path"])
+    return cache["model"].predict(features)
+
+
+# --------- Streaming S3 I/O ---------
+
+class S3RangeReader(io.RawIOBase):
+    """Seekable, read-only view of an S3 object backed by ranged GETs, so
+    pyarrow can fetch the footer and then one row group at a time."""
+
+    def __init__(self, bucket, key):
+        self.bucket, self.key = bucket, key
+        self.size = s3.head_object(Bucket=bucket, Key=key)['ContentLength']
+        self.pos = 0
+        self._block_start, self._block = 0, b""
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.pos = offset
+        elif whence == io.SEEK_CUR:
+            self.pos += offset
+        else:
+            self.pos = self.size + offset
+        return self.pos
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            n = self.size - self.pos
+        n = max(0, min(n, self.size - self.pos))
+        if n == 0:
+            return b""
+        start, end = self.pos, self.pos + n
+        block_end = self._block_start + len(self._block)
+        if not (self._block_start <= start and end <= block_end):
+            # small reads (footer, page headers) are served from one read-ahead block
+            fetch_end = min(self.size, start + max(n, READ_BLOCK_SIZE))
+            obj = s3.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={start}-{fetch_end - 1}")
+            self._block_start, self._block = start, obj['Body'].read()
+        offset = start - self._block_start
+        self.pos = end
+        return self._block[offset:offset + n]
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+class S3MultipartWriter(io.RawIOBase):
+    """Write-only stream that uploads to S3 in UPLOAD_PART_SIZE parts."""
+
+    def __init__(self, bucket, key):
+        self.bucket, self.key = bucket, key
+        self.upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key)['UploadId']
+        self.parts = []
+        self.buffer = bytearray()
+        self.written = 0
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.written
+
+    def write(self, b):
+        self.buffer += b
+        self.written += len(b)
+        if len(self.buffer) >= UPLOAD_PART_SIZE:
+            self._upload_part()
+        return len(b)
+
+    def _upload_part(self):
+        part_number = len(self.parts) + 1
+        res = s3.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                             PartNumber=part_number, Body=bytes(self.buffer))
+        self.parts.append({"ETag": res["ETag"], "PartNumber": part_number})
+        self.buffer = bytearray()
+
+    def complete(self):
+        if self.buffer or not self.parts:
+            self._upload_part()
+        s3.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                     MultipartUpload={"Parts": self.parts})
+
+    def abort(self):
+        s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
 
 def handler(event, context=None):
-    # 1. Figure out S3 key from event 
+    # 1. Figure out S3 key from event
     record = event['Records'][0]
     input_key = record['s3']['object']['key']  # e.g. 'raw/infer_input.parquet'
 
-    # 2. Read features Parquet from S3 
-    obj = s3.get_object(Bucket=BUCKET, Key=input_key)
-    df = pd.read_parquet(BytesIO(obj['Body'].read()))
+    # 2. Load latest production model from registry (cached while registry.json is unchanged)
+    cache = get_production_model()
+
+    # 3. Open the input Parquet lazily: only the footer is fetched here
     '''
-    we can't use the pd.read_parquet("s3://...") methode here 
+    we can't use the pd.read_parquet("s3://...") methode here
     because it requires additional dependencies and setup for s3 access (bad for portability)
     '''
+    source = pq.ParquetFile(S3RangeReader(BUCKET, input_key))
+    out_schema = source.schema_arrow.append(pa.field('predicted_total_kwh', pa.float64()))
 
-    # 3. Load latest production model from registry (local path)
-    with open(REGISTRY_PATH) as f:
-        reg = json.load(f)
-    prod = reg['production']
-    model_path = prod['model_path']
-    model = joblib.load(model_path)
-
-    # 4. Build DataFrame in expected order
-    FEATURE_COLUMNS = [
-        "n_sessions_lag1",
-        "avg_kwh_lag1",
-        "hour_of_day",
-        "day_of_week",
-        "month",
-        "is_weekend",
-        "hour_sin",
-        "hour_cos",
-        "dow_sin",
-        "dow_cos",
-        "month_sin",
-        "month_cos",
-        "lag_1",
-        "lag_24",
-        "lag_168",
-        "diff_lag1",
-        "roll_mean_3h",
-        "roll_mean_6h",
-        "roll_mean_24h",
-        "roll_std_24h",
-        "roll_mean_168h",
-        "hour_dow_mean",
-    ] 
-    df_features = df[FEATURE_COLUMNS]
-
-    # 5. Predict
-    preds = model.predict(df_features)
-    df['predicted_total_kwh'] = preds 
-
-    # 6. Write predictions to S3
     now = datetime.now().strftime("%Y%m%d_%H%M")
     orig_base = Path(input_key).stem  # e.g., "your_uploaded_file"
     output_key = f"predictions/{now}_{orig_base}_pred.parquet"
-    output_buf = BytesIO()
-    df.to_parquet(output_buf, index=False)
-    output_buf.seek(0)
-    s3.put_object(Bucket=BUCKET, Key=output_key, Body=output_buf.getvalue())
+
+    # 4. Score and write one row group at a time, so memory stays at ~one row group
+    sink = S3MultipartWriter(BUCKET, output_key)
+    rows = 0
+    try:
+        with pq.ParquetWriter(pa.PythonFile(sink, mode='w'), out_schema) as writer:
+            for i in range(source.num_row_groups):
+                table = source.read_row_group(i)
+                features = table.select(FEATURE_COLUMNS).to_pandas()
+                preds = predict_batch(cache, features)
+                writer.write_table(table.append_column('predicted_total_kwh', pa.array(preds, pa.float64())))
+                rows += table.num_rows
+        sink.complete()
+    except Exception:
+        sink.abort()
+        raise
 
     print(f"Predictions written to s3://{BUCKET}/{output_key}")
 
-    return {"result_key": output_key, "predictions_written": len(df)}
+    return {"result_key": output_key, "predictions_written": rows}
 
 # For local test:
 if __name__ == '__main__':
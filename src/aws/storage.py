@@ -0,0 +1,254 @@
+"""
+storage.py
+Shared S3 (LocalStack) access for the pipeline stages and the Lambda handler.
+
+- one boto3 client per process, created on first use and reused by every
+  call (its connection pool is sized for the parallel downloads below)
+- reads go through an on-disk cache keyed by bucket/key/ETag: an object is
+  downloaded once and served locally until its ETag changes. The cache is
+  bounded by total size and evicts the least recently used objects first
+- objects of DOWNLOAD_PART_SIZE or more are downloaded as parallel ranged GETs
+"""
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import boto3
+import pandas as pd
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "http://localhost:4566")
+BASE_DIR = Path(__file__).resolve().parents[2]  # mlops/
+CACHE_DIR = Path(os.getenv("S3_CACHE_DIR", BASE_DIR / "data" / "s3_cache"))
+CACHE_MAX_BYTES = int(os.getenv("S3_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+DOWNLOAD_PART_SIZE = 16 * 1024 * 1024
+DOWNLOAD_WORKERS = 8
+# prefix views (see fetch) another process may still be reading are kept this long
+VIEW_TTL_SECONDS = 600
+TRANSFER_CONFIG = TransferConfig(multipart_threshold=DOWNLOAD_PART_SIZE, multipart_chunksize=DOWNLOAD_PART_SIZE,
+                                 max_concurrency=DOWNLOAD_WORKERS)
+
+
+# --------- Pooled client ---------
+
+_client = None
+_client_lock = threading.Lock()
+_buckets = set()
+
+def client():
+    """The process-wide S3 client (boto3 clients are thread-safe)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = boto3.client("s3", endpoint_url=ENDPOINT_URL,
+                                       aws_access_key_id="test", aws_secret_access_key="test",
+                                       config=Config(max_pool_connections=DOWNLOAD_WORKERS * 2))
+    return _client
+
+def split_uri(uri):
+    """s3://bucket/key -> (bucket, key)."""
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    return bucket, key
+
+def ensure_bucket(bucket):
+    if bucket in _buckets:
+        return
+    try:
+        client().create_bucket(Bucket=bucket)
+    except Exception:
+        pass    # already exists
+    _buckets.add(bucket)
+
+def list_objects(bucket, prefix):
+    """Every object under the prefix: [{"Key", "ETag", "Size", ...}]."""
+    objects, token = [], None
+    while True:
+        kwargs = {"Bucket": bucket, "Prefix": prefix}
+        if token:
+            kwargs["ContinuationToken"] = token
+        page = client().list_objects_v2(**kwargs)
+        objects += page.get("Contents", [])
+        if not page.get("IsTruncated"):
+            return objects
+        token = page["NextContinuationToken"]
+
+def delete_prefix(bucket, prefix, keep=()):
+    for obj in list_objects(bucket, prefix):
+        if obj["Key"] not in keep:
+            client().delete_object(Bucket=bucket, Key=obj["Key"])
+
+def upload_file(local_path, bucket, key):
+    """Upload (multipart and parallel for large files). The file is also added to
+    the read cache, so a later stage reading it back does not download it."""
+    ensure_bucket(bucket)
+    client().upload_file(str(local_path), bucket, key, Config=TRANSFER_CONFIG)
+    etag = client().head_object(Bucket=bucket, Key=key)["ETag"]
+    read_cache().add(bucket, key, etag, local_path)
+
+
+# --------- Read cache ---------
+
+class ReadCache:
+    """Objects stored as <root>/objects/<hash of bucket/key>/<ETag>. The mtime of an
+    entry is its last use; evict() drops the oldest until the total fits max_bytes."""
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path(self, bucket, key, etag):
+        name = hashlib.sha256(f"{bucket}/{key}".encode()).hexdigest()
+        return self.root / "objects" / name[:2] / name / etag.strip('"').replace("/", "_")
+
+    def get(self, bucket, key, etag):
+        path = self.path(bucket, key, etag)
+        try:
+            os.utime(path)      # mark as recently used
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, bucket, key, etag, write):
+        """Store the object written by write(tmp_path); returns its cache path."""
+        path = self.path(bucket, key, etag)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            write(tmp)
+            # older ETags of this key can never be read again
+            for stale in path.parent.iterdir():
+                if stale.name != path.name and not stale.name.startswith("."):
+                    stale.unlink(missing_ok=True)
+            tmp.replace(path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        self.evict(keep=path)
+        return path
+
+    def add(self, bucket, key, etag, local_path):
+        # a copy, not a link: the local file may be rewritten in place later
+        return self.put(bucket, key, etag, lambda tmp: shutil.copyfile(local_path, tmp))
+
+    def entries(self):
+        return [p for p in (self.root / "objects").glob("*/*/*") if not p.name.startswith(".")]
+
+    def evict(self, keep=None):
+        with self._lock:
+            entries = []
+            for path in self.entries():
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries, key=lambda e: e[0]):
+                if total <= self.max_bytes:
+                    break
+                if path != keep:
+                    path.unlink(missing_ok=True)
+                    total -= size
+
+_read_cache = None
+
+def read_cache():
+    global _read_cache
+    if _read_cache is None:
+        _read_cache = ReadCache()
+    return _read_cache
+
+
+# --------- Reads ---------
+
+def _get_range(bucket, key, etag, start, end, dest):
+    """Bytes [start, end) written at the same offset of dest, through this thread's
+    own handle. IfMatch fails the read instead of mixing two versions of an object
+    that changed mid-download."""
+    body = client().get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end - 1}", IfMatch=etag)["Body"]
+    with open(dest, "r+b") as f:
+        f.seek(start)
+        for chunk in iter(lambda: body.read(1024 * 1024), b""):
+            f.write(chunk)
+
+def download(bucket, key, etag, size, dest):
+    """Download one object version to dest, in parallel ranges when it is large."""
+    ranges = [(start, min(start + DOWNLOAD_PART_SIZE, size)) for start in range(0, size, DOWNLOAD_PART_SIZE)]
+    # full size up front, so every range can be written in place
+    with open(dest, "wb") as f:
+        f.truncate(size)
+    if len(ranges) <= 1:
+        for start, end in ranges:
+            _get_range(bucket, key, etag, start, end, dest)
+    else:
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+            list(pool.map(lambda r: _get_range(bucket, key, etag, r[0], r[1], dest), ranges))
+
+def fetch_object(bucket, key, etag=None, size=None):
+    """Local path of the current version of an object, downloading it on a cache miss."""
+    if etag is None or size is None:
+        head = client().head_object(Bucket=bucket, Key=key)
+        etag, size = head["ETag"], head["ContentLength"]
+    cached = read_cache().get(bucket, key, etag)
+    if cached is not None:
+        return cached
+    return read_cache().put(bucket, key, etag, lambda tmp: download(bucket, key, etag, size, tmp))
+
+def fetch(uri):
+    """Local path for an s3:// object or prefix. A prefix becomes a directory of links
+    to the cached objects, laid out like the keys, so partitioned datasets read the
+    same as from S3 (and _-prefixed files like manifests are skipped the same way)."""
+    bucket, key = split_uri(uri)
+    if key and not key.endswith("/"):
+        try:
+            return fetch_object(bucket, key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in ("404", "NoSuchKey"):
+                raise
+        key += "/"      # s3://bucket/dataset without the trailing slash
+    objects = [obj for obj in list_objects(bucket, key) if not obj["Key"].endswith("/")]
+    if not objects:
+        raise FileNotFoundError(uri)
+    # one view per (prefix, listing): an unchanged dataset reuses the view that is already there
+    listing = hashlib.sha256("\n".join(f"{o['Key']}:{o['ETag']}" for o in objects).encode()).hexdigest()[:16]
+    prefix_id = hashlib.sha256(f"{bucket}/{key}".encode()).hexdigest()[:16]
+    views = read_cache().root / "views"
+    view = views / f"{prefix_id}-{listing}"
+    if not view.exists():
+        staging = views / f".{view.name}.{uuid.uuid4().hex}"
+        for obj in objects:
+            path = fetch_object(bucket, obj["Key"], obj["ETag"], obj["Size"])
+            link = staging / obj["Key"][len(key):]
+            link.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(path, link)
+            except OSError:
+                shutil.copyfile(path, link)
+        try:
+            staging.rename(view)
+        except OSError:
+            shutil.rmtree(staging)      # another process built the same view first
+    else:
+        for obj in objects:
+            read_cache().get(bucket, obj["Key"], obj["ETag"])
+    os.utime(view)
+    for old in views.glob(f"{prefix_id}-*"):
+        if old != view and old.stat().st_mtime < time.time() - VIEW_TTL_SECONDS:
+            shutil.rmtree(old, ignore_errors=True)
+    return view
+
+def read_parquet(path, **kwargs):
+    """pd.read_parquet for local paths and s3:// URIs (through the read cache)."""
+    path = str(path)
+    if path.startswith("s3://"):
+        path = fetch(path)
+    return pd.read_parquet(path, **kwargs)
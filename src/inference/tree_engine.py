@@ -0,0 +1,394 @@
+"""
+tree_engine.py
+Compiled, NumPy-only inference for the trained models.
+
+`compile_model()` flattens a fitted DecisionTreeRegressor, XGBRegressor or
+LGBMRegressor into one packed node table (all trees concatenated), or a
+LinearRegression into its coefficients. `CompiledModel.predict()` then walks
+every tree for the whole batch at once with array indexing, one depth level
+per iteration, with no DataFrame validation, DMatrix or Dataset construction.
+
+Node layout: the two children of a split are stored next to each other, so
+descending is `idx = left[idx] + go_right` (one gather per level). Leaves
+point back at themselves and split on an all-zero padding column against
++inf, so rows that reach a leaf early stay there while deeper rows descend.
+
+Artifacts are saved as `<model>.npz` next to the joblib (see `export_model`).
+They record the sha256 of that joblib and the parity check run at export, so a
+server can serve the export without unpickling the estimator (and importing
+sklearn / xgboost / lightgbm) to check it again: see `export_matches`. The
+arrays are stored uncompressed and `load_compiled` memory-maps them, so
+loading costs the same for any model size and processes serving the same file
+share its pages.
+"""
+import hashlib
+import json
+import mmap
+import zipfile
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+# LightGBM treats |x| <= kZeroThreshold as zero for missing_type == "Zero"
+LGB_ZERO_THRESHOLD = 1e-35
+
+# per-node missing value handling
+MISSING_NAN = 0         # NaN follows default_left
+MISSING_AS_ZERO = 1     # NaN is replaced by 0.0 before the comparison (LightGBM "None")
+MISSING_ZERO = 2        # NaN and zero follow default_left (LightGBM "Zero")
+
+NODE_DTYPE = np.dtype([
+    ("threshold", np.float64),
+    ("feature", np.int32),
+    ("left", np.int32),
+    ("default_left", np.bool_),
+    ("missing_mode", np.int8),
+])
+
+COMPILED_SUFFIX = ".npz"
+
+# max rows x trees elements walked at once
+CHUNK_ELEMENTS = 1 << 20
+
+
+class CompiledModel:
+    def __init__(self, kind, feature_names, meta, **arrays):
+        self.kind = kind                    # "trees" or "linear"
+        self.feature_names = list(feature_names)
+        self.meta = meta
+        for name, value in arrays.items():
+            setattr(self, name, value)
+
+    # --------- Prediction ---------
+
+    def _as_matrix(self, X):
+        if hasattr(X, "columns"):
+            X = X[self.feature_names].to_numpy(dtype=np.float64)
+        return np.asarray(X, dtype=np.float64)
+
+    def predict(self, X):
+        X = self._as_matrix(X)
+        if self.kind == "linear":
+            return X @ self.coef + self.intercept
+
+        # padding column of zeros that every leaf "splits" on
+        n, n_features = X.shape
+        Xp = np.zeros((n, n_features + 1), dtype=np.float64)
+        if self.meta["float32_inputs"]:
+            # sklearn and xgboost compare float32 inputs against their thresholds
+            Xp[:, :n_features] = X.astype(np.float32)
+        else:
+            Xp[:, :n_features] = X
+
+        # bound the (rows x trees) working set for large ensembles
+        out = np.empty(n, dtype=np.float64)
+        step = max(1, CHUNK_ELEMENTS // len(self.roots))
+        for start in range(0, n, step):
+            out[start:start + step] = self._predict_chunk(Xp[start:start + step])
+        return out
+
+    def _predict_chunk(self, Xp):
+        n, width = Xp.shape
+        flat = Xp.ravel()
+        row_offsets = (np.arange(n, dtype=np.intp) * width)[:, None]
+        idx = np.broadcast_to(self.roots, (n, len(self.roots))).copy()
+        check_missing = self.meta["has_zero_missing"] or np.isnan(Xp).any()
+        strict_less = self.meta["strict_less"]
+        for _ in range(self.meta["max_depth"]):
+            node = np.take(self.nodes, idx)
+            x = np.take(flat, row_offsets + node["feature"])
+            go_right = x >= node["threshold"] if strict_less else x > node["threshold"]
+            if check_missing:
+                go_right = self._route_missing(x, node, go_right)
+            idx = node["left"] + go_right
+        return np.take(self.values, idx).sum(axis=1) + self.meta["base_score"]
+
+    def _route_missing(self, x, node, go_right):
+        mode = node["missing_mode"]
+        nan = np.isnan(x)
+        as_zero = nan & (mode == MISSING_AS_ZERO)
+        if as_zero.any():
+            zero_right = 0.0 >= node["threshold"] if self.meta["strict_less"] else 0.0 > node["threshold"]
+            go_right = np.where(as_zero, zero_right, go_right)
+        is_missing = (nan & ~as_zero) | ((mode == MISSING_ZERO) & (np.abs(x) <= LGB_ZERO_THRESHOLD))
+        return np.where(is_missing, ~node["default_left"], go_right)
+
+    # --------- Persistence ---------
+
+    def save(self, path):
+        arrays = {k: v for k, v in vars(self).items() if isinstance(v, np.ndarray)}
+        header = {"kind": self.kind, "feature_names": self.feature_names, "meta": self.meta}
+        np.savez(path, header=np.array(json.dumps(header)), **arrays)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """mmap_mode="r" maps the arrays read-only instead of reading them
+        (falls back to reading for a compressed archive)."""
+        arrays = _map_npz(path) if mmap_mode == "r" else None
+        if arrays is None:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {k: data[k] for k in data.files}
+        header = json.loads(str(arrays.pop("header")))
+        return cls(header["kind"], header["feature_names"], header["meta"], **arrays)
+
+
+def _map_npz(path):
+    """{name: read-only array over the file's pages} for an uncompressed .npz,
+    or None if a member is compressed (np.load cannot map .npz members)."""
+    header_readers = {(1, 0): np.lib.format.read_array_header_1_0, (2, 0): np.lib.format.read_array_header_2_0}
+    arrays = {}
+    with open(path, "rb") as f, zipfile.ZipFile(f) as archive:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                return None
+            # the member's .npy bytes follow its 30-byte local header, file name and extra field
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = np.frombuffer(f.read(4), dtype="<u2")
+            f.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+            version = np.lib.format.read_magic(f)
+            if version not in header_readers:
+                return None
+            shape, fortran_order, dtype = header_readers[version](f)
+            if dtype.hasobject:
+                return None
+            arrays[info.filename.removesuffix(".npy")] = np.ndarray(
+                shape, dtype=dtype, buffer=buffer, offset=f.tell(), order="F" if fortran_order else "C")
+    return arrays
+
+
+# --------- Compilation ---------
+
+class _Tree:
+    """One tree in its source numbering; left[i] == -1 marks a leaf."""
+
+    def __init__(self):
+        self.feature, self.threshold, self.left, self.right = [], [], [], []
+        self.default_left, self.missing_mode, self.value = [], [], []
+
+    def add(self, feature=0, threshold=0.0, default_left=True, missing_mode=MISSING_NAN,
+            value=0.0, left=-1, right=-1):
+        self.feature.append(feature)
+        self.threshold.append(threshold)
+        self.default_left.append(default_left)
+        self.missing_mode.append(missing_mode)
+        self.value.append(value)
+        self.left.append(left)
+        self.right.append(right)
+        return len(self.feature) - 1
+
+
+def _layout(trees, n_features, feature_names, base_score, strict_less, float32_inputs):
+    """Renumber every tree breadth-first with siblings adjacent and pack them
+    into one node table."""
+    total = sum(len(t.feature) for t in trees)
+    nodes = np.zeros(total, dtype=NODE_DTYPE)
+    values = np.zeros(total, dtype=np.float64)
+    roots = np.zeros(len(trees), dtype=np.intp)
+    max_depth = 0
+    has_zero_missing = False
+
+    pos = 0
+    for t, tree in enumerate(trees):
+        roots[t] = pos
+        new_id = {0: pos}
+        pos += 1
+        queue = deque([(0, 0)])
+        while queue:
+            old, depth = queue.popleft()
+            i = new_id[old]
+            max_depth = max(max_depth, depth)
+            if tree.left[old] == -1:
+                # leaf: padding column (always 0) vs +inf never goes right
+                nodes[i] = (np.inf, n_features, i, True, MISSING_NAN)
+                values[i] = tree.value[old]
+                continue
+            new_id[tree.left[old]], new_id[tree.right[old]] = pos, pos + 1
+            nodes[i] = (tree.threshold[old], tree.feature[old], pos,
+                        tree.default_left[old], tree.missing_mode[old])
+            has_zero_missing |= tree.missing_mode[old] == MISSING_ZERO
+            pos += 2
+            queue.append((tree.left[old], depth + 1))
+            queue.append((tree.right[old], depth + 1))
+
+    meta = {
+        "base_score": float(base_score),
+        "strict_less": strict_less,
+        "float32_inputs": float32_inputs,
+        "max_depth": max_depth,
+        "n_trees": len(trees),
+        "n_nodes": total,
+        "has_zero_missing": bool(has_zero_missing),
+    }
+    return CompiledModel("trees", feature_names, meta, nodes=nodes, values=values, roots=roots)
+
+
+def _feature_names(model):
+    names = getattr(model, "feature_names_in_", None)
+    if names is None:
+        names = [f"f{i}" for i in range(model.n_features_in_)]
+    return [str(n) for n in names]
+
+
+def _compile_sklearn_tree(model):
+    sk = model.tree_
+    missing_left = getattr(sk, "missing_go_to_left", np.zeros(sk.node_count, dtype=bool))
+    tree = _Tree()
+    for node in range(sk.node_count):
+        tree.add(int(sk.feature[node]), float(sk.threshold[node]), bool(missing_left[node]),
+                 MISSING_NAN, float(sk.value[node].ravel()[0]),
+                 int(sk.children_left[node]), int(sk.children_right[node]))
+    return _layout([tree], model.n_features_in_, _feature_names(model), 0.0,
+                   strict_less=False, float32_inputs=True)
+
+
+def _compile_xgboost(model):
+    booster = model.get_booster()
+    learner = json.loads(booster.save_raw("json"))["learner"]
+    gbm = learner["gradient_booster"]
+    if gbm.get("name", "gbtree") != "gbtree":
+        raise NotImplementedError(f"unsupported xgboost booster: {gbm.get('name')}")
+    raw_trees = gbm["model"]["trees"]
+    try:
+        raw_trees = raw_trees[:model.best_iteration + 1]
+    except AttributeError:
+        pass   # no early stopping: predict() uses every tree
+
+    trees = []
+    for raw in raw_trees:
+        if any(raw["split_type"]):
+            raise NotImplementedError("categorical xgboost splits are not supported")
+        tree = _Tree()
+        for node, left in enumerate(raw["left_children"]):
+            # split_conditions holds the float32 threshold, or the leaf value for leaves
+            condition = float(np.float32(raw["split_conditions"][node]))
+            tree.add(int(raw["split_indices"][node]), condition, bool(raw["default_left"][node]),
+                     MISSING_NAN, condition, left, raw["right_children"][node])
+        trees.append(tree)
+
+    base_score = learner["learner_model_param"]["base_score"].strip("[]")
+    names = booster.feature_names or [f"f{i}" for i in range(model.n_features_in_)]
+    return _layout(trees, model.n_features_in_, names, float(base_score),
+                   strict_less=True, float32_inputs=True)
+
+
+def _compile_lightgbm(model):
+    dump = model.booster_.dump_model()
+    if dump.get("average_output"):
+        raise NotImplementedError("lightgbm random forest mode is not supported")
+    missing_modes = {"NaN": MISSING_NAN, "None": MISSING_AS_ZERO, "Zero": MISSING_ZERO}
+
+    def add(tree, node):
+        if "leaf_value" in node:
+            return tree.add(value=float(node["leaf_value"]))
+        if node["decision_type"] != "<=":
+            raise NotImplementedError("categorical lightgbm splits are not supported")
+        i = tree.add(int(node["split_feature"]), float(node["threshold"]),
+                     bool(node["default_left"]), missing_modes[node["missing_type"]])
+        tree.left[i] = add(tree, node["left_child"])
+        tree.right[i] = add(tree, node["right_child"])
+        return i
+
+    trees = []
+    for info in dump["tree_info"]:
+        tree = _Tree()
+        add(tree, info["tree_structure"])
+        trees.append(tree)
+    return _layout(trees, dump["max_feature_idx"] + 1, dump["feature_names"], 0.0,
+                   strict_less=False, float32_inputs=False)
+
+
+def _compile_linear(model):
+    meta = {"n_features": len(model.coef_)}
+    return CompiledModel("linear", _feature_names(model), meta,
+                         coef=np.asarray(model.coef_, dtype=np.float64),
+                         intercept=np.asarray(model.intercept_, dtype=np.float64))
+
+
+def compile_model(model):
+    name = type(model).__name__
+    if name == "DecisionTreeRegressor":
+        return _compile_sklearn_tree(model)
+    if name == "XGBRegressor":
+        return _compile_xgboost(model)
+    if name == "LGBMRegressor":
+        return _compile_lightgbm(model)
+    if name == "LinearRegression":
+        return _compile_linear(model)
+    raise NotImplementedError(f"no compiled engine for {name}")
+
+
+# --------- Export / Load helpers ---------
+
+def compiled_path(model_path):
+    return Path(model_path).with_suffix(COMPILED_SUFFIX)
+
+
+def check_parity(model, compiled, X, tolerance=1e-4):
+    """Max abs difference between the original and compiled predictions;
+    raises if it exceeds `tolerance` (relative to the prediction scale)."""
+    expected = np.asarray(model.predict(X), dtype=np.float64)
+    got = compiled.predict(X)
+    if not len(expected):
+        return 0.0
+    diff = float(np.max(np.abs(expected - got)))
+    scale = max(1.0, float(np.max(np.abs(expected))))
+    if diff > tolerance * scale:
+        raise ValueError(f"compiled model differs from original by {diff:.3g}")
+    return diff
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def export_model(model, model_path, X_check=None, tolerance=1e-4):
+    """Compile `model` and save it next to `model_path`. When `X_check` is given
+    the compiled predictions are verified against model.predict first. Call it
+    after the joblib is written: the export records its sha256."""
+    compiled = compile_model(model)
+    if X_check is not None:
+        compiled.meta["parity_max_abs_diff"] = check_parity(model, compiled, X_check, tolerance)
+    if Path(model_path).exists():
+        compiled.meta["source_sha256"] = file_sha256(model_path)
+    out = compiled_path(model_path)
+    compiled.save(out)
+    return out
+
+
+def export_matches(compiled, model_path):
+    """True when `compiled` was parity-checked at export against the joblib now
+    at `model_path`, so it can be served without loading that estimator."""
+    meta = compiled.meta
+    return ("parity_max_abs_diff" in meta and "source_sha256" in meta
+            and meta["source_sha256"] == file_sha256(model_path))
+
+
+def load_compiled(model_path, mmap_mode="r"):
+    """CompiledModel for a joblib path, or None when no export exists."""
+    path = compiled_path(model_path)
+    if not path.exists():
+        return None
+    return CompiledModel.load(path, mmap_mode)
+
+
+if __name__ == "__main__":
+    import argparse
+    import joblib
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Export joblib models to compiled node tables")
+    parser.add_argument("models", nargs="+", help="Paths to .joblib models")
+    args = parser.parse_args()
+    for model_path in args.models:
+        model = joblib.load(model_path)
+        # no training data here: check parity on random rows around the feature scale
+        names = _feature_names(model)
+        X_check = pd.DataFrame(np.random.default_rng(0).normal(0, 20, (256, len(names))), columns=names)
+        out = export_model(model, model_path, X_check=X_check)
+        print(f"[OK] Compiled model saved: {out}")
@@ -0,0 +1,178 @@
+"""
+dag.py
+Small DAG executor for run_pipeline.py: runs stages as soon as their
+dependencies finish (up to `workers` at a time) and skips stages whose
+inputs are unchanged since their last successful run.
+
+A stage's cache key hashes its command, the content of its inputs (local
+files/directories or s3:// objects via their ETags) and the keys and outputs
+of the stages it depends on. The key and the stage's outputs are stored in
+<cache_dir>/<stage>.json; a stage is skipped when its key matches and every
+recorded local output still exists (a stage that declares outputs but recorded
+none is never skipped).
+"""
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from src.aws import storage
+
+
+class Stage:
+    def __init__(self, name, cmd, deps=(), inputs=(), outputs=()):
+        """
+        cmd: argv list, or fn(outputs by stage name) -> argv for commands that
+             need an upstream stage's outputs (e.g. the model a train stage wrote)
+        inputs: paths / s3:// URIs hashed into the cache key (data, code, config)
+        outputs: paths, or fn(started_at, outputs by stage name) -> paths, recorded
+                 after a successful run
+        """
+        self.name = name
+        self.cmd = cmd
+        self.deps = tuple(deps)
+        self.inputs = tuple(inputs)
+        self.outputs = outputs
+
+
+class StageFailed(RuntimeError):
+    pass
+
+
+# --------- Content hashing ---------
+
+def _hash_local(path, digest):
+    path = Path(path)
+    if not path.exists():
+        digest.update(f"missing:{path}".encode())
+        return
+    files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+    for file in files:
+        digest.update(str(file.relative_to(path) if path.is_dir() else file.name).encode())
+        with open(file, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+
+
+def _hash_s3(uri, digest):
+    # ETags change whenever an object's content does; no need to download anything
+    for obj in storage.list_objects(*storage.split_uri(uri)):
+        digest.update(f"{obj['Key']}:{obj['ETag']}".encode())
+
+
+def fingerprint(inputs):
+    digest = hashlib.sha256()
+    for item in inputs:
+        item = str(item)
+        digest.update(item.encode())
+        if item.startswith("s3://"):
+            _hash_s3(item, digest)
+        else:
+            _hash_local(item, digest)
+    return digest.hexdigest()
+
+
+# --------- Executor ---------
+
+class DagRunner:
+    def __init__(self, stages, run_fn, workers=2, cache_dir=".pipeline_cache"):
+        """run_fn(argv) runs one command and raises on failure."""
+        self.stages = {s.name: s for s in stages}
+        for stage in stages:
+            unknown = [d for d in stage.deps if d not in self.stages]
+            if unknown:
+                raise ValueError(f"stage {stage.name} depends on unknown stages: {unknown}")
+        self.run_fn = run_fn
+        self.workers = workers
+        self.cache_dir = Path(cache_dir)
+        self.keys = {}
+        self.outputs = {}
+        self.timeline = []          # (name, start, end, status), seconds since run() started
+        self._lock = threading.Lock()
+
+    def _cache_file(self, name):
+        return self.cache_dir / f"{name.replace(':', '_').replace('/', '_')}.json"
+
+    def _key(self, stage):
+        cmd = stage.cmd(self.outputs) if callable(stage.cmd) else stage.cmd
+        upstream = [(d, self.keys[d], self.outputs[d]) for d in stage.deps]
+        data = fingerprint(stage.inputs)
+        return hashlib.sha256(json.dumps([cmd, upstream, data]).encode()).hexdigest(), cmd
+
+    def _cached(self, name, key):
+        path = self._cache_file(name)
+        if not path.exists():
+            return None
+        with open(path) as f:
+            entry = json.load(f)
+        outputs = entry.get("outputs", [])
+        if entry.get("key") != key or not all(o.startswith("s3://") or Path(o).exists() for o in outputs):
+            return None
+        # a stage that declares outputs but recorded none did not produce anything to reuse
+        stage = self.stages[name]
+        if not outputs and (callable(stage.outputs) or stage.outputs):
+            return None
+        return outputs
+
+    def _run_stage(self, stage, t0):
+        start = time.perf_counter()
+        key, cmd = self._key(stage)
+        outputs = self._cached(stage.name, key)
+        if outputs is not None:
+            status = "cached"
+        else:
+            started_at = time.time()
+            self.run_fn(cmd)
+            outputs = stage.outputs(started_at, self.outputs) if callable(stage.outputs) else list(stage.outputs)
+            outputs = [str(o) for o in outputs]
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(self._cache_file(stage.name), "w") as f:
+                json.dump({"key": key, "cmd": cmd, "outputs": outputs}, f, indent=2)
+            status = "ran"
+        with self._lock:
+            self.keys[stage.name] = key
+            self.outputs[stage.name] = outputs
+            self.timeline.append((stage.name, start - t0, time.perf_counter() - t0, status))
+        return status
+
+    def run(self):
+        """Run every stage; raises StageFailed after the first failure (running stages finish)."""
+        t0 = time.perf_counter()
+        done, running = set(), {}
+        failure = None
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while len(done) < len(self.stages):
+                if failure is None:
+                    for name, stage in self.stages.items():
+                        if (name not in done and name not in running.values()
+                                and len(running) < self.workers and all(d in done for d in stage.deps)):
+                            print(f"\n[STAGE] {name}")
+                            running[pool.submit(self._run_stage, stage, t0)] = name
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        print(f"[STAGE] {name}: {future.result()}")
+                        done.add(name)
+                    except Exception as e:
+                        failure = failure or StageFailed(f"stage {name} failed: {e}")
+        if failure is not None:
+            raise failure
+        return self.timeline
+
+    def print_timeline(self, width=40):
+        if not self.timeline:
+            return
+        total = max(end for _, _, end, _ in self.timeline) or 1.0
+        name_width = max(len(name) for name, *_ in self.timeline)
+        print("\n[TIMELINE] wall clock per stage")
+        for name, start, end, status in sorted(self.timeline, key=lambda t: t[1]):
+            lo = int(start / total * width)
+            hi = max(lo + 1, int(end / total * width))
+            bar = " " * lo + "#" * (hi - lo) + " " * (width - hi)
+            print(f"  {name:<{name_width}} |{bar}| {start:7.2f}s -> {end:7.2f}s  {status}")
+        print(f"  total {total:.2f}s")
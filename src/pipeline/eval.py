@@ -1,125 +1,242 @@
 import os
+import sys
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 import joblib
+import matplotlib
+matplotlib.use("Agg")   # plots are only saved to files, also from pool workers
 import matplotlib.pyplot as plt
 from sklearn.metrics import mean_absolute_error, root_mean_squared_error, r2_score
 import mlflow
 import json
+from pathlib import Path
+
+# make the `src` package importable when run as a script from src/pipeline
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from src.aws import storage
+from src.pipeline import instrument
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# above this many test points, plots are binned instead of drawing every point with a marker
+PLOT_POINT_LIMIT = 2000
+# per-segment metrics are reported for these feature columns
+SEGMENT_COLUMNS = ["hour_of_day", "is_weekend"]
+
 # --- Command-line arguments ---
 def parse_args():
     parser = argparse.ArgumentParser(description="Model Evaluation Pipeline")
-    parser.add_argument("--model", required=True, help="Path to trained model (.joblib)")
+    models = parser.add_mutually_exclusive_group(required=True)
+    models.add_argument("--model", help="Path to trained model (.joblib)")
+    models.add_argument("--models", nargs="+", help="Several trained models, scored against one load of the test data")
     parser.add_argument("--test-data", required=True, help="Path to test features (local or s3)")
     parser.add_argument("--output-dir", default=os.path.join(SCRIPT_DIR, "..", "reports"), help="Directory for saving reports/plots")
     parser.add_argument("--mlflow-uri", default="http://localhost:5000", help="MLflow tracking URI")
     parser.add_argument("--experiment", default="evaluations", help="MLflow experiment name")
     parser.add_argument("--run", default="evaluation", help="MLflow run name")
+    parser.add_argument("--plot-workers", type=int, default=os.cpu_count(), help="Processes rendering plots")
     return parser.parse_args()
 
-# --- Main evaluation logic ---
-def main(args):
-    mlflow.set_tracking_uri(args.mlflow_uri)
-    mlflow.set_experiment(args.experiment)
-    # Load test data
-    print(f"Loading test data from: {args.test_data}")
-    if args.test_data.startswith("s3://"):
-        df = pd.read_parquet(args.test_data, storage_options={
-        "client_kwargs": {"endpoint_url": "http://localhost:4566"},
-        "key": "test","secret": "test"}, engine="pyarrow")
-    else:
-        df = pd.read_parquet(args.test_data)
-
-    X_test = df.drop(columns=['total_kwh'])
-    y_test = df['total_kwh']
-
-    print(f"Loading model from: {args.model}")
-    model = joblib.load(args.model)
-
-    # Make predictions
-    y_pred = model.predict(X_test)
-
-    # Calculate metrics
-    mae = mean_absolute_error(y_test, y_pred)
-    rmse = root_mean_squared_error(y_test, y_pred)
-    r2 = r2_score(y_test, y_pred)
-
-    print(f"Evaluation Metrics:")
-    print(f"  MAE:  {mae:.4f}")
-    print(f"  RMSE: {rmse:.4f}")
-    print(f"  R²:   {r2:.4f}")
-
-    metrics = {
-        "model_path": args.model,
-        "test_data": args.test_data,
-        "mae": float(mae),
-        "rmse": float(rmse),
-        "r2": float(r2),
-    }
-
-    # Create output directory
-    model_name = os.path.splitext(os.path.basename(args.model))[0]  
-    dynamic_output_dir = os.path.join(args.output_dir, model_name)
-    os.makedirs(dynamic_output_dir, exist_ok=True)
-    args.output_dir = dynamic_output_dir
+# --- Metrics, all models at once ---
+def score(y_test, predictions):
+    """{name: {"mae", "rmse", "r2"}} for {name: predictions}, one vectorized call per metric."""
+    names = list(predictions)
+    y_pred = np.column_stack([predictions[name] for name in names])
+    y_true = np.broadcast_to(np.asarray(y_test, dtype=np.float64)[:, None], y_pred.shape)
+    mae = mean_absolute_error(y_true, y_pred, multioutput="raw_values")
+    rmse = root_mean_squared_error(y_true, y_pred, multioutput="raw_values")
+    r2 = r2_score(y_true, y_pred, multioutput="raw_values")
+    return {name: {"mae": float(mae[i]), "rmse": float(rmse[i]), "r2": float(r2[i])} for i, name in enumerate(names)}
+
+def segment_metrics(X_test, y_test, predictions):
+    """{name: {column: {value: {"mae", "rmse", "n"}}}} for each SEGMENT_COLUMNS column in
+    X_test: one groupby over the error matrix of all models per column."""
+    names = list(predictions)
+    errors = pd.DataFrame(np.column_stack([predictions[name] for name in names])
+                          - np.asarray(y_test, dtype=np.float64)[:, None], columns=names)
+    result = {name: {} for name in names}
+    for column in SEGMENT_COLUMNS:
+        if column not in X_test:
+            continue
+        keys = np.asarray(X_test[column]).astype(np.int64)
+        abs_mean = errors.abs().groupby(keys).mean()
+        rmse = np.sqrt((errors ** 2).groupby(keys).mean())
+        counts = errors.groupby(keys).size()
+        for name in names:
+            result[name][column] = {
+                str(value): {"mae": float(abs_mean.at[value, name]), "rmse": float(rmse.at[value, name]),
+                             "n": int(counts.at[value])}
+                for value in abs_mean.index
+            }
+    return result
+
+# --- Plots ---
+def _binned(values, n_bins):
+    """Per-bin (center index, mean, min, max) of a series cut into n_bins consecutive bins."""
+    edges = np.linspace(0, len(values), n_bins + 1).astype(np.int64)
+    starts = edges[:-1][np.diff(edges) > 0]
+    counts = np.diff(np.r_[starts, len(values)])
+    means = np.add.reduceat(values, starts) / counts
+    return starts + counts / 2, means, np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts)
+
+def render_plots(y_test, y_pred, output_dir):
+    """Predictions-vs-actuals and residual plots for one model; returns their paths.
+    Up to PLOT_POINT_LIMIT points every point is drawn; above it the series are
+    binned to PLOT_POINT_LIMIT bins (mean line, min-max band) and residuals are
+    drawn as a hexbin density."""
+    y_test = np.asarray(y_test, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    residuals = y_test - y_pred
+    dense = len(y_test) > PLOT_POINT_LIMIT
 
-    # Generate and save visualizations
     # Plot 1: Predictions vs Actuals
     plt.figure(figsize=(12, 6))
-    plt.plot(y_test.values, label="Actual", marker='o', alpha=0.6)
-    plt.plot(y_pred, label="Predicted", marker='x', alpha=0.6)
+    if dense:
+        for values, label in ((y_test, "Actual"), (y_pred, "Predicted")):
+            x, mean, low, high = _binned(values, PLOT_POINT_LIMIT)
+            line, = plt.plot(x, mean, label=f"{label} (mean of {len(values) / len(x):.0f}-point bins)", lw=1)
+            plt.fill_between(x, low, high, color=line.get_color(), alpha=0.2, lw=0)
+    else:
+        plt.plot(y_test, label="Actual", marker='o', alpha=0.6)
+        plt.plot(y_pred, label="Predicted", marker='x', alpha=0.6)
     plt.xlabel("Sample Index")
     plt.ylabel("totla kwh")
     plt.title("Predictions vs Actuals")
     plt.legend()
     plt.grid(alpha=0.3)
-    pred_plot_path = os.path.join(args.output_dir, "predictions_vs_actuals.png")
+    pred_plot_path = os.path.join(output_dir, "predictions_vs_actuals.png")
     plt.savefig(pred_plot_path)
     plt.close()
-    print(f"Saved plot: {pred_plot_path}")
 
     # Plot 2: Residuals
-    residuals = y_test.values - y_pred
     plt.figure(figsize=(12, 6))
-    plt.scatter(y_pred, residuals, alpha=0.5)
+    if dense:
+        plt.hexbin(y_pred, residuals, gridsize=80, bins="log", mincnt=1, cmap="viridis")
+        plt.colorbar(label="points")
+    else:
+        plt.scatter(y_pred, residuals, alpha=0.5)
     plt.axhline(0, color='red', linestyle='--')
     plt.xlabel("Predicted Values")
     plt.ylabel("Residuals")
     plt.title("Residual Plot")
     plt.grid(alpha=0.3)
-    residual_plot_path = os.path.join(args.output_dir, "residuals.png")
+    residual_plot_path = os.path.join(output_dir, "residuals.png")
     plt.savefig(residual_plot_path)
     plt.close()
-    print(f"Saved plot: {residual_plot_path}")
-
-    # Save metrics to a text report
-    report_path = os.path.join(args.output_dir, "evaluation_report.txt")
-    with open(report_path, 'w') as f:
-        f.write(f"Model Evaluation Report\n")
-        f.write(f"========================\n")
-        f.write(f"Model: {args.model}\n")
-        f.write(f"Test Data: {args.test_data}\n")
-        f.write(f"\nMetrics:\n")
-        f.write(f"  MAE:  {mae:.4f}\n")
-        f.write(f"  RMSE: {rmse:.4f}\n")
-        f.write(f"  R²:   {r2:.4f}\n")
-    print(f"Saved report: {report_path}")
-
-    # Save metrics to JSON for programmatic use
-    metrics_path = os.path.join(args.output_dir, "metrics.json")
-    with open(metrics_path, "w") as f:
-        json.dump(metrics, f, indent=2)
-    print(f"Saved metrics: {metrics_path}")
+    return [pred_plot_path, residual_plot_path]
+
+# --- Evaluation of models on in-memory test data ---
+def evaluate_models(models, X_test, y_test, test_data, output_dir, plot_workers=1):
+    """Metrics, plots and reports for {model path: model}, each under <output_dir>/<model name>/.
+    Predicts with every model, scores them together, then renders the plots on
+    `plot_workers` processes and writes all reports in one pass. Returns {model path: metrics}."""
+    predictions = {}
+    for model_path, model in models.items():
+        predictions[model_path] = model.predict(X_test)
+    scores = score(y_test, predictions)
+    segments = segment_metrics(X_test, y_test, predictions)
+
+    output_dirs = {}
+    for model_path in models:
+        model_name = os.path.splitext(os.path.basename(model_path))[0]
+        output_dirs[model_path] = os.path.join(output_dir, model_name)
+        os.makedirs(output_dirs[model_path], exist_ok=True)
+
+    # Generate and save visualizations
+    plot_args = ([y_test] * len(models), list(predictions.values()), list(output_dirs.values()))
+    workers = max(1, min(plot_workers, len(models)))
+    if workers == 1:
+        plot_paths = list(map(render_plots, *plot_args))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            plot_paths = list(pool.map(render_plots, *plot_args))
+    for paths in plot_paths:
+        for path in paths:
+            print(f"Saved plot: {path}")
+
+    all_metrics = {}
+    for model_path in models:
+        mae, rmse, r2 = scores[model_path]["mae"], scores[model_path]["rmse"], scores[model_path]["r2"]
+        print(f"Evaluation Metrics ({model_path}):")
+        print(f"  MAE:  {mae:.4f}")
+        print(f"  RMSE: {rmse:.4f}")
+        print(f"  R²:   {r2:.4f}")
+        metrics = {
+            "model_path": model_path,
+            "test_data": test_data,
+            "mae": mae,
+            "rmse": rmse,
+            "r2": r2,
+            "segments": segments[model_path],
+        }
+
+        # Save metrics to a text report
+        report_path = os.path.join(output_dirs[model_path], "evaluation_report.txt")
+        with open(report_path, 'w') as f:
+            f.write(f"Model Evaluation Report\n")
+            f.write(f"========================\n")
+            f.write(f"Model: {model_path}\n")
+            f.write(f"Test Data: {test_data}\n")
+            f.write(f"\nMetrics:\n")
+            f.write(f"  MAE:  {mae:.4f}\n")
+            f.write(f"  RMSE: {rmse:.4f}\n")
+            f.write(f"  R²:   {r2:.4f}\n")
+            for column, values in segments[model_path].items():
+                f.write(f"\nMAE by {column}:\n")
+                for value, m in values.items():
+                    f.write(f"  {value:>3}: {m['mae']:.4f}  (n={m['n']})\n")
+        print(f"Saved report: {report_path}")
+
+        # Save metrics to JSON for programmatic use
+        metrics_path = os.path.join(output_dirs[model_path], "metrics.json")
+        with open(metrics_path, "w") as f:
+            json.dump(metrics, f, indent=2)
+        print(f"Saved metrics: {metrics_path}")
+        all_metrics[model_path] = metrics
+    return all_metrics
+
+def evaluate(model, X_test, y_test, model_path, test_data, output_dir):
+    """evaluate_models() for one model (used by train_all.py); returns its metrics."""
+    return evaluate_models({model_path: model}, X_test, y_test, test_data, output_dir)[model_path]
+
+# --- Main evaluation logic ---
+def main(args):
+    # model family (dt, xgb, ...), not the timestamped file: one metrics file per family
+    target = Path(args.model).stem.split("_model_")[0] if args.model else None
+    with instrument.stage("eval", target=target):
+        run_evaluation(args)
+
+def run_evaluation(args):
+    mlflow.set_tracking_uri(args.mlflow_uri)
+    mlflow.set_experiment(args.experiment)
+    # Load test data
+    print(f"Loading test data from: {args.test_data}")
+    with instrument.step("load") as step:
+        df = storage.read_parquet(args.test_data)
+        step.rows_out = len(df)
+
+    X_test = df.drop(columns=['total_kwh'])
+    y_test = df['total_kwh']
 
+    model_paths = args.models or [args.model]
+    models = {}
+    with instrument.step("load_models"):
+        for model_path in model_paths:
+            print(f"Loading model from: {model_path}")
+            models[model_path] = joblib.load(model_path)
+    with instrument.step("evaluate", rows_in=len(X_test), rows_out=len(X_test) * len(models)):
+        all_metrics = evaluate_models(models, X_test, y_test, args.test_data, args.output_dir, args.plot_workers)
 
     # Optional: Log metrics and artifacts to MLflow
-    with mlflow.start_run(run_name=args.run):
-        mlflow.log_metric("eval_mae", mae)
-        mlflow.log_metric("eval_rmse", rmse)
-        mlflow.log_metric("eval_r2", r2)
+    with instrument.step("log"):
+        for model_path, metrics in all_metrics.items():
+            run_name = args.run if args.model else f"{args.run}-{Path(model_path).stem}"
+            with mlflow.start_run(run_name=run_name):
+                mlflow.log_metric("eval_mae", metrics["mae"])
+                mlflow.log_metric("eval_rmse", metrics["rmse"])
+                mlflow.log_metric("eval_r2", metrics["r2"])
 
     print("Evaluation complete.")
 
@@ -1,14 +1,31 @@
 
 import argparse
+import os
+import shutil
+import sys
 import pandas as pd
 import numpy as np
-import boto3
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import NamedTuple
+
+# make the `src` package importable when run as a script from src/pipeline
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from src.aws import storage
+from src.pipeline import instrument
 
 # --- Command-line arguments for config ---
 def parse_args():
     parser = argparse.ArgumentParser(description="Feature Engineering Pipeline")
-    parser.add_argument("--input", required=True, help="Path to raw data (local or s3)")
+    parser.add_argument("--input", required=True,
+                        help="Raw sessions (local or s3): ingest.py's partitioned dataset directory or a single parquet")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only build hours after the saved feature state and rewrite the reopen window "
+                             "(full recompute if there is none)")
+    parser.add_argument("--segment-by", choices=SEGMENT_KEYS,
+                        help="Build the features per segment into a <key>=<value> partitioned dataset instead")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes for --segment-by")
     return parser.parse_args()
 
 def save_locally(df, output_path, file_name):
@@ -20,56 +37,66 @@ def save_locally(df, output_path, file_name):
                      index=False)
     print(f"[OK] Cleaned data saved locally: {local_file_path}")
 
-def cleaning(df):
+# Upper bounds (exclusive) for duration_category, checked from the longest down;
+# anything not above 3h (including unknown durations) is "Less than 3 hours"
+DURATION_BINS = [
+    (18, "More than 18 hours"),
+    (15, "Between 15 and 18 hours"),
+    (12, "Between 12 and 15 hours"),
+    (9, "Between 9 and 12 hours"),
+    (6, "Between 6 and 9 hours"),
+    (3, "Between 3 and 6 hours"),
+]
+SHORTEST_DURATION = "Less than 3 hours"
+
+def duration_category(duration_hours):
+    """Vectorized duration -> duration_category label."""
+    return np.select([duration_hours > bound for bound, _ in DURATION_BINS],
+                     [label for _, label in DURATION_BINS],
+                     default=SHORTEST_DURATION)
+
+def clean_sessions(df):
+    """Session-level cleaning; every fix is one vectorized pass over the frame."""
     # Standardize column names
     df.columns = df.columns.str.lower().str.replace(' ', '_')
 
     #converting el_kwh and duration_hours to numeric, coercing errors to NaN
-    df['el_kwh'] = pd.to_numeric(df['el_kwh'], errors='coerce')
-    df['duration_hours'] = pd.to_numeric(df['duration_hours'], errors='coerce')
-
-    #fixing missing values in 'end_plugout' and 'duration_hours' by assigning correct values
-    missing_both = df[df['end_plugout'].isna() & df['duration_hours'].isna() & df['duration_category'].isna()]
-
-    complete_sessions = df.dropna(subset=['end_plugout', 'duration_hours']).copy()
-    complete_sessions['charging_rate'] = complete_sessions['el_kwh'] / complete_sessions['duration_hours']
-    avg_charging_rate = complete_sessions['charging_rate'].median()
-
-    # Step 2: Get indices of missing rows before fixing them
-    missing_indices = df[df['end_plugout'].isna() & df['duration_hours'].isna()].index
-
-    # Step 3: Estimate missing durations using average rate
-    df.loc[missing_indices, 'duration_hours'] = df.loc[missing_indices, 'el_kwh'] / avg_charging_rate
-
-    # Step 4: Calculate end_plugout from estimated duration
-    df.loc[missing_indices, 'end_plugout'] = df.loc[missing_indices, 'start_plugin'] + pd.to_timedelta(df.loc[missing_indices, 'duration_hours'], unit='h')
-
-    # Step 5: Update end_plugout_hour
-    df.loc[missing_indices, 'end_plugout_hour'] = df.loc[missing_indices, 'end_plugout'].dt.hour
-
-    # Step 6: Update duration_category based on estimated duration
-    for idx in missing_indices:
-        duration = df.loc[idx, 'duration_hours']
-        if duration > 18:
-            df.loc[idx, 'duration_category'] = "More than 18 hours"
-        elif duration > 15:
-            df.loc[idx, 'duration_category'] = "Between 15 and 18 hours"
-        elif duration > 12:
-            df.loc[idx, 'duration_category'] = "Between 12 and 15 hours"
-        elif duration > 9:
-            df.loc[idx, 'duration_category'] = "Between 9 and 12 hours"
-        elif duration > 6:
-            df.loc[idx, 'duration_category'] = "Between 6 and 9 hours"
-        elif duration > 3:
-            df.loc[idx, 'duration_category'] = "Between 3 and 6 hours"
-        else:
-            df.loc[idx, 'duration_category'] = "Less than 3 hours"
+    el_kwh = pd.to_numeric(df['el_kwh'], errors='coerce')
+    duration = pd.to_numeric(df['duration_hours'], errors='coerce')
+    start = df['start_plugin']
+    end = df['end_plugout']
+
+    # one pass for both masks: sessions missing both end time and duration get estimated,
+    # complete sessions give the median charging rate used for the estimate
+    end_missing = end.isna()
+    duration_missing = duration.isna()
+    missing = end_missing & duration_missing
+    complete = ~end_missing & ~duration_missing
+    avg_charging_rate = (el_kwh[complete] / duration[complete]).median()
+
+    if missing.any():
+        # estimate missing durations using average rate, then derive end time, hour and category;
+        # only the missing rows are computed, each fix is a single masked assignment
+        est_duration = el_kwh[missing] / avg_charging_rate
+        est_end = start[missing] + pd.to_timedelta(est_duration, unit='h')
+        duration = duration.copy()
+        end = end.copy()
+        duration[missing] = est_duration
+        end[missing] = est_end
+        df.loc[missing, 'end_plugout_hour'] = est_end.dt.hour
+        labels = duration_category(est_duration.to_numpy())
+        if isinstance(df['duration_category'].dtype, pd.CategoricalDtype):
+            # dictionary-encoded input: register any label the raw data never used
+            new_labels = set(labels) - set(df['duration_category'].cat.categories)
+            df['duration_category'] = df['duration_category'].cat.add_categories(sorted(new_labels))
+        df.loc[missing, 'duration_category'] = labels
 
     # Fix duration mismatches
-    df['charging_duration'] = (df['end_plugout'] - df['start_plugin']).dt.total_seconds() / 3600
-    duration_diff = abs(df['duration_hours'] - df['charging_duration'])
-    df.loc[duration_diff > 0.1, 'duration_hours'] = df['charging_duration']
-    df = df.drop('charging_duration', axis=1)
+    charging_duration = (end - start).dt.total_seconds() / 3600
+    mismatch = (duration - charging_duration).abs() > 0.1
+    df['el_kwh'] = el_kwh
+    df['duration_hours'] = duration.mask(mismatch, charging_duration)
+    df['end_plugout'] = end
 
     category_columns = [
     'user_type', 'shared_id', 'month_plugin', 'weekdays_plugin', 'plugin_category', 'duration_category']
@@ -77,101 +104,335 @@ def cleaning(df):
         df[col] = df[col].astype('category')
     df['end_plugout_hour'] = df['end_plugout_hour'].astype('int64')
 
-
     #verifying start_plugin_hour
-    df['hour'] = df['start_plugin'].dt.hour
-
-
+    start_hour = start.dt.hour
     df['start_plugin_hour'] = np.where(
-        df['start_plugin_hour'] != df['hour'],
-        df['hour'],                             
-        df['start_plugin_hour']                 
+        df['start_plugin_hour'] != start_hour,
+        start_hour,
+        df['start_plugin_hour']
     )
 
     # aggregating data on hourly basis
-    df['hour'] = df['start_plugin'].dt.floor('h')
+    df['hour'] = start.dt.floor('h')
+    return df
+
+def cleaning(df):
+    df = clean_sessions(df)
     save_locally(df, 'C:/Users/GIGABYTE/Documents/ml/mlops/data/clean','clean.parquet')
 
     return df
 
-def engineering(df):
-    hourly_total = (df.groupby('hour', as_index=True).agg(total_kwh=('el_kwh','sum'),n_sessions=('session_id','count'),avg_kwh=('el_kwh','mean')).sort_index())
-
-    hourly_total['n_sessions_lag1']  = hourly_total['n_sessions'].shift(1)
-    hourly_total['avg_kwh_lag1']    = hourly_total['avg_kwh'].shift(1)
-    hourly_total = hourly_total.drop(columns=['n_sessions','avg_kwh'])
-    hourly_total['hour_of_day'] = hourly_total.index.hour
-    hourly_total['day_of_week'] = hourly_total.index.dayofweek
-    hourly_total['month'] = hourly_total.index.month
-    hourly_total['is_weekend'] = hourly_total.index.dayofweek.isin([5,6]).astype(int)
-
-    #cyclical encoding 
-    hourly_total['hour_sin'] = np.sin(2*np.pi*hourly_total['hour_of_day']/24)
-    hourly_total['hour_cos'] = np.cos(2*np.pi*hourly_total['hour_of_day']/24)
-    hourly_total['dow_sin'] = np.sin(2*np.pi*hourly_total['day_of_week']/7)
-    hourly_total['dow_cos'] = np.cos(2*np.pi*hourly_total['day_of_week']/7)
-    hourly_total['month_sin'] = np.sin(2*np.pi*(hourly_total['month']-1)/12)
-    hourly_total['month_cos'] = np.cos(2*np.pi*(hourly_total['month']-1)/12)
-
-    # add lags
-    hourly_total['lag_1']   = hourly_total['total_kwh'].shift(1)
-    hourly_total['lag_24']  = hourly_total['total_kwh'].shift(24)
-    hourly_total['lag_168'] = hourly_total['total_kwh'].shift(168)
-
-    # differences t-1 - t-2 (preventing data leakage)
-    hourly_total['diff_lag1'] = hourly_total['total_kwh'].shift(1) - hourly_total['total_kwh'].shift(2)
-
-    # rolling stats only from past values
-    hourly_total['roll_mean_3h']  = hourly_total['total_kwh'].shift(1).rolling(window=3).mean()
-    hourly_total['roll_mean_6h']  = hourly_total['total_kwh'].shift(1).rolling(window=6).mean()
-    hourly_total['roll_mean_24h'] = hourly_total['total_kwh'].shift(1).rolling(window=24).mean()
-    hourly_total['roll_std_24h']  = hourly_total['total_kwh'].shift(1).rolling(window=24).std()
-    hourly_total['roll_mean_168h'] = hourly_total['total_kwh'].shift(1).rolling(window=168).mean()
-
-    # calculating mean total_kwh for each (hour_of_day, day_of_week) combination using only past data
-    expanding_means = (
-        hourly_total
-        .groupby(['hour_of_day', 'day_of_week'])['total_kwh']
-        .apply(lambda x: x.shift(1).expanding().mean())
-    )
-    expanding_means = expanding_means.reset_index(level=[0, 1], drop=True)
-    hourly_total['hour_dow_mean'] = expanding_means
-    hourly_total = hourly_total.dropna().copy()
-    save_locally(hourly_total, 'C:/Users/GIGABYTE/Documents/ml/mlops/data/features','features.parquet')
-
-def upload_to_s3(local_path, file_name, bucket='ev-data'):
-    s3 = boto3.client('s3', 
-                     endpoint_url="http://localhost:4566",
-                     aws_access_key_id="test", 
-                     aws_secret_access_key="test")
-    
-    # Create bucket if not exists
-    try:
-        s3.create_bucket(Bucket=bucket)
-    except:
-        pass
-    
+FEATURES_DIR = 'C:/Users/GIGABYTE/Documents/ml/mlops/data/features'
+# one sealed parquet part per run, named after its first hour so file order is time order,
+# then OPEN_PART (see REOPEN_HOURS)
+FEATURES_DATASET = f'{FEATURES_DIR}/features'
+STATE_PATH = f'{FEATURES_DIR}/features_state.npz'
+# per-segment features: SEGMENTS_DATASET/<key>=<value>/part-<first hour>.parquet
+SEGMENTS_DATASET = f'{FEATURES_DIR}/segments'
+SEGMENT_KEYS = ('garage_id', 'user_id', 'user_type', 'shared_id')
+
+TAIL_HOURS = 168          # longest lag / rolling window
+ROLLING_WINDOWS = (3, 6, 24, 168)
+# sessions are exported at plug-out, so the newest hours still receive sessions on
+# later runs: rows this close to the newest hour are rebuilt every run into OPEN_PART
+REOPEN_HOURS = 48
+OPEN_PART = 'part-open.parquet'   # sorts after every part-<first hour>.parquet
+
+# --------- Window state ---------
+# Everything the next hour's features depend on. A full recompute starts from
+# empty_state(); an incremental run starts from the state the last run saved.
+
+class WindowState(NamedTuple):
+    tail_kwh: np.ndarray        # last TAIL_HOURS hourly totals, oldest first (NaN before the first hour)
+    last_sessions: np.ndarray   # n_sessions, avg_kwh of the last hour
+    group_count: np.ndarray     # hours seen per hour_of_day * 7 + day_of_week
+    group_sum: np.ndarray       # total_kwh per hour_of_day * 7 + day_of_week
+    last_hour: np.datetime64    # last hour folded into the state (NaT when empty)
+    sessions: np.int64          # sessions in the hours up to last_hour
+    seen_sessions: np.int64     # sessions given to the run that saved the state
+
+def empty_state():
+    return WindowState(np.full(TAIL_HOURS, np.nan), np.full(2, np.nan),
+                       np.zeros(24 * 7, dtype=np.int64), np.zeros(24 * 7),
+                       np.datetime64('NaT', 'ns'), np.int64(0), np.int64(0))
+
+def save_state(state, path=STATE_PATH):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    np.savez(path, **state._asdict())
+    print(f"[OK] Feature state saved: {path}")
+
+def load_state(path=STATE_PATH):
+    if not Path(path).exists():
+        return None
+    with np.load(path) as data:
+        if not set(WindowState._fields) <= set(data.files):
+            print(f"[INFO] Feature state {path} predates the reopen window; recomputing all features")
+            return None
+        return WindowState(**{name: data[name] for name in WindowState._fields})
+
+def _window_sums(values, n, width):
+    """Sum of the `width` values before each of the last `n` positions.
+
+    Always added oldest to newest, so the result depends only on the window's
+    contents: the same hour gets the same bits whether it is computed in a
+    full recompute or an incremental run.
+    """
+    start = len(values) - n - width
+    acc = np.zeros(n)
+    for k in range(width):
+        acc += values[start + k:start + k + n]
+    return acc
+
+def _window_std(values, n, width, mean):
+    start = len(values) - n - width
+    acc = np.zeros(n)
+    for k in range(width):
+        acc += (values[start + k:start + k + n] - mean) ** 2
+    return np.sqrt(acc / (width - 1))
+
+def _group_means(keys, totals, group_count, group_sum):
+    """Mean of the earlier totals with the same key (NaN for the first one), plus the updated sums.
+
+    Works in rounds: round r handles the r-th occurrence of every key at once,
+    so each key's sum is still built by adding its totals one at a time, in
+    order (the same bits as continuing from a saved sum), with one vectorized
+    step per round instead of a Python loop per row.
+    """
+    group_count, group_sum = group_count.copy(), group_sum.copy()
+    means = np.empty(len(keys))
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    rank = np.arange(len(keys)) - np.searchsorted(sorted_keys, sorted_keys)
+    by_round = order[np.argsort(rank, kind='stable')]
+    bounds = np.cumsum(np.bincount(rank))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for lo, hi in zip(np.r_[0, bounds[:-1]], bounds):
+            rows = by_round[lo:hi]
+            k = keys[rows]
+            means[rows] = group_sum[k] / group_count[k]
+            group_sum[k] += totals[rows]
+            group_count[k] += 1
+    return means, group_count, group_sum
+
+def hourly_aggregates(df):
+    return (df.groupby('hour', as_index=True).agg(total_kwh=('el_kwh','sum'),n_sessions=('session_id','count'),avg_kwh=('el_kwh','mean')).sort_index())
+
+def build_features(hourly, state):
+    """Features for the hours in `hourly` (all after state.last_hour), and the state after them.
+
+    O(len(hourly)): history only comes in through `state`. Rows whose windows
+    are not full yet are NaN, like the shifted/rolling columns of a full run.
+    """
+    n = len(hourly)
+    totals = hourly['total_kwh'].to_numpy(dtype=float)
+    history = np.concatenate([state.tail_kwh, totals])
+    prev = history[TAIL_HOURS - 1:-1]       # total_kwh of the previous hour, per row
+
+    sessions = np.concatenate([state.last_sessions[None, :],
+                               hourly[['n_sessions', 'avg_kwh']].to_numpy(dtype=float)])
+
+    # columns are collected as arrays and framed once: per-column inserts dominate
+    # the cost for short (per-segment) series
+    index = hourly.index
+    hour_of_day = index.hour.to_numpy()
+    day_of_week = index.dayofweek.to_numpy()
+    month = index.month.to_numpy()
+    means = {w: _window_sums(history, n, w) / w for w in ROLLING_WINDOWS}
+    # mean total_kwh for each (hour_of_day, day_of_week) combination using only past data
+    hour_dow_mean, group_count, group_sum = _group_means(
+        hour_of_day * 7 + day_of_week, totals, state.group_count, state.group_sum)
+
+    hourly_total = pd.DataFrame({
+        'total_kwh': totals,
+        'n_sessions_lag1': sessions[:-1, 0],
+        'avg_kwh_lag1': sessions[:-1, 1],
+        'hour_of_day': hour_of_day,
+        'day_of_week': day_of_week,
+        'month': month,
+        'is_weekend': np.isin(day_of_week, [5, 6]).astype(int),
+        #cyclical encoding
+        'hour_sin': np.sin(2*np.pi*hour_of_day/24),
+        'hour_cos': np.cos(2*np.pi*hour_of_day/24),
+        'dow_sin': np.sin(2*np.pi*day_of_week/7),
+        'dow_cos': np.cos(2*np.pi*day_of_week/7),
+        'month_sin': np.sin(2*np.pi*(month-1)/12),
+        'month_cos': np.cos(2*np.pi*(month-1)/12),
+        # lags
+        'lag_1': prev,
+        'lag_24': history[TAIL_HOURS - 24:TAIL_HOURS - 24 + n],
+        'lag_168': history[:n],
+        # differences t-1 - t-2 (preventing data leakage)
+        'diff_lag1': prev - history[TAIL_HOURS - 2:TAIL_HOURS - 2 + n],
+        # rolling stats only from past values
+        'roll_mean_3h': means[3],
+        'roll_mean_6h': means[6],
+        'roll_mean_24h': means[24],
+        'roll_std_24h': _window_std(history, n, 24, means[24]),
+        'roll_mean_168h': means[168],
+        'hour_dow_mean': hour_dow_mean,
+    }, index=index)
+
+    folded = np.int64(state.sessions + hourly['n_sessions'].sum())
+    new_state = WindowState(history[-TAIL_HOURS:], sessions[-1], group_count, group_sum,
+                            hourly.index[-1].to_datetime64().astype('datetime64[ns]') if n else state.last_hour,
+                            folded, folded)
+    return hourly_total, new_state
+
+def late_sessions(df, state):
+    """True when df has sessions for sealed hours that `state` was built without.
+    Counted like hourly_aggregates' n_sessions: non-null session_id only."""
+    return df.loc[df['hour'] <= state.last_hour, 'session_id'].count() != state.sessions
+
+def engineering(df, state=None):
+    """Build hourly features into FEATURES_DATASET.
+
+    Hours more than REOPEN_HOURS before the newest one are sealed: they are
+    written once, as a new part-<first hour>.parquet, and folded into the
+    returned state. The newer hours are rebuilt every run into OPEN_PART, so
+    sessions that arrive late for them (a partial last hour, long sessions
+    exported at plug-out) are picked up. state=None recomputes everything and
+    replaces the dataset; with the state saved by a previous run only the hours
+    after state.last_hour are built, and the rows are bit-for-bit the ones a
+    full recompute produces. Late sessions for a sealed hour are detected by
+    count and fall back to a full recompute.
+    Returns (part file names written, new state).
+    """
+    total_sessions = df['session_id'].count()
+    full = state is None
+    if not full and late_sessions(df, state):
+        print(f"[WARN] Sessions arrived for hours sealed more than {REOPEN_HOURS}h ago; recomputing all features")
+        full = True
+    elif not full and total_sessions == state.seen_sessions:
+        return [], state
+    if full:
+        state = empty_state()
+    else:
+        df = df[df['hour'] > state.last_hour]
+    hourly = hourly_aggregates(df)
+    if hourly.empty:
+        return [], state
+
+    cutoff = hourly.index[-1] - pd.Timedelta(hours=REOPEN_HOURS)
+    sealed_total, state = build_features(hourly[hourly.index <= cutoff], state)
+    open_total, _ = build_features(hourly[hourly.index > cutoff], state)
+    state = state._replace(seen_sessions=np.int64(total_sessions))
+
+    if full and Path(FEATURES_DATASET).exists():
+        for old_part in Path(FEATURES_DATASET).glob('part-*.parquet'):
+            old_part.unlink()
+    written = []
+    sealed_total = sealed_total.dropna().copy()
+    if not sealed_total.empty:
+        written.append(f"part-{sealed_total.index[0]:%Y%m%d%H}.parquet")
+        save_locally(sealed_total, FEATURES_DATASET, written[-1])
+    open_total = open_total.dropna().copy()
+    if not open_total.empty:
+        written.append(OPEN_PART)
+        save_locally(open_total, FEATURES_DATASET, OPEN_PART)
+    return written, state
+
+# --------- Segmented features ---------
+
+def _segment_features(key, segments, output_dir):
+    """Worker: feature build for a batch of (value, hourly aggregates) segments.
+    Returns [(value, feature rows written)]."""
+    written = []
+    for value, hourly in segments:
+        hourly_total, _ = build_features(hourly, empty_state())
+        hourly_total = hourly_total.dropna()
+        if len(hourly_total):
+            part_dir = Path(output_dir) / f"{key}={value}"
+            part_dir.mkdir(parents=True, exist_ok=True)
+            hourly_total.to_parquet(part_dir / f"part-{hourly_total.index[0]:%Y%m%d%H}.parquet",
+                                    engine='pyarrow', compression='snappy', index=False)
+        written.append((value, len(hourly_total)))
+    return written
+
+def segmented_engineering(df, key, output_dir=SEGMENTS_DATASET, workers=None):
+    """Same features as engineering(), computed per value of `key` (e.g. per garage).
+
+    The hourly aggregation runs once, grouped by (key, hour); the per-segment
+    series are then handed to a process pool in batches (a few per worker, so
+    thousands of small segments do not pay one task each) and every worker
+    writes its own partitions. Returns {segment value: feature rows}.
+    """
+    sessions = df[[key, 'hour', 'el_kwh', 'session_id']].dropna(subset=[key])
+    hourly = (sessions.groupby([key, 'hour'], observed=True, sort=True)
+              .agg(total_kwh=('el_kwh','sum'),n_sessions=('session_id','count'),avg_kwh=('el_kwh','mean')))
+    # rows are sorted by segment: split at the code boundaries instead of a groupby per segment
+    codes = hourly.index.codes[0]
+    bounds = np.flatnonzero(np.diff(codes)) + 1
+    starts = np.r_[0, bounds] if len(hourly) else np.array([], dtype=int)
+    ends = np.r_[bounds, len(hourly)]
+    values = hourly.index.levels[0][codes[starts]]
+    groups = [(str(value), hourly.iloc[start:end].droplevel(0))
+              for value, start, end in zip(values, starts, ends)]
+    if Path(output_dir).exists():
+        shutil.rmtree(output_dir)
+
+    workers = max(1, min(workers or os.cpu_count(), len(groups)))
+    batch_size = max(1, -(-len(groups) // (workers * 4)))
+    batches = [groups[i:i + batch_size] for i in range(0, len(groups), batch_size)]
+    if workers == 1:
+        results = [_segment_features(key, batch, output_dir) for batch in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_segment_features, [key] * len(batches), batches,
+                                    [output_dir] * len(batches)))
+    written = {value: rows for result in results for value, rows in result}
+    print(f"[OK] Features for {sum(1 for rows in written.values() if rows)}/{len(written)} "
+          f"{key} segments saved locally: {output_dir}")
+    return written
+
+def upload_to_s3(local_path, file_name, bucket='ev-data', prefix='parquets', replace=False):
+    """Upload local_path/file_name to s3://bucket/prefix/file_name.
+    replace=True first deletes everything else under the prefix (full recompute)."""
     # Upload the file
     local_file = f"{local_path}/{file_name}"
-    s3_key = f'parquets/{file_name}'
-    s3.upload_file(local_file, bucket, s3_key)
+    s3_key = f'{prefix}/{file_name}'
+    storage.upload_file(local_file, bucket, s3_key)
+    if replace:
+        storage.delete_prefix(bucket, f'{prefix}/', keep={s3_key})
     print(f"Uploaded: {s3_key}")
 
 
 def main(args):
-    # Load raw data
-    print(f"Loading raw data from: {args.input}")
-    if args.input.startswith("s3://"):  # From S3/LocalStack
-        df = pd.read_parquet(args.input, storage_options={ "client_kwargs": {"endpoint_url": "http://localhost:4566"},
-    "key": "test",
-    "secret": "test" }, engine='pyarrow')
-    else:
-        df = pd.read_parquet(args.input)
+    with instrument.stage("features"):
+        # Load raw data
+        print(f"Loading raw data from: {args.input}")
+        with instrument.step("load") as step:
+            df = storage.read_parquet(args.input)  # local, or S3/LocalStack through the read cache
+            step.rows_out = len(df)
+
+        with instrument.step("cleaning", rows_in=len(df)) as step:
+            df = cleaning(df)
+            step.rows_out = len(df)
+        if args.segment_by:
+            with instrument.step("segmented_engineering", rows_in=len(df)) as step:
+                written = segmented_engineering(df, args.segment_by, workers=args.workers)
+                step.rows_out = sum(written.values())
+            with instrument.step("upload"):
+                for part in sorted(Path(SEGMENTS_DATASET).glob('*/part-*.parquet')):
+                    upload_to_s3(part.parent, part.name, 'ev-data', prefix=f'parquets/segments/{part.parent.name}',
+                                 replace=True)
+            return
+
+        state = load_state() if args.incremental else None
+        with instrument.step("engineering", rows_in=len(df)) as step:
+            part_names, new_state = engineering(df, state)
+            step.rows_out = sum(pq.read_metadata(Path(FEATURES_DATASET) / name).num_rows for name in part_names)
+        if not part_names:
+            print(f"[OK] Features up to date (sealed up to: {new_state.last_hour})")
+        else:
+            # a full recompute (no state, or late sessions for sealed hours) replaces the S3 dataset too
+            full = state is None or late_sessions(df, state)
+            with instrument.step("upload"):
+                for i, part_name in enumerate(part_names):
+                    upload_to_s3(FEATURES_DATASET, part_name, 'ev-data', prefix='parquets/features',
+                                 replace=full and i == 0)
+        # saved last: if the upload failed, the next run rebuilds the same parts
+        save_state(new_state)
 
-    df = cleaning(df)
-    engineering(df)
-    upload_to_s3('C:/Users/GIGABYTE/Documents/ml/mlops/data/features','features.parquet','ev-data')
-    
 
 if __name__ == "__main__":
     args = parse_args()
@@ -1,65 +1,250 @@
 import argparse
+import hashlib
+import io
+import json
+import shutil
+import time
+from datetime import datetime
 import pandas as pd
-import boto3
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
 import pathlib
+import sys
 
-def load_and_clean_csv(csv_path):
+# make the `src` package importable when run as a script from src/pipeline
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2]))
+from src.aws import storage
+from src.pipeline import instrument
 
-    df = pd.read_csv(csv_path, sep=';', encoding='utf-8', 
-                     parse_dates=['Start_plugin','End_plugout'],
-                     decimal=',', dayfirst=True)
-    
-    return df
+# column types of the raw export. Text columns with a handful of distinct values
+# are dictionary-encoded: stored once per row group, read back as pandas categoricals
+DICTIONARY = pa.dictionary(pa.int32(), pa.string())
+RAW_SCHEMA = pa.schema([
+    ('session_ID', pa.int64()),
+    ('Garage_ID', DICTIONARY),
+    ('User_ID', pa.string()),
+    ('User_type', DICTIONARY),
+    ('Shared_ID', DICTIONARY),
+    ('Start_plugin', pa.timestamp('ns')),
+    ('Start_plugin_hour', pa.int64()),
+    ('End_plugout', pa.timestamp('ns')),
+    ('End_plugout_hour', pa.float64()),
+    ('El_kWh', pa.float64()),
+    ('Duration_hours', pa.float64()),
+    ('month_plugin', DICTIONARY),
+    ('weekdays_plugin', DICTIONARY),
+    ('Plugin_category', DICTIONARY),
+    ('Duration_category', DICTIONARY),
+])
+# day-first dates like "21.12.2018 10:20"
+TIMESTAMP_FORMATS = ['%d.%m.%Y %H:%M', '%d.%m.%Y %H:%M:%S']
+# CSV bytes parsed per batch; each batch becomes one row group, so this (not the
+# file size) bounds memory: roughly a few blocks are in flight at a time
+BLOCK_SIZE_MB = 16
 
-def save_parquet_simple(df, output_dir):
+def open_csv_stream(source, block_size_mb=BLOCK_SIZE_MB):
+    """Batch reader over a raw-export CSV (path or binary file object)."""
+    return pv.open_csv(
+        source,
+        read_options=pv.ReadOptions(block_size=int(block_size_mb * 1024 * 1024), use_threads=True),
+        parse_options=pv.ParseOptions(delimiter=';'),
+        convert_options=pv.ConvertOptions(column_types=RAW_SCHEMA, timestamp_parsers=TIMESTAMP_FORMATS,
+                                          decimal_point=',', strings_can_be_null=True),
+    )
 
-    # Ensure output directory exists
-    pathlib.Path(output_dir).parent.mkdir(parents=True, exist_ok=True)
-    
-    output_file = f"{output_dir}/ingest.parquet"
-    df.to_parquet(output_file, index=False, engine='pyarrow',
-                  compression='snappy')
-    
-    print(f"Parquet saved at: {output_file}")
-    return output_dir
-
-def upload_to_s3(local_path, bucket='ev-data'):
-    s3 = boto3.client('s3', 
-                     endpoint_url="http://localhost:4566",
-                     aws_access_key_id="test", 
-                     aws_secret_access_key="test")
-    
-    # Create bucket if not exists
-    try:
-        s3.create_bucket(Bucket=bucket)
-    except:
-        pass
-    
-    # Upload the file
-    local_file = f"{local_path}/ingest.parquet"
-    s3_key = 'parquets/ingest.parquet'
-    s3.upload_file(local_file, bucket, s3_key)
-    print(f"Uploaded: {s3_key}")
+# --------- Append-only month-partitioned dataset ---------
+# data/raw/sessions/<YYYY-MM>/part-<run id>.parquet, plus _manifest.json (ignored by
+# Parquet readers, like every _-prefixed file) recording, per source CSV, how many
+# bytes were ingested and the newest Start_plugin seen. Exports only ever grow, so
+# the next run parses just the bytes after the recorded offset.
+
+DATASET_DIR = 'data/raw/sessions'
+MANIFEST_NAME = '_manifest.json'
+# bytes of the already-ingested prefix hashed to tell an appended file from a rewritten one
+FINGERPRINT_BYTES = 64 * 1024
+
+class CsvTail(io.RawIOBase):
+    """The CSV header line followed by bytes [start, end) of the file: the unread
+    part of an export as a standalone CSV."""
+
+    def __init__(self, path, start, end):
+        self._file = open(path, 'rb')
+        self._prefix = self._file.readline() if start > 0 else b''
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self._prefix:
+            n = min(len(b), len(self._prefix))
+            b[:n], self._prefix = self._prefix[:n], self._prefix[n:]
+            return n
+        data = self._file.read(min(len(b), self._remaining))
+        b[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+def load_manifest(dataset_dir):
+    path = pathlib.Path(dataset_dir) / MANIFEST_NAME
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(manifest, dataset_dir):
+    path = pathlib.Path(dataset_dir) / MANIFEST_NAME
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    tmp.replace(path)     # atomic: a crashed run leaves the previous manifest
+
+def fingerprint(path, length):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read(min(length, FINGERPRINT_BYTES))).hexdigest()
+
+def plan_source(csv_path, entry):
+    """(start offset, watermark) for one source given its manifest entry.
+
+    Appended export: start at the recorded offset, no filtering needed.
+    Rewritten/truncated export: re-read it all, keeping only sessions newer
+    than the recorded watermark.
+    """
+    size = pathlib.Path(csv_path).stat().st_size
+    if entry is None:
+        return 0, None
+    if size >= entry['offset'] and fingerprint(csv_path, entry['offset']) == entry['fingerprint']:
+        return entry['offset'], None
+    return 0, entry['max_start_plugin']
+
+def ingest_csv(csv_path, dataset_dir, part_name, entry=None, block_size_mb=BLOCK_SIZE_MB):
+    """Append the not-yet-ingested sessions of one CSV to the month partitions,
+    as <month>/<part_name> files. Returns (new manifest entry, rows written, files written)."""
+    csv_path = pathlib.Path(csv_path)
+    size = csv_path.stat().st_size
+    start, watermark = plan_source(csv_path, entry)
+    max_start = entry['max_start_plugin'] if entry else None
+    rows, writers = 0, {}
+
+    if start < size:
+        watermark_ts = pa.scalar(pd.Timestamp(watermark).as_unit('ns'), pa.timestamp('ns')) if watermark else None
+        with CsvTail(csv_path, start, size) as tail:
+            for batch in open_csv_stream(io.BufferedReader(tail), block_size_mb):
+                if watermark_ts is not None:
+                    batch = batch.filter(pc.greater(batch.column('Start_plugin'), watermark_ts))
+                if batch.num_rows == 0:
+                    continue
+                # yyyymm as an int: formatting every timestamp as a string is ~50x slower
+                start_plugin = batch.column('Start_plugin')
+                months = pc.add(pc.multiply(pc.year(start_plugin), 100), pc.month(start_plugin)).fill_null(0)
+                for month in pc.unique(months).to_pylist():
+                    if month not in writers:
+                        month_dir = f"{month // 100:04d}-{month % 100:02d}" if month else 'unknown'
+                        part = pathlib.Path(dataset_dir) / month_dir / part_name
+                        part.parent.mkdir(parents=True, exist_ok=True)
+                        writers[month] = (part, pq.ParquetWriter(part, batch.schema, compression='snappy'))
+                    writers[month][1].write_batch(batch.filter(pc.equal(months, month)))
+                batch_max = pc.max(batch.column('Start_plugin')).as_py()
+                if batch_max is not None:
+                    batch_max = pd.Timestamp(batch_max).isoformat()
+                    max_start = max(max_start, batch_max) if max_start else batch_max
+                rows += batch.num_rows
+        for _, writer in writers.values():
+            writer.close()
+
+    new_entry = {
+        'offset': size,
+        'fingerprint': fingerprint(csv_path, size),
+        'max_start_plugin': max_start,
+        'rows': (entry['rows'] if entry else 0) + rows,
+        'last_part': part_name if writers else (entry or {}).get('last_part'),
+    }
+    files = [part for part, _ in sorted(writers.values())]
+    return new_entry, rows, files
+
+def ingest(csv_paths, dataset_dir=DATASET_DIR, incremental=True, block_size_mb=BLOCK_SIZE_MB):
+    """Ingest CSV exports into the partitioned dataset. Without a manifest (or with
+    incremental=False) the dataset is rebuilt from scratch. Returns (rows, new files)."""
+    manifest = load_manifest(dataset_dir) if incremental else None
+    if manifest is None:
+        if (pathlib.Path(dataset_dir) / MANIFEST_NAME).exists():
+            shutil.rmtree(dataset_dir)
+        elif pathlib.Path(dataset_dir).exists() and any(pathlib.Path(dataset_dir).iterdir()):
+            raise ValueError(f"refusing to rebuild {dataset_dir}: not empty and has no {MANIFEST_NAME}, "
+                             f"so it is not an ingest dataset")
+        manifest = {'runs': 0, 'sources': {}}
+    pathlib.Path(dataset_dir).mkdir(parents=True, exist_ok=True)
+
+    run = manifest['runs'] + 1
+    total_rows, new_files = 0, []
+    for i, csv_path in enumerate(csv_paths):
+        name = pathlib.Path(csv_path).name
+        # run number first: within a month, part files sort in ingest order
+        part_name = f"part-{run:06d}-{i:03d}.parquet"
+        entry, rows, files = ingest_csv(csv_path, dataset_dir, part_name, manifest['sources'].get(name),
+                                        block_size_mb)
+        entry['ingested_at'] = datetime.now().isoformat(timespec='seconds')
+        manifest['sources'][name] = entry
+        total_rows += rows
+        new_files += files
+        print(f"[OK] {name}: {rows:,} new sessions in {len(files)} partitions")
+    manifest['runs'] = run
+    save_manifest(manifest, dataset_dir)
+    return total_rows, new_files
+
+def upload_to_s3(dataset_dir, files, bucket='ev-data', prefix='parquets/sessions', replace=False):
+    """Upload the given dataset files (and the manifest) under s3://bucket/prefix/.
+    replace=True (a rebuilt dataset) then deletes everything else under the prefix,
+    so part files of earlier runs are not read next to the rebuilt ones."""
+    # Upload only the new partition files
+    uploaded = set()
+    for local_file in list(files) + [pathlib.Path(dataset_dir) / MANIFEST_NAME]:
+        s3_key = f"{prefix}/{pathlib.Path(local_file).relative_to(dataset_dir).as_posix()}"
+        storage.upload_file(local_file, bucket, s3_key)
+        uploaded.add(s3_key)
+        print(f"Uploaded: {s3_key}")
+    if replace:
+        storage.delete_prefix(bucket, f"{prefix}/", keep=uploaded)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='ingestion pipeline from CSV to S3')
-    parser.add_argument('--csv', required=True, help='Input CSV file path')
-    parser.add_argument('--output', default='data/raw',
-                       help='Output directory for Parquet file')
+    parser.add_argument('--csv', required=True, nargs='+', help='Input CSV file path(s)')
+    parser.add_argument('--output', default=DATASET_DIR,
+                       help='Month-partitioned Parquet dataset directory')
     parser.add_argument('--bucket', default='ev-data', help='S3 bucket name')
-    parser.add_argument('--upload', action='store_true', help='Upload to S3 after processing')
+    parser.add_argument('--upload', action='store_true', help='Upload new partitions to S3 after processing')
+    parser.add_argument('--full', action='store_true', help='Ignore the manifest and rebuild the dataset')
+    parser.add_argument('--block-size-mb', type=float, default=BLOCK_SIZE_MB,
+                        help='CSV bytes per parsed block / row group; bounds peak memory')
     
     args = parser.parse_args()
     
     # Execute pipeline
-    print("Loading and cleaning CSV...")
-    df = load_and_clean_csv(args.csv)
-    
-    print("Saving as Parquet...")
-    output_path = save_parquet_simple(df, args.output)
-    
-    if args.upload:
-        print("Uploading to S3...")
-        upload_to_s3(output_path, args.bucket)
+    # no manifest (e.g. a fresh checkout) rebuilds the dataset just like --full
+    rebuild = args.full or load_manifest(args.output) is None
+    with instrument.stage("ingest"):
+        print("Streaming new sessions to Parquet...")
+        start = time.perf_counter()
+        with instrument.step("parse_write") as step:
+            rows, new_files = ingest(args.csv, args.output, incremental=not args.full,
+                                     block_size_mb=args.block_size_mb)
+            step.rows_in = step.rows_out = rows
+        elapsed = time.perf_counter() - start
+        peak_rss = instrument.peak_rss()
+        peak_rss_mb = "n/a" if peak_rss is None else f"{peak_rss / 2**20:,.0f} MiB"
+        print(f"[OK] Ingested {rows:,} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s), "
+              f"peak RSS {peak_rss_mb}")
+
+        if args.upload:
+            print("Uploading to S3...")
+            with instrument.step("upload"):
+                upload_to_s3(args.output, new_files, args.bucket, replace=rebuild)
     
-    print("[OK] Pipeline completed successfully!")
\ No newline at end of file
+    print("[OK] Pipeline completed successfully!")
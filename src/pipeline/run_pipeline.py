@@ -1,13 +1,21 @@
 """
 run_pipeline.py
-End-to-end ML pipeline orchestrator
+End-to-end ML pipeline orchestrator: features -> train (per model) -> eval
+(per model) -> registry, run as a DAG (see dag.py). Independent train/eval
+jobs run concurrently and unchanged stages are skipped. With
+pipeline.in_process, one train_all.py stage replaces the train/eval jobs.
 """
+import ast
 import sys
 import os
 import yaml
 import subprocess
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from src.pipeline import instrument
+from src.pipeline.dag import DagRunner, Stage
+
 # Disable MLflow emojis globally
 os.environ['MLFLOW_TRACKING_PRINT_RUN_URL'] = 'false'
 
@@ -38,7 +46,7 @@ def run_command(cmd):
         print(f"[ERROR] Command failed with code {result.returncode}")
         if result.stderr:
             print(result.stderr)
-        sys.exit(1)
+        raise RuntimeError(f"{' '.join(cmd)} exited with code {result.returncode}")
 
     if result.stdout:
         print(result.stdout)
@@ -46,76 +54,139 @@ def run_command(cmd):
     return result
 
 
+def newest_after(directory, pattern, started_at):
+    """Files matching pattern written since started_at, newest first."""
+    files = [p for p in Path(directory).glob(pattern) if p.stat().st_mtime >= started_at - 1]
+    return sorted(files, key=os.path.getmtime, reverse=True)
+
+def code_inputs(*scripts):
+    """The scripts plus every src/ module they import, directly or through other
+    src/ modules, so an edit to shared code invalidates each stage that runs it."""
+    root = Path(__file__).resolve().parents[2]
+    seen, pending = set(), [Path(s).resolve() for s in scripts]
+    while pending:
+        path = pending.pop()
+        if path in seen or not path.exists():
+            continue
+        seen.add(path)
+        for node in ast.walk(ast.parse(path.read_text(encoding="utf-8"), filename=str(path))):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                # `from src.pipeline import instrument` names a module, not just a package
+                names = [node.module] + [f"{node.module}.{alias.name}" for alias in node.names]
+            else:
+                continue
+            for name in names:
+                if name.split(".")[0] == "src":
+                    module = root.joinpath(*name.split(".")).with_suffix(".py")
+                    if module.is_file():
+                        pending.append(module)
+    return sorted(seen)
+
+def build_stages(config, script_dir, model_dir, reports_dir):
+    raw_path = config['data']['raw_path']
+    features_path = config['data']['features_path']
+    test_path = config['data']['test_path']
+
+    features_cmd = ["python", "features.py", "--input", raw_path]
+    if config.get('features', {}).get('incremental'):
+        features_cmd.append("--incremental")
+    stages = [Stage("features", features_cmd, inputs=[raw_path, *code_inputs(script_dir / "features.py")])]
+
+    models = config['models']
+    if config.get('pipeline', {}).get('in_process'):
+        # one process trains and evaluates every model from a single read of the features
+        def train_eval_outputs(started_at, _):
+            model_paths = [newest_after(model_dir, f"{model}_model_*.joblib", started_at)[0] for model in models]
+            return model_paths + [reports_dir / path.stem / "metrics.json" for path in model_paths]
+
+        stages.append(Stage(
+            "train_eval",
+            ["python", "train_all.py", "--input", features_path, "--test-data", test_path, "--models", *models,
+             "--workers", str(config['pipeline'].get('train_workers', 1))],
+            deps=["features"],
+            inputs=[features_path, test_path, *code_inputs(script_dir / "train_all.py")],
+            outputs=train_eval_outputs,
+        ))
+        evaluated = ["train_eval"]
+    else:
+        for model in models:
+            stages.append(Stage(
+                f"train:{model}",
+                ["python", "train.py", "--input", features_path, "--model", model],
+                deps=["features"],
+                inputs=[features_path, *code_inputs(script_dir / "train.py")],
+                # [0]: a run that wrote no new model fails the stage instead of caching nothing
+                outputs=lambda started_at, _, model=model: [newest_after(model_dir, f"{model}_model_*.joblib",
+                                                                         started_at)[0]],
+            ))
+            stages.append(Stage(
+                f"eval:{model}",
+                lambda outputs, model=model: ["python", "eval.py", "--model", outputs[f"train:{model}"][0],
+                                              "--test-data", test_path],
+                deps=[f"train:{model}"],
+                inputs=[test_path, *code_inputs(script_dir / "eval.py")],
+                # eval.py writes reports/<model name>/metrics.json
+                outputs=lambda _, outputs, model=model: [reports_dir / Path(outputs[f"train:{model}"][0]).stem
+                                                         / "metrics.json"],
+            ))
+        evaluated = [f"eval:{model}" for model in models]
+
+    # Update model registry with best model
+    stages.append(Stage(
+        "registry",
+        ["python", str(script_dir / "update_registry.py")],
+        deps=evaluated,
+        inputs=code_inputs(script_dir / "update_registry.py"),
+        outputs=[model_dir / "registry.json", model_dir / "registry.db"],
+    ))
+    return stages
+
 def main():
     print("=" * 60)
     print("[PIPELINE] Starting ML Pipeline")
     print("=" * 60)
     
     # Change to script directory
-    script_dir = Path(__file__).parent
+    script_dir = Path(__file__).resolve().parent
     os.chdir(script_dir)
     
     # Load configuration
     config = load_config()
-    raw_path = config['data']['raw_path']
-    features_path = config['data']['features_path']
-    test_path = config['data']['test_path']
     model_output = config['paths']['model_output']
     models = config['models']
+    pipeline = config.get('pipeline', {})
     
     print(f"\n[CONFIG] Loaded configuration:")
-    print(f"  Raw: {raw_path}")
-    print(f"  Features: {features_path}")
+    print(f"  Raw: {config['data']['raw_path']}")
+    print(f"  Features: {config['data']['features_path']}")
     print(f"  Models: {', '.join(models)}")
-    
-    # Step 1: Feature Engineering
-    print("\n" + "=" * 60)
-    print("[STEP 1/3] Feature Engineering")
-    print("=" * 60)
-    run_command(["python", "features.py", "--input", raw_path])
-    
-    # Step 2: Model Training
-    print("\n" + "=" * 60)
-    print("[STEP 2/3] Training Models")
-    print("=" * 60)
-    for i, model in enumerate(models, 1):
-        print(f"\n[TRAIN {i}/{len(models)}] Training {model.upper()}...")
-        run_command(["python", "train.py", "--input", features_path, "--model", model])
-    
-    # Step 3: Model Evaluation
-    print("\n" + "=" * 60)
-    print("[STEP 3/3] Evaluating Models")
-    print("=" * 60)
-    
+    print(f"  Workers: {pipeline.get('workers', 2)}")
+
     model_dir = Path(model_output)
     if not model_dir.is_absolute():
         model_dir = (script_dir / model_dir).resolve()
+    reports_dir = (script_dir / ".." / "reports").resolve()
+
+    runner = DagRunner(build_stages(config, script_dir, model_dir, reports_dir), run_command,
+                       workers=pipeline.get('workers', 2),
+                       cache_dir=pipeline.get('cache_dir', '.pipeline_cache'))
+    # every stage's metrics and trace records carry this run's id
+    os.environ['PIPELINE_RUN_ID'] = instrument.RUN_ID
+    try:
+        with instrument.stage("pipeline"):
+            timeline = runner.run()
+    finally:
+        runner.print_timeline()
 
-    evaluated = 0
-    for model in models:
-        pattern = f"{model}_model_*.joblib"
-        model_files = sorted(model_dir.glob(pattern), key=os.path.getmtime, reverse=True)
-        
-        if model_files:
-            latest_model = str(model_files[0])
-            print(f"\n[EVAL] {model.upper()}: {Path(latest_model).name}")
-            run_command(["python", "eval.py", "--model", latest_model, "--test-data", test_path])
-            evaluated += 1
-        else:
-            print(f"[WARN] No model found for {model}")
-    
     # Summary
+    ran = [name for name, _, _, status in timeline if status == "ran"]
     print("\n" + "=" * 60)
     print(f"[SUCCESS] Pipeline completed!")
-    print(f"  - {len(models)} models trained")
-    print(f"  - {evaluated} models evaluated")
+    print(f"  - {len(ran)} stages ran, {len(timeline) - len(ran)} unchanged (cached)")
     print("=" * 60)
 
-    # Update model registry with best model
-    print("\n[STEP 4] Updating model registry")
-    script_dir = Path(__file__).parent
-    run_command(["python", str(script_dir / "update_registry.py")])
-
 if __name__ == "__main__":
     try:
         main()
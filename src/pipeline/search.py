@@ -0,0 +1,218 @@
+"""
+search.py
+Hyperparameter search for train.py --search: rolling-origin time-series
+cross-validation with successive halving.
+
+Every candidate config starts on the most recent fold only; after each rung
+the best 1/ETA of the candidates move on to ETA times as many folds (always
+the most recent ones), until the survivors have been scored on every fold.
+Boosted models train with a high round cap and early stopping on the fold's
+validation slice. (candidate, fold) fits run on a process pool across all cores.
+"""
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from lightgbm import early_stopping
+from mlflow.entities import Metric, Param, RunTag
+from sklearn.metrics import mean_absolute_error, root_mean_squared_error
+
+# grids the random candidates are drawn from; lr has nothing to tune and is only cross-validated
+SEARCH_SPACES = {
+    "lr": {},
+    "dt": {
+        "max_depth": [3, 4, 5, 6, 8, 10, 12],
+        "min_samples_leaf": [1, 5, 10, 20, 50],
+    },
+    "xgb": {
+        "max_depth": [3, 4, 5, 6, 8],
+        "learning_rate": [0.02, 0.05, 0.1, 0.2],
+        "min_child_weight": [1, 3, 5, 10],
+        "subsample": [0.7, 0.85, 1.0],
+        "colsample_bytree": [0.7, 0.85, 1.0],
+    },
+    "lgb": {
+        "num_leaves": [7, 15, 31, 63],
+        "learning_rate": [0.02, 0.05, 0.1],
+        "min_child_samples": [10, 20, 40],
+        "colsample_bytree": [0.7, 0.85, 1.0],
+        "reg_lambda": [0.0, 1.0, 5.0],
+    },
+}
+BOOSTED = {"xgb", "lgb"}
+MAX_ROUNDS = 2000
+EARLY_STOPPING_ROUNDS = 50
+ETA = 3
+FOLD_HOURS = 24 * 30
+
+
+def rolling_origin_folds(n_rows, n_folds, fold_hours=FOLD_HOURS):
+    """[(train_end, val_end)]: fold k trains on rows [0, train_end) and validates on
+    [train_end, val_end). Validation slices tile the end of the series, oldest first;
+    they shrink if the series is too short for n_folds full slices next to a training
+    window at least as long as one of them."""
+    size = min(fold_hours, n_rows // (n_folds + 1))
+    if size < 24:
+        raise ValueError(f"{n_rows} rows are too few for {n_folds} folds of at least a day")
+    return [(n_rows - (n_folds - k) * size, n_rows - (n_folds - k - 1) * size) for k in range(n_folds)]
+
+def sample_candidates(name, n_trials, seed=42):
+    """Up to n_trials distinct configs drawn at random from the model's grid."""
+    space = SEARCH_SPACES[name]
+    if not space:
+        return [{}]
+    keys = sorted(space)
+    total = math.prod(len(space[k]) for k in keys)
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(total, size=min(n_trials, total), replace=False)
+    candidates = []
+    for pick in picks:
+        config = {}
+        for key in keys:
+            pick, i = divmod(int(pick), len(space[key]))
+            config[key] = space[key][i]
+        candidates.append(config)
+    return candidates
+
+
+# --------- One (candidate, fold) fit ---------
+
+_X = _y = None
+
+def _init_worker(X, y):
+    global _X, _y
+    _X, _y = X, y
+
+def fit_fold(name, params, fold, single_threaded=False):
+    """Fit one config on one fold: {"mae", "rmse", "best_iteration", "seconds"}."""
+    from src.pipeline.train import build_model
+
+    train_end, val_end = fold
+    X_fit, y_fit = _X.iloc[:train_end], _y.iloc[:train_end]
+    X_val, y_val = _X.iloc[train_end:val_end], _y.iloc[train_end:val_end]
+    start = time.perf_counter()
+    model = build_model(name, params)
+    if single_threaded and "n_jobs" in model.get_params():
+        # the pool already uses every core
+        model.set_params(n_jobs=1)
+    if name == "xgb":
+        model.set_params(n_estimators=MAX_ROUNDS, early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+        model.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], verbose=False)
+        best_iteration = model.best_iteration + 1
+    elif name == "lgb":
+        model.set_params(n_estimators=MAX_ROUNDS, verbose=-1)
+        model.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], eval_metric="l1",
+                  callbacks=[early_stopping(EARLY_STOPPING_ROUNDS, first_metric_only=True, verbose=False)])
+        best_iteration = model.best_iteration_
+    else:
+        model.fit(X_fit, y_fit)
+        best_iteration = None
+    preds = model.predict(X_val)
+    return {
+        "mae": float(mean_absolute_error(y_val, preds)),
+        "rmse": float(root_mean_squared_error(y_val, preds)),
+        "best_iteration": best_iteration,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+# --------- Successive halving ---------
+
+def successive_halving(name, X, y, n_folds=5, n_trials=27, workers=None, seed=42):
+    """Search the model's space on (X, y) (the training split, in time order).
+
+    Returns {"best": index of the winning trial, "trials": [{"params", "folds":
+    {fold index: fit result}, "rung", "cv_mae"}], "folds": [(train_end, val_end)],
+    "fits", "seconds"}.
+    "cv_mae" is the mean over the folds the trial reached; only the finalists
+    were scored on every fold.
+    """
+    folds = rolling_origin_folds(len(X), n_folds)
+    candidates = sample_candidates(name, n_trials, seed)
+    trials = [{"params": params, "folds": {}, "rung": 0, "cv_mae": None} for params in candidates]
+    workers = max(1, workers or os.cpu_count())
+    start = time.perf_counter()
+
+    # rung 0 uses the last fold; each later rung ETA times as many, ending on all of them
+    n_rungs = 1 + math.ceil(math.log(len(candidates), ETA)) if len(candidates) > 1 else 1
+    n_rungs = min(n_rungs, 1 + math.ceil(math.log(n_folds, ETA))) if n_folds > 1 else 1
+    survivors = list(range(len(candidates)))
+    # workers get the data once, when they start, rather than with every task
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(X, y))
+    else:
+        _init_worker(X, y)
+    try:
+        for rung in range(n_rungs):
+            used = n_folds if rung == n_rungs - 1 else min(n_folds, ETA ** rung)
+            fold_ids = list(range(n_folds - used, n_folds))
+            tasks = [(i, f) for i in survivors for f in fold_ids if f not in trials[i]["folds"]]
+            args = ([name] * len(tasks), [trials[i]["params"] for i, _ in tasks], [folds[f] for _, f in tasks],
+                    [pool is not None] * len(tasks))
+            results = pool.map(fit_fold, *args) if pool else map(fit_fold, *args)
+            for (i, f), result in zip(tasks, results):
+                trials[i]["folds"][f] = result
+            for i in survivors:
+                trials[i]["rung"] = rung
+                trials[i]["cv_mae"] = float(np.mean([trials[i]["folds"][f]["mae"] for f in fold_ids]))
+            survivors.sort(key=lambda i: trials[i]["cv_mae"])
+            if rung < n_rungs - 1:
+                survivors = survivors[:max(1, math.ceil(len(survivors) / ETA))]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return {
+        "best": survivors[0],
+        "trials": trials,
+        "folds": folds,
+        "fits": sum(len(t["folds"]) for t in trials),
+        "seconds": time.perf_counter() - start,
+    }
+
+def final_params(name, search):
+    """Best config for the refit on the whole training split; boosted models get the
+    median early-stopped round count over the folds instead of the cap."""
+    best = search["trials"][search["best"]]
+    params = dict(best["params"])
+    if name in BOOSTED:
+        rounds = [r["best_iteration"] for r in best["folds"].values()]
+        params["n_estimators"] = int(np.median(rounds))
+    return params
+
+def summary(name, search):
+    """JSON-ready best config and the winner's per-fold metrics."""
+    best = search["trials"][search["best"]]
+    return {
+        "model": name,
+        "best_params": final_params(name, search),
+        "cv_mae": best["cv_mae"],
+        "folds": [{"fold": f, "train_rows": search["folds"][f][0],
+                   "val_rows": search["folds"][f][1] - search["folds"][f][0], **result}
+                  for f, result in sorted(best["folds"].items())],
+        "trials": len(search["trials"]),
+        "fits": search["fits"],
+        "seconds": search["seconds"],
+    }
+
+
+# --------- MLflow ---------
+
+def log_trials(client, parent_run_id, experiment_id, name, search):
+    """One nested run per trial, written with a single log_batch call each."""
+    for i, trial in enumerate(search["trials"]):
+        run = client.create_run(experiment_id, run_name=f"{name}-trial-{i:03d}",
+                                tags={"mlflow.parentRunId": parent_run_id})
+        now = int(time.time() * 1000)
+        metrics = [Metric("cv_mae", trial["cv_mae"], now, 0), Metric("rung", trial["rung"], now, 0)]
+        for f, result in sorted(trial["folds"].items()):
+            metrics += [Metric("fold_mae", result["mae"], now, f), Metric("fold_rmse", result["rmse"], now, f)]
+            if result["best_iteration"] is not None:
+                metrics.append(Metric("fold_best_iteration", result["best_iteration"], now, f))
+        params = [Param(key, str(value)) for key, value in trial["params"].items()]
+        client.log_batch(run.info.run_id, metrics=metrics, params=params,
+                         tags=[RunTag("model_type", name), RunTag("trial", str(i))])
+        client.set_terminated(run.info.run_id)
@@ -1,97 +1,184 @@
 import os
+import sys
 import argparse
 import pandas as pd
 import mlflow
 import mlflow.sklearn
 import joblib
+import json
 from sklearn.linear_model import LinearRegression
 from sklearn.tree import DecisionTreeRegressor
 from xgboost import XGBRegressor
 from lightgbm import LGBMRegressor
 from sklearn.metrics import mean_absolute_error, root_mean_squared_error
 from datetime import datetime
-import boto3
+from pathlib import Path
+
+# make the `src` package importable when run as a script from src/pipeline
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from src.aws import storage
+from src.inference.tree_engine import export_model
+from src.pipeline import instrument, search
+
+
+MODEL_CHOICES = ["lr", "dt", "xgb", "lgb"]
+TEST_HOURS = 24 * 30
 
 
 # ----- Command-line args for flexibility -----
 def parse_args():
     parser = argparse.ArgumentParser(description="Model Training Pipeline")
     parser.add_argument("--input", required=True, help="Path to features (local or s3)")
-    parser.add_argument("--model", required=True, choices=["lr", "dt", "xgb", "lgb"], help="Which model to train")
+    parser.add_argument("--model", required=True, choices=MODEL_CHOICES, help="Which model to train")
     parser.add_argument("--output", default="C:\\Users\\GIGABYTE\\Documents\\ml\\mlops\\src\\models", help="Local model directory or S3 path")
     parser.add_argument("--mlflow_uri", default="http://localhost:5000", help="MLflow tracking URI")
     parser.add_argument("--experiment", default="ev", help="MLflow experiment name")
     parser.add_argument("--bucket", default="ev-data", help="S3 bucket name for model artifacts")
+    parser.add_argument("--no-upload", action="store_true", help="Keep the model files local (no S3 upload)")
+    parser.add_argument("--segment", help="Train on one segment of a features.py --segment-by dataset, "
+                                          "e.g. garage_id=Bl2 (--input is the dataset root)")
+    parser.add_argument("--search", action="store_true",
+                        help="Pick hyperparameters by time-series CV with successive halving before the final fit")
+    parser.add_argument("--folds", type=int, default=5, help="Rolling-origin CV folds for --search")
+    parser.add_argument("--trials", type=int, default=27, help="Candidate configs for --search")
+    parser.add_argument("--search-workers", type=int, default=os.cpu_count(), help="Processes for --search")
 
     
     return parser.parse_args()
 
+# ----- Building blocks (shared with train_all.py) -----
+def load_features(input_path, segment=None):
+    if segment:
+        # <root>/<key>=<value>/ holds that segment's parts
+        input_path = f"{input_path.rstrip('/')}/{segment}"
+    print(f"Loading features from: {input_path}")
+    return storage.read_parquet(input_path)
+
+def holdout_mask(df):
+    """Rows in the test split: the last 30 days."""
+    if len(df) <= TEST_HOURS:
+        raise ValueError(f"need more than {TEST_HOURS} feature rows (30 days test split), got {len(df)}")
+    split_date = df.index[-TEST_HOURS]
+    return df.index >= split_date
+
+def build_model(name, params=None):
+    """The model with its default hyperparameters, overridden by `params` (e.g. from --search)."""
+    if name == "lr":
+        model = LinearRegression()
+    elif name == "dt":
+        model = DecisionTreeRegressor(max_depth=5, random_state=42)
+    elif name == "xgb":
+        model = XGBRegressor(n_estimators=100, verbosity=0, random_state=42, max_depth=5)
+    elif name == "lgb":
+        model = LGBMRegressor(n_estimators=2000, learning_rate=0.05, random_state=42)
+    else:
+        raise ValueError(f"unknown model {name!r}, expected one of {MODEL_CHOICES}")
+    return model.set_params(**params) if params else model
+
+def save_model(model, name, output, X_check, segment=None, bucket="ev-data", upload=True):
+    """Save the joblib and the compiled node tables locally (and to S3); returns the joblib path."""
+    now = datetime.now().strftime('%Y%m%d_%H%M')
+    # segment models go to <output>/segments/<key>=<value>/, where the API's model pool finds them
+    output_dir = os.path.join(output, "segments", segment) if segment else output
+    os.makedirs(output_dir, exist_ok=True)
+    local_model_path = os.path.join(output_dir, f"{name}_model_{now}.joblib")
+    joblib.dump(model, local_model_path)
+    print(f"Model saved locally: {local_model_path}")
+
+    # Export NumPy node tables for the compiled inference engine (verified against model.predict)
+    compiled_model_path = export_model(model, local_model_path, X_check=X_check)
+    print(f"Compiled model saved locally: {compiled_model_path}")
+    if not upload:
+        return local_model_path
+
+    # Upload to S3 if output is an s3 path
+    s3_prefix = f"artifacts/model/segments/{segment}" if segment else "artifacts/model"
+    s3_model_key = f"{s3_prefix}/{name}_model_{now}.joblib"
+    storage.upload_file(local_model_path, bucket, s3_model_key)
+    print(f"Model saved to s3://{bucket}/{s3_model_key}")
+    s3_compiled_key = f"{s3_prefix}/{compiled_model_path.name}"
+    storage.upload_file(compiled_model_path, bucket, s3_compiled_key)
+    print(f"Compiled model saved to s3://{bucket}/{s3_compiled_key}")
+    return local_model_path
+
 # ----- Main training logic -----
 def main(args):
+    target = f"{args.model}_{args.segment}" if args.segment else args.model
+    with instrument.stage("train", target=target):
+        train(args)
+
+def train(args):
     print("connecting to data source...")
      # S3/LocalStack settings
     print("setting up mlflow...")
     mlflow.set_tracking_uri(args.mlflow_uri)
     mlflow.set_experiment(args.experiment)
     # Load features data
-    print(f"Loading features from: {args.input}")
-    if args.input.startswith("s3://"):
-        df = pd.read_parquet(args.input, storage_options={ "client_kwargs": {"endpoint_url": "http://localhost:4566"},
-    "key": "test",
-    "secret": "test" }, engine='pyarrow')
-    else:
-        df = pd.read_parquet(args.input)
+    with instrument.step("load") as step:
+        df = load_features(args.input, args.segment)
+        step.rows_out = len(df)
 
     # Split features/target
     X = df.drop(columns=['total_kwh'])
     y = df['total_kwh']
 
     # Train-test split (last 30 days as test)
-    split_date = df.index[-24*30]
-    X_train = X[df.index < split_date]
-    X_test = X[df.index >= split_date]
-    y_train = y[df.index < split_date]
-    y_test = y[df.index >= split_date]
+    is_test = holdout_mask(df)
+    X_train = X[~is_test]
+    X_test = X[is_test]
+    y_train = y[~is_test]
+    y_test = y[is_test]
+
+    # Hyperparameter search on the training split only; the holdout stays unseen
+    params, result = None, None
+    if args.search:
+        print(f"Searching {args.model} hyperparameters ({args.trials} trials, {args.folds} folds, "
+              f"{args.search_workers} workers)...")
+        with instrument.step("search", rows_in=len(X_train)):
+            found = search.successive_halving(args.model, X_train, y_train, args.folds, args.trials,
+                                              args.search_workers)
+        params = search.final_params(args.model, found)
+        result = search.summary(args.model, found)
+        print(f"[OK] {result['fits']} fold fits in {result['seconds']:.1f}s, best CV MAE {result['cv_mae']:.4f}")
+        print(f"  best params: {params}")
+        for fold in result["folds"]:
+            print(f"  fold {fold['fold']}: train {fold['train_rows']} / val {fold['val_rows']} rows, "
+                  f"MAE {fold['mae']:.4f}, RMSE {fold['rmse']:.4f}")
 
     # Model selection
-    if args.model == "lr":
-        model = LinearRegression()
-    elif args.model == "dt":
-        model = DecisionTreeRegressor(max_depth=5, random_state=42)
-    elif args.model == "xgb":
-        model = XGBRegressor(n_estimators=100, verbosity=0, random_state=42, max_depth=5)
-    elif args.model == "lgb":
-        model = LGBMRegressor(n_estimators=2000, learning_rate=0.05, random_state=42)
+    model = build_model(args.model, params)
 
     # ----- MLflow run -----
-    with mlflow.start_run(run_name=args.model):
-        model.fit(X_train, y_train)
-        preds = model.predict(X_test)
+    run_name = f"{args.model}-{args.segment}" if args.segment else args.model
+    with mlflow.start_run(run_name=run_name) as run:
+        if result:
+            search.log_trials(mlflow.tracking.MlflowClient(), run.info.run_id, run.info.experiment_id,
+                              args.model, found)
+            mlflow.log_params(params)
+            mlflow.log_metric("cv_mae", result["cv_mae"])
+            mlflow.log_dict(result, "search.json")
+        with instrument.step("fit", rows_in=len(X_train)):
+            model.fit(X_train, y_train)
+        with instrument.step("predict", rows_in=len(X_test), rows_out=len(X_test)):
+            preds = model.predict(X_test)
         mae = mean_absolute_error(y_test, preds)
         rmse = root_mean_squared_error(y_test, preds)
-        mlflow.log_param("model_type", args.model)
-        mlflow.log_metric("mae", mae)
-        mlflow.log_metric("rmse", rmse)
-        # Save model artifact
-        mlflow.sklearn.log_model(model, "model")
-        # Save locally if requested
-        now = datetime.now().strftime('%Y%m%d_%H%M')
-        local_model_path = os.path.join(args.output, f"{args.model}_model_{now}.joblib")
-        joblib.dump(model, local_model_path)
-        print(f"Model saved locally: {local_model_path}")
-
-        # Upload to S3 if output is an s3 path
-        s3_model_key = f"artifacts/model/{args.model}_model_{now}.joblib"
-        s3 = boto3.client('s3',
-                        endpoint_url="http://localhost:4566",
-                        aws_access_key_id="test",
-                        aws_secret_access_key="test")
-        try:
-            s3.create_bucket(Bucket=args.bucket)
-        except:
-            pass
-        s3.upload_file(local_model_path, args.bucket, s3_model_key)
-        print(f"Model saved to s3://{args.bucket}/{s3_model_key}")
+        with instrument.step("log_save"):
+            mlflow.log_param("model_type", args.model)
+            if args.segment:
+                mlflow.log_param("segment", args.segment)
+            mlflow.log_metric("mae", mae)
+            mlflow.log_metric("rmse", rmse)
+            # Save model artifact
+            mlflow.sklearn.log_model(model, "model")
+            # Save locally if requested
+            local_model_path = save_model(model, args.model, args.output, X_test, args.segment, args.bucket,
+                                          upload=not args.no_upload)
+        if result:
+            search_path = Path(local_model_path).with_suffix(".search.json")
+            with open(search_path, "w") as f:
+                json.dump(result, f, indent=2)
+            print(f"Search results saved locally: {search_path}")
 
 if __name__ == "__main__":
     try:
@@ -102,4 +189,5 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"[ERROR] {e}")
         import traceback
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
+        sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,220 @@
+"""
+train_all.py
+Trains and evaluates every configured model in one process: the ML stack is
+imported once, the features are read once into one contiguous float32 matrix,
+and all models fit on the same train/test split and are evaluated from memory.
+With --workers > 1 the models train in a process pool; the workers map the
+matrix from shared memory instead of each receiving a pickled copy.
+"""
+import time
+
+_T0 = time.perf_counter()
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import mlflow
+import mlflow.sklearn
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_absolute_error, root_mean_squared_error
+
+# make the `src` package importable when run as a script from src/pipeline
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from src.pipeline import instrument
+from src.pipeline.eval import SCRIPT_DIR, evaluate
+from src.pipeline.train import MODEL_CHOICES, build_model, load_features, save_model, holdout_mask
+
+IMPORT_SECONDS = time.perf_counter() - _T0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train and evaluate all models in one process")
+    parser.add_argument("--input", required=True, help="Path to features (local or s3)")
+    parser.add_argument("--test-data", help="Separate test features (local or s3), read once for all models; "
+                                            "default: the last 30 days of --input, like train.py")
+    parser.add_argument("--models", nargs="+", choices=MODEL_CHOICES, default=MODEL_CHOICES)
+    parser.add_argument("--output", default="C:\\Users\\GIGABYTE\\Documents\\ml\\mlops\\src\\models",
+                        help="Local model directory")
+    parser.add_argument("--reports-dir", default=os.path.join(SCRIPT_DIR, "..", "reports"),
+                        help="Directory for evaluation reports/plots")
+    parser.add_argument("--mlflow-uri", default="http://localhost:5000", help="MLflow tracking URI")
+    parser.add_argument("--experiment", default="ev", help="MLflow experiment for the training runs")
+    parser.add_argument("--eval-experiment", default="evaluations", help="MLflow experiment for the evaluations")
+    parser.add_argument("--bucket", default="ev-data", help="S3 bucket name for model artifacts")
+    parser.add_argument("--no-upload", action="store_true", help="Keep the model files local (no S3 upload)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes training models side by side (xgb/lgb are already multithreaded)")
+    return parser.parse_args()
+
+
+# --------- Shared feature matrix ---------
+
+def feature_matrix(df):
+    """(X as a C-contiguous float32 matrix, y as float64, feature names)."""
+    features = df.drop(columns=['total_kwh'])
+    X = np.ascontiguousarray(features.to_numpy(dtype=np.float32))
+    y = df['total_kwh'].to_numpy(dtype=np.float64)
+    return X, y, list(features.columns)
+
+def share(arrays):
+    """Copy arrays into shared memory blocks: (blocks to keep alive, specs for workers)."""
+    blocks, specs = [], {}
+    for key, array in arrays.items():
+        block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        specs[key] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+def attach(specs):
+    """Worker side of share(): (blocks, arrays mapped without copying)."""
+    blocks, arrays = [], {}
+    for key, (name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+        arrays[key] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+    return blocks, arrays
+
+
+# --------- One model ---------
+
+def train_and_evaluate(name, data, settings):
+    """Fit, log, save and evaluate one model from the shared split. `data` holds the
+    arrays (in-process) or their shared-memory specs (pool worker). Returns
+    (model path, eval metrics, phase timings)."""
+    if not settings["shared"]:
+        return _train_and_evaluate(name, data, settings)
+    mlflow.set_tracking_uri(settings["mlflow_uri"])
+    blocks, arrays = attach(data)
+    try:
+        return _train_and_evaluate(name, arrays, settings)
+    finally:
+        # every view into the blocks is gone once _train_and_evaluate returns
+        del arrays
+        for block in blocks:
+            block.close()
+
+def _train_and_evaluate(name, data, settings):
+    columns = settings["columns"]
+    # DataFrame views over the matrix rows: models keep their feature names, nothing is copied
+    X_train = pd.DataFrame(data["X_train"], columns=columns, copy=False)
+    X_check = pd.DataFrame(data["X_holdout"], columns=columns, copy=False)
+    X_test = pd.DataFrame(data["X_test"], columns=columns, copy=False)
+    if name == "lr":
+        # least squares in float32 loses digits the trees do not need; the upcast is a few MB
+        X_train, X_check, X_test = (X.astype(np.float64) for X in (X_train, X_check, X_test))
+
+    timings = {}
+    start = time.perf_counter()
+    model = build_model(name)
+    with mlflow.start_run(run_name=name, experiment_id=settings["train_experiment"]):
+        with instrument.step("fit", rows_in=len(X_train)):
+            model.fit(X_train, data["y_train"])
+        timings["fit"] = time.perf_counter() - start
+        start = time.perf_counter()
+        with instrument.step("log_save"):
+            preds = model.predict(X_check)
+            mlflow.log_param("model_type", name)
+            mlflow.log_metric("mae", mean_absolute_error(data["y_holdout"], preds))
+            mlflow.log_metric("rmse", root_mean_squared_error(data["y_holdout"], preds))
+            mlflow.sklearn.log_model(model, "model")
+            model_path = save_model(model, name, settings["output"], X_check, bucket=settings["bucket"],
+                                    upload=settings["upload"])
+        timings["save"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with instrument.step("eval", rows_in=len(X_test), rows_out=len(X_test)):
+        metrics = evaluate(model, X_test, data["y_test"], model_path, settings["test_data"],
+                           settings["reports_dir"])
+        with mlflow.start_run(run_name="evaluation", experiment_id=settings["eval_experiment"]):
+            mlflow.log_metric("eval_mae", metrics["mae"])
+            mlflow.log_metric("eval_rmse", metrics["rmse"])
+            mlflow.log_metric("eval_r2", metrics["r2"])
+    timings["eval"] = time.perf_counter() - start
+    return model_path, metrics, timings
+
+
+# --------- All models ---------
+
+def train_all(args):
+    """Returns {model: (model path, eval metrics, phase timings)} and prints a timing summary."""
+    mlflow.set_tracking_uri(args.mlflow_uri)
+    train_experiment = mlflow.set_experiment(args.experiment).experiment_id
+    eval_experiment = mlflow.set_experiment(args.eval_experiment).experiment_id
+
+    start = time.perf_counter()
+    with instrument.step("load") as step:
+        df = load_features(args.input)
+        step.rows_out = len(df)
+    is_test = holdout_mask(df)
+    X, y, columns = feature_matrix(df)
+    del df
+    # features are sorted by hour, so the test split is a suffix and both halves are views
+    n_train = int((~is_test).sum())
+    if not is_test[n_train:].all():
+        raise ValueError("features are not sorted by hour; the test split is not the last rows")
+    data = {"X_train": X[:n_train], "y_train": y[:n_train], "X_holdout": X[n_train:], "y_holdout": y[n_train:]}
+    if args.test_data and args.test_data != args.input:
+        data["X_test"], data["y_test"], test_columns = feature_matrix(load_features(args.test_data))
+        if test_columns != columns:
+            raise ValueError(f"test features {test_columns} do not match the training features {columns}")
+    else:
+        data["X_test"], data["y_test"] = data["X_holdout"], data["y_holdout"]
+    load_seconds = time.perf_counter() - start
+    print(f"[OK] Loaded {X.shape[0]:,} x {X.shape[1]} features ({X.nbytes / 2**20:.1f} MiB float32) "
+          f"in {load_seconds:.2f}s")
+
+    settings = {
+        "columns": columns,
+        "test_data": args.test_data or args.input,
+        "output": args.output,
+        "reports_dir": args.reports_dir,
+        "bucket": args.bucket,
+        "upload": not args.no_upload,
+        "mlflow_uri": args.mlflow_uri,
+        "train_experiment": train_experiment,
+        "eval_experiment": eval_experiment,
+    }
+    workers = max(1, min(args.workers, len(args.models)))
+    if workers == 1:
+        settings["shared"] = False
+        results = []
+        for name in args.models:
+            with instrument.step(name):
+                results.append(train_and_evaluate(name, data, settings))
+    else:
+        settings["shared"] = True
+        blocks, specs = share(data)
+        try:
+            # the workers' own steps are not recorded; this one covers them (CPU of the reaped workers included)
+            with instrument.step("models"), ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(train_and_evaluate, args.models, [specs] * len(args.models),
+                                        [settings] * len(args.models)))
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+    results = dict(zip(args.models, results))
+
+    print(f"\n[TIMING] imports {IMPORT_SECONDS:.2f}s, feature load {load_seconds:.2f}s (once for all models)")
+    for name, (_, metrics, timings) in results.items():
+        print(f"  {name:<4} fit {timings['fit']:6.2f}s  log/save {timings['save']:6.2f}s  "
+              f"eval {timings['eval']:6.2f}s  MAE {metrics['mae']:.4f}")
+    # one train.py + one eval.py process per model each pay the imports and a read
+    repeats = 2 * len(args.models) - 1
+    print(f"[OK] Skipped {repeats} interpreter startups/feature reads vs one process per train/eval job "
+          f"(~{repeats * (IMPORT_SECONDS + load_seconds):.1f}s at this run's costs)")
+    return results
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print("[START] Training all models in one process...")
+    with instrument.stage("train_eval"):
+        train_all(args)
+    print("[OK] Training and evaluation completed successfully!")
@@ -1,66 +1,315 @@
 """
 update_registry.py
-Selects the best model based on metrics.json files and updates models/registry.json
+Model registry backed by SQLite (models/registry.db): every evaluated run, its
+metrics and artifact hash, and the full promotion history. Each invocation
+ingests only metrics.json files it has not seen (or that changed), promotes
+the best new run if it beats production, and exports models/registry.json
+(written atomically) for the API and the Lambda handler.
+
+    python update_registry.py                  # ingest + promote if better
+    python update_registry.py --promote NAME   # promote a model (name or run id)
+    python update_registry.py --rollback       # back to the previous production model
+    python update_registry.py --history
 """
 
-import os
+import argparse
+import hashlib
 import json
+import os
+import sqlite3
+import sys
+from datetime import datetime, timezone
 from pathlib import Path
 
+# make the `src` package importable when run as a script from src/pipeline
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from src.pipeline import instrument
+
 # BASE_DIR = project root (mlops/)
 BASE_DIR = Path(__file__).resolve().parents[2]
 
 REPORTS_DIR = BASE_DIR / "src" / "reports"
 MODELS_DIR = BASE_DIR / "src" / "models"
 REGISTRY_PATH = MODELS_DIR / "registry.json"
+DB_PATH = MODELS_DIR / "registry.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id              INTEGER PRIMARY KEY,
+    model_name      TEXT NOT NULL,
+    model_path      TEXT NOT NULL,
+    metrics_path    TEXT NOT NULL UNIQUE,
+    metrics_mtime   INTEGER NOT NULL,
+    metrics_size    INTEGER NOT NULL,
+    mae             REAL NOT NULL,
+    rmse            REAL,
+    r2              REAL,
+    test_data       TEXT,
+    metrics_json    TEXT NOT NULL,
+    artifact_sha256 TEXT,
+    ingested_at     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_by_mae ON runs (mae);
+CREATE INDEX IF NOT EXISTS runs_by_name ON runs (model_name);
+CREATE TABLE IF NOT EXISTS promotions (
+    id              INTEGER PRIMARY KEY,
+    run_id          INTEGER NOT NULL REFERENCES runs (id),
+    previous_run_id INTEGER REFERENCES runs (id),
+    action          TEXT NOT NULL CHECK (action IN ('promote', 'rollback')),
+    reason          TEXT,
+    promoted_at     TEXT NOT NULL
+);
+-- exactly one row: the current production run
+CREATE TABLE IF NOT EXISTS production (
+    slot            INTEGER PRIMARY KEY CHECK (slot = 1),
+    run_id          INTEGER NOT NULL REFERENCES runs (id),
+    promotion_id    INTEGER NOT NULL REFERENCES promotions (id)
+);
+"""
+
+def utcnow():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+def resolve_artifact(model_path):
+    """Local copy of a model: the recorded path, or models/<filename> for paths from another machine."""
+    if Path(model_path).exists():
+        return Path(model_path)
+    return MODELS_DIR / model_path.split("\\")[-1].split("/")[-1]
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    def __init__(self, db_path=DB_PATH, reports_dir=REPORTS_DIR, registry_path=REGISTRY_PATH):
+        self.reports_dir = Path(reports_dir)
+        self.registry_path = Path(registry_path)
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        # autocommit; writes take an explicit BEGIN IMMEDIATE so concurrent updaters serialize
+        self.conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _write(self):
+        return _Transaction(self.conn)
+
+    # --------- Ingestion ---------
+
+    def ingest(self):
+        """Add metrics.json files that are new or changed since they were ingested
+        (by mtime and size; unchanged files are not opened). Returns the new run ids."""
+        known = {row["metrics_path"]: (row["metrics_mtime"], row["metrics_size"])
+                 for row in self.conn.execute("SELECT metrics_path, metrics_mtime, metrics_size FROM runs")}
+        new_ids = []
+        with self._write():
+            for metrics_file in sorted(self.reports_dir.glob("*/metrics.json")):
+                stat = metrics_file.stat()
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if known.get(str(metrics_file)) == signature:
+                    continue
+                with open(metrics_file) as f:
+                    metrics = json.load(f)
+                artifact = resolve_artifact(metrics["model_path"])
+                row = {
+                    "model_name": Path(metrics["model_path"].replace("\\", "/")).stem,
+                    "model_path": metrics["model_path"],
+                    "metrics_path": str(metrics_file),
+                    "metrics_mtime": signature[0],
+                    "metrics_size": signature[1],
+                    "mae": metrics["mae"],
+                    "rmse": metrics.get("rmse"),
+                    "r2": metrics.get("r2"),
+                    "test_data": metrics.get("test_data"),
+                    "metrics_json": json.dumps(metrics),
+                    "artifact_sha256": file_sha256(artifact) if artifact.exists() else None,
+                    "ingested_at": utcnow(),
+                }
+                columns = ", ".join(row)
+                updates = ", ".join(f"{c} = excluded.{c}" for c in row if c != "metrics_path")
+                cursor = self.conn.execute(
+                    f"INSERT INTO runs ({columns}) VALUES ({', '.join('?' * len(row))}) "
+                    f"ON CONFLICT (metrics_path) DO UPDATE SET {updates} RETURNING id",
+                    list(row.values()))
+                new_ids.append(cursor.fetchone()["id"])
+        return new_ids
+
+    # --------- Lookup ---------
 
-def load_all_metrics():
-    """Scan reports directory and load all metrics.json files."""
-    metrics_list = []
-    for metrics_file in REPORTS_DIR.glob("*/metrics.json"):
-        with open(metrics_file) as f:
-            metrics = json.load(f)
-        metrics["metrics_path"] = str(metrics_file)
-        metrics_list.append(metrics)
-    return metrics_list
-
-def select_best_model(metrics_list):
-    """Choose best model based on lowest MAE (or RMSE)."""
-    if not metrics_list:
-        raise ValueError("No metrics.json files found; cannot update registry.")
-    
-    best = min(metrics_list, key=lambda m: m["mae"])
-    return best
-
-def build_registry_entry(best_metrics):
-    """Build registry.json structure from best model metrics."""
-    return {
-        "production": {
-            "model_name": Path(best_metrics["model_path"]).stem,
-            "model_path": best_metrics["model_path"],
-            "metrics": {
-                "mae": best_metrics["mae"],
-                "rmse": best_metrics["rmse"],
-                "r2": best_metrics["r2"]
-            },
-            "test_data": best_metrics["test_data"],
-            # optional: keep link to metrics.json
-            "metrics_path": best_metrics["metrics_path"]
+    def production(self):
+        """The current production run (one primary-key lookup), or None."""
+        return self.conn.execute(
+            "SELECT runs.*, promotions.id AS version, promotions.promoted_at FROM production "
+            "JOIN runs ON runs.id = production.run_id JOIN promotions ON promotions.id = production.promotion_id "
+            "WHERE slot = 1").fetchone()
+
+    def run(self, ref):
+        """A run by id, or the latest run of a model name."""
+        if str(ref).isdigit():
+            row = self.conn.execute("SELECT * FROM runs WHERE id = ?", (int(ref),)).fetchone()
+        else:
+            row = self.conn.execute("SELECT * FROM runs WHERE model_name = ? ORDER BY id DESC LIMIT 1",
+                                    (ref,)).fetchone()
+        if row is None:
+            raise KeyError(f"no run {ref!r} in the registry")
+        return row
+
+    def best(self, run_ids=None):
+        """Lowest-MAE run, optionally among run_ids."""
+        if run_ids is None:
+            return self.conn.execute("SELECT * FROM runs ORDER BY mae, id LIMIT 1").fetchone()
+        if not run_ids:
+            return None
+        marks = ", ".join("?" * len(run_ids))
+        return self.conn.execute(f"SELECT * FROM runs WHERE id IN ({marks}) ORDER BY mae, id LIMIT 1",
+                                 list(run_ids)).fetchone()
+
+    def history(self):
+        return self.conn.execute(
+            "SELECT promotions.*, runs.model_name, runs.mae FROM promotions "
+            "JOIN runs ON runs.id = promotions.run_id ORDER BY promotions.id").fetchall()
+
+    # --------- Promotion ---------
+
+    def _set_production(self, run_id, action, reason):
+        current = self.conn.execute("SELECT run_id FROM production WHERE slot = 1").fetchone()
+        previous = current["run_id"] if current else None
+        promotion_id = self.conn.execute(
+            "INSERT INTO promotions (run_id, previous_run_id, action, reason, promoted_at) VALUES (?, ?, ?, ?, ?)",
+            (run_id, previous, action, reason, utcnow())).lastrowid
+        self.conn.execute("INSERT INTO production (slot, run_id, promotion_id) VALUES (1, ?, ?) "
+                          "ON CONFLICT (slot) DO UPDATE SET run_id = excluded.run_id, "
+                          "promotion_id = excluded.promotion_id", (run_id, promotion_id))
+
+    def promote(self, ref, reason="manual"):
+        """Make a run production; registry.json is re-exported after the commit."""
+        with self._write():
+            run = self.run(ref)
+            self._set_production(run["id"], "promote", reason)
+        self.export()
+        return run
+
+    def rollback(self):
+        """Reinstate the model that was production before the current one was promoted."""
+        with self._write():
+            current = self.conn.execute("SELECT run_id FROM production WHERE slot = 1").fetchone()
+            if current is None:
+                raise ValueError("nothing to roll back: no production model")
+            last = self.conn.execute(
+                "SELECT previous_run_id FROM promotions WHERE run_id = ? AND action = 'promote' "
+                "ORDER BY id DESC LIMIT 1", (current["run_id"],)).fetchone()
+            if last is None or last["previous_run_id"] is None:
+                raise ValueError("nothing to roll back: production has no predecessor")
+            self._set_production(last["previous_run_id"], "rollback", f"rollback from run {current['run_id']}")
+        self.export()
+        return self.production()
+
+    def update(self):
+        """Ingest new metrics and promote the best new run if it beats production
+        (with no production yet, the best run overall). Returns (new run ids, promoted run or None)."""
+        new_ids = self.ingest()
+        promoted = None
+        with self._write():
+            current = self.production()
+            candidate = self.best() if current is None else self.best(new_ids)
+            if candidate is not None and (current is None or candidate["mae"] < current["mae"]):
+                self._set_production(candidate["id"], "promote", f"mae {candidate['mae']:.4f}")
+                promoted = candidate
+        if promoted is not None or not self.registry_path.exists():
+            self.export()
+        return new_ids, promoted
+
+    # --------- registry.json ---------
+
+    def export(self):
+        """Write registry.json for readers of the old format. Written to a temp file
+        and renamed over the old one, so readers never see a partial file."""
+        prod = self.production()
+        if prod is None:
+            raise ValueError("No metrics.json files found; cannot update registry.")
+        registry = {
+            "production": {
+                "model_name": prod["model_name"],
+                "model_path": prod["model_path"],
+                "metrics": {"mae": prod["mae"], "rmse": prod["rmse"], "r2": prod["r2"]},
+                "test_data": prod["test_data"],
+                # optional: keep link to metrics.json
+                "metrics_path": prod["metrics_path"],
+                "artifact_sha256": prod["artifact_sha256"],
+                "version": prod["version"],
+                "promoted_at": prod["promoted_at"],
+            }
         }
-    }
+        self.registry_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.registry_path.with_name(f".{self.registry_path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(registry, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.registry_path)
+        return registry
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, rolled back on error."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.nested = self.conn.in_transaction
+        if not self.nested:
+            self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.nested:
+            return False
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
 
-def main():
-    metrics_list = load_all_metrics()
-    best = select_best_model(metrics_list)
-    registry = build_registry_entry(best)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Model registry")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument("--promote", metavar="MODEL", help="Promote a model (name or run id) to production")
+    action.add_argument("--rollback", action="store_true", help="Reinstate the previous production model")
+    action.add_argument("--history", action="store_true", help="Print the promotion history")
+    return parser.parse_args()
 
-    MODELS_DIR.mkdir(parents=True, exist_ok=True)
-    with open(REGISTRY_PATH, "w") as f:
-        json.dump(registry, f, indent=2)
-    print(f"[OK] Updated registry at: {REGISTRY_PATH}")
-    print(f"[INFO] Production model: {registry['production']['model_name']}")
-    print(f"[INFO] MAE: {registry['production']['metrics']['mae']}")
-    print(f"[INFO] Path: {registry['production']['model_path']}")
+def main(args):
+    registry = ModelRegistry()
+    try:
+        if args.history:
+            for row in registry.history():
+                print(f"  v{row['id']:<4} {row['promoted_at']}  {row['action']:<8} {row['model_name']} "
+                      f"(MAE {row['mae']:.4f})  {row['reason'] or ''}")
+            return
+        if args.promote:
+            registry.promote(args.promote)
+        elif args.rollback:
+            registry.rollback()
+        else:
+            with instrument.stage("update_registry"), instrument.step("update") as step:
+                new_ids, promoted = registry.update()
+                step.rows_out = len(new_ids)
+            print(f"[OK] Ingested {len(new_ids)} new evaluation(s)")
+            if promoted is None:
+                print("[INFO] Production model unchanged")
+        prod = registry.production()
+        print(f"[OK] Registry at: {REGISTRY_PATH}")
+        print(f"[INFO] Production model: {prod['model_name']} (v{prod['version']})")
+        print(f"[INFO] MAE: {prod['mae']}")
+        print(f"[INFO] Path: {prod['model_path']}")
+    finally:
+        registry.close()
 
 if __name__ == "__main__":
-    main()
+    main(parse_args())
@@ -0,0 +1,53 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from fastapi.testclient import TestClient
+
+from src.api.app import app, FEATURE_COLUMNS
+
+FEATURES_PATH = Path(__file__).resolve().parents[1] / "data" / "features" / "features.parquet"
+
+client = TestClient(app)
+
+
+def _sample(n=64):
+    return pd.read_parquet(FEATURES_PATH)[FEATURE_COLUMNS].head(n)
+
+
+def _json_predictions(df):
+    res = client.post("/predict", json={"instances": df.to_dict(orient="records")})
+    assert res.status_code == 200
+    return np.array(res.json()["predictions"])
+
+
+def test_arrow_batch_matches_json():
+    df = _sample()
+    sink = pa.BufferOutputStream()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    res = client.post("/predict/batch", content=sink.getvalue().to_pybytes(),
+                      headers={"content-type": "application/vnd.apache.arrow.stream"})
+    assert res.status_code == 200
+    preds = pa.ipc.open_stream(res.content).read_all().column("prediction").to_numpy()
+    np.testing.assert_allclose(preds, _json_predictions(df))
+
+
+def test_float32_batch_matches_json():
+    df = _sample().astype("float32")
+    body = np.ascontiguousarray(df.to_numpy().T, dtype="<f4").tobytes()
+
+    res = client.post("/predict/batch", content=body,
+                      headers={"content-type": "application/octet-stream"})
+    assert res.status_code == 200
+    preds = np.frombuffer(res.content, dtype="<f4")
+    np.testing.assert_allclose(preds, _json_predictions(df.astype("float64")), rtol=1e-5)
+
+
+def test_batch_rejects_bad_buffer():
+    res = client.post("/predict/batch", content=b"\x00" * 12,
+                      headers={"content-type": "application/octet-stream"})
+    assert res.status_code == 422
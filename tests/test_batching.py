@@ -0,0 +1,101 @@
+import asyncio
+
+import numpy as np
+
+from src.api.batching import MicroBatcher
+
+
+def _run_concurrently(batcher, sizes):
+    async def main():
+        return await asyncio.gather(*(batcher.submit(np.full((n, 2), float(i))) for i, n in enumerate(sizes)))
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_share_one_model_call():
+    calls = []
+
+    def predict_fn(X):
+        calls.append(len(X))
+        return X[:, 0] * 10, "m"
+
+    batcher = MicroBatcher(predict_fn, max_rows=1000, max_wait_ms=20)
+    results = _run_concurrently(batcher, [1, 3, 2])
+
+    assert calls == [6]
+    for i, (preds, name) in enumerate(results):
+        assert name == "m"
+        assert np.all(preds == i * 10)
+    assert [len(p) for p, _ in results] == [1, 3, 2]
+
+
+def test_in_flight_batches_are_referenced_until_done():
+    batcher = MicroBatcher(lambda X: (X[:, 0], "m"), max_rows=1, max_wait_ms=1000)
+
+    async def main():
+        submitted = asyncio.ensure_future(batcher.submit(np.zeros((1, 2))))
+        await asyncio.sleep(0)
+        assert len(batcher._tasks) == 1
+        await submitted
+        await asyncio.sleep(0)
+        return len(batcher._tasks)
+
+    assert asyncio.run(main()) == 0
+
+
+def test_flushes_when_max_rows_reached():
+    calls = []
+
+    def predict_fn(X):
+        calls.append(len(X))
+        return X[:, 0], "m"
+
+    batcher = MicroBatcher(predict_fn, max_rows=4, max_wait_ms=1000)
+    _run_concurrently(batcher, [2, 2, 2, 2])
+    assert calls == [4, 4]
+
+
+def test_errors_propagate_to_every_caller():
+    def predict_fn(X):
+        raise RuntimeError("boom")
+
+    batcher = MicroBatcher(predict_fn, max_rows=10, max_wait_ms=1)
+
+    async def main():
+        return await asyncio.gather(batcher.submit(np.zeros((1, 2))), batcher.submit(np.zeros((1, 2))),
+                                    return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_concurrent_predict_requests_are_merged(monkeypatch):
+    import httpx
+    import pandas as pd
+    import src.api.app as app_module
+    from src.api.prediction_cache import PredictionCache
+
+    rows = pd.read_parquet(app_module.BASE_DIR.parent / "data" / "features" / "features.parquet")
+    rows = rows[app_module.FEATURE_COLUMNS].head(8).to_dict(orient="records")
+    calls = []
+
+    def predict_fn(X):
+        calls.append(len(X))
+        return app_module.predict_with_serving_model(X)
+
+    monkeypatch.setattr(app_module, "MICRO_BATCH_ENABLED", True)
+    monkeypatch.setattr(app_module, "prediction_cache", PredictionCache(0, 300))
+    monkeypatch.setattr(app_module.batcher, "predict_fn", predict_fn)
+    monkeypatch.setattr(app_module.batcher, "max_rows", 1000)
+    monkeypatch.setattr(app_module.batcher, "max_wait", 0.2)   # every request is queued before the flush
+
+    async def main():
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.post("/predict", json={"instances": [row]}) for row in rows))
+
+    responses = asyncio.run(main())
+    assert [r.status_code for r in responses] == [200] * len(rows)
+    assert calls == [len(rows)]
+    expected = app_module.predict_matrix(app_module.serving, app_module.instances_to_matrix(
+        [app_module.FeatureVector(**row) for row in rows]))
+    np.testing.assert_allclose([r.json()["predictions"][0] for r in responses], expected)
@@ -0,0 +1,23 @@
+import asyncio
+
+import httpx
+import pandas as pd
+
+from benchmarks.bench_api import FEATURES_PATH, make_payloads, run_cell
+from src.api.app import app, FEATURE_COLUMNS
+
+
+def test_run_cell_reports_throughput_and_percentiles():
+    features = pd.read_parquet(FEATURES_PATH)[FEATURE_COLUMNS]
+    payloads = make_payloads(features, 16)
+    assert len(payloads) == 64
+
+    async def bench():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await run_cell(client, payloads, 16, concurrency=4, duration=0.5)
+
+    result = asyncio.run(bench())
+    assert result["requests"] > 0 and result["errors"] == 0
+    assert result["rows_per_s"] == result["requests_per_s"] * 16
+    assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"] <= result["max_ms"]
@@ -0,0 +1,71 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_sessions import as_strings, make_sessions
+from src.pipeline import features
+
+RAW_PATH = Path(__file__).resolve().parents[1] / "data" / "raw" / "ingest.parquet"
+
+
+def legacy_cleaning(df):
+    """The original row-by-row cleaning pass, kept as the parity reference."""
+    df.columns = df.columns.str.lower().str.replace(' ', '_')
+    df['el_kwh'] = pd.to_numeric(df['el_kwh'], errors='coerce')
+    df['duration_hours'] = pd.to_numeric(df['duration_hours'], errors='coerce')
+    complete_sessions = df.dropna(subset=['end_plugout', 'duration_hours']).copy()
+    complete_sessions['charging_rate'] = complete_sessions['el_kwh'] / complete_sessions['duration_hours']
+    avg_charging_rate = complete_sessions['charging_rate'].median()
+    missing_indices = df[df['end_plugout'].isna() & df['duration_hours'].isna()].index
+    df.loc[missing_indices, 'duration_hours'] = df.loc[missing_indices, 'el_kwh'] / avg_charging_rate
+    df.loc[missing_indices, 'end_plugout'] = df.loc[missing_indices, 'start_plugin'] + pd.to_timedelta(df.loc[missing_indices, 'duration_hours'], unit='h')
+    df.loc[missing_indices, 'end_plugout_hour'] = df.loc[missing_indices, 'end_plugout'].dt.hour
+    for idx in missing_indices:
+        duration = df.loc[idx, 'duration_hours']
+        if duration > 18:
+            df.loc[idx, 'duration_category'] = "More than 18 hours"
+        elif duration > 15:
+            df.loc[idx, 'duration_category'] = "Between 15 and 18 hours"
+        elif duration > 12:
+            df.loc[idx, 'duration_category'] = "Between 12 and 15 hours"
+        elif duration > 9:
+            df.loc[idx, 'duration_category'] = "Between 9 and 12 hours"
+        elif duration > 6:
+            df.loc[idx, 'duration_category'] = "Between 6 and 9 hours"
+        elif duration > 3:
+            df.loc[idx, 'duration_category'] = "Between 3 and 6 hours"
+        else:
+            df.loc[idx, 'duration_category'] = "Less than 3 hours"
+    df['charging_duration'] = (df['end_plugout'] - df['start_plugin']).dt.total_seconds() / 3600
+    duration_diff = abs(df['duration_hours'] - df['charging_duration'])
+    df.loc[duration_diff > 0.1, 'duration_hours'] = df['charging_duration']
+    df = df.drop('charging_duration', axis=1)
+    for col in ['user_type', 'shared_id', 'month_plugin', 'weekdays_plugin', 'plugin_category', 'duration_category']:
+        df[col] = df[col].astype('category')
+    df['end_plugout_hour'] = df['end_plugout_hour'].astype('int64')
+    df['hour'] = df['start_plugin'].dt.hour
+    df['start_plugin_hour'] = np.where(df['start_plugin_hour'] != df['hour'], df['hour'], df['start_plugin_hour'])
+    df['hour'] = df['start_plugin'].dt.floor('h')
+    return df
+
+
+@pytest.mark.parametrize("source", ["raw", "synthetic"])
+def test_vectorized_cleaning_matches_legacy(source):
+    if source == "raw":
+        raw = pd.read_parquet(RAW_PATH)
+    else:
+        raw = as_strings(make_sessions(20_000, seed=1, missing_rate=0.02))
+        raw.loc[raw.index[::97], "Start_plugin_hour"] = 0     # stale hours get corrected
+        raw.loc[raw.index[::89], "Duration_hours"] += 1.0     # durations that disagree with the timestamps
+    expected = legacy_cleaning(raw.copy())
+    got = features.clean_sessions(raw.copy())
+    pd.testing.assert_frame_equal(got, expected)
+
+
+def test_cleaning_accepts_categorical_input():
+    raw = make_sessions(5_000, seed=2, missing_rate=0.05)
+    expected = features.clean_sessions(as_strings(raw))
+    got = features.clean_sessions(raw.copy())
+    pd.testing.assert_frame_equal(as_strings(got), as_strings(expected))
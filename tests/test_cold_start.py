@@ -0,0 +1,25 @@
+import numpy as np
+
+from benchmarks import bench_startup
+
+
+def test_api_cold_start_skips_the_estimator():
+    # a fresh interpreter: the test process has sklearn and friends imported already
+    result = bench_startup.measure("api")
+    assert not {"sklearn", "xgboost", "lightgbm", "joblib", "pandas"} & set(result["heavy_modules"])
+    assert 0 < result["import_seconds"] < result["time_to_first_prediction"]
+
+
+def test_large_batch_is_served_while_the_estimator_loads():
+    import src.api.app as app_module
+
+    prod = app_module.load_registry()["production"]
+    current = app_module.load_model(app_module.production_model_path(prod), prod)
+    assert current.compiled is not None and not current.model.loaded
+
+    X = np.random.default_rng(0).normal(0, 20, (app_module.COMPILED_MAX_ROWS + 1, len(app_module.FEATURE_COLUMNS)))
+    np.testing.assert_array_equal(app_module.predict_matrix(current, X), current.compiled.predict(X))
+    current.model._loader.join(timeout=60)
+    assert current.model.loaded
+    np.testing.assert_allclose(app_module.predict_matrix(current, X), current.compiled.predict(X),
+                               rtol=1e-4, atol=1e-4)
@@ -0,0 +1,63 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.dummy import DummyRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import mean_absolute_error, root_mean_squared_error
+
+from src.pipeline import eval as evaluation
+
+FEATURES_PATH = Path(__file__).resolve().parents[1] / "data" / "features" / "features.parquet"
+
+
+@pytest.fixture(scope="module")
+def test_set():
+    df = pd.read_parquet(FEATURES_PATH)
+    return df.drop(columns=["total_kwh"]), df["total_kwh"]
+
+
+def test_segment_metrics_match_a_per_group_loop(test_set):
+    X, y = test_set
+    rng = np.random.default_rng(0)
+    predictions = {"a": y.to_numpy() + rng.normal(0, 5, len(y)), "b": np.full(len(y), y.mean())}
+    segments = evaluation.segment_metrics(X, y, predictions)
+    for name, y_pred in predictions.items():
+        for column in evaluation.SEGMENT_COLUMNS:
+            for value, group in X.groupby(column).groups.items():
+                expected = segments[name][column][str(value)]
+                rows = X.index.get_indexer(group)
+                assert expected["n"] == len(rows)
+                assert expected["mae"] == pytest.approx(mean_absolute_error(y.iloc[rows], y_pred[rows]))
+                assert expected["rmse"] == pytest.approx(root_mean_squared_error(y.iloc[rows], y_pred[rows]))
+
+
+def test_evaluate_models_scores_all_models_from_one_test_set(test_set, tmp_path, monkeypatch):
+    X, y = test_set
+    # above the limit the binned/hexbin plots are used
+    monkeypatch.setattr(evaluation, "PLOT_POINT_LIMIT", 500)
+    models = {
+        str(tmp_path / "lr_model_1.joblib"): LinearRegression().fit(X, y),
+        str(tmp_path / "mean_model_1.joblib"): DummyRegressor().fit(X, y),
+    }
+    results = evaluation.evaluate_models(models, X, y, "features.parquet", str(tmp_path / "reports"), plot_workers=2)
+
+    for model_path, model in models.items():
+        report_dir = tmp_path / "reports" / Path(model_path).stem
+        written = json.loads((report_dir / "metrics.json").read_text())
+        assert written == results[model_path]
+        assert written["mae"] == pytest.approx(mean_absolute_error(y, model.predict(X)))
+        assert set(written["segments"]) == {"hour_of_day", "is_weekend"}
+        assert len(written["segments"]["hour_of_day"]) == 24
+        for plot in ("predictions_vs_actuals.png", "residuals.png"):
+            assert (report_dir / plot).stat().st_size > 0
+
+
+def test_binned_series_keeps_the_envelope():
+    values = np.arange(10_000, dtype=np.float64)
+    x, mean, low, high = evaluation._binned(values, 100)
+    assert len(x) == 100
+    assert low[0] == 0 and high[-1] == values[-1]
+    np.testing.assert_allclose(mean, values.reshape(100, -1).mean(axis=1))
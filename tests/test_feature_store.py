@@ -0,0 +1,153 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api.app import app, FEATURE_COLUMNS
+from src.api.feature_store import OnlineFeatureStore, InsufficientHistoryError
+from src.pipeline import features
+
+CLEAN_PATH = Path(__file__).resolve().parents[1] / "data" / "clean" / "clean.parquet"
+
+
+def _engineered(monkeypatch, clean):
+    captured = []
+    monkeypatch.setattr(features, "save_locally", lambda df, *a: captured.append(df))
+    features.engineering(clean)
+    return pd.concat(captured)
+
+
+def test_store_matches_offline_features(monkeypatch):
+    clean = pd.read_parquet(CLEAN_PATH)
+    expected = _engineered(monkeypatch, clean)
+    hourly = (clean.groupby("hour").agg(total_kwh=("el_kwh", "sum"),
+                                        n_sessions=("session_id", "count"),
+                                        avg_kwh=("el_kwh", "mean")).sort_index())
+
+    store = OnlineFeatureStore()
+    checked = 0
+    for ts, row in hourly.iterrows():
+        if ts in expected.index:
+            built = store.build_features(ts)
+            np.testing.assert_allclose(
+                [built[c] for c in FEATURE_COLUMNS],
+                expected.loc[ts, FEATURE_COLUMNS].to_numpy(dtype=float),
+                rtol=1e-9, atol=1e-9,
+            )
+            checked += 1
+        store.ingest(ts, row["total_kwh"], row["n_sessions"], row["avg_kwh"])
+    assert checked == len(expected)
+
+
+def test_store_requires_history():
+    store = OnlineFeatureStore()
+    store.ingest("2024-01-01T00:00", 1.0, 1, 1.0)
+    with pytest.raises(InsufficientHistoryError):
+        store.build_features("2024-01-01T01:00")
+    with pytest.raises(ValueError):
+        store.ingest("2024-01-01T00:00", 1.0, 1, 1.0)
+
+
+def test_store_converts_aware_timestamps_to_utc():
+    store = OnlineFeatureStore()
+    store.ingest("2024-01-01T10:30+02:00", 1.0, 1, 1.0)
+    assert store.status()["last_timestamp"] == "2024-01-01T08:00:00"
+    with pytest.raises(ValueError):
+        store.ingest("2024-01-01T08:15Z", 1.0, 1, 1.0)
+
+
+def test_ingest_and_predict_next_endpoints(monkeypatch):
+    import src.api.app as app_module
+
+    monkeypatch.setattr(app_module, "feature_store", OnlineFeatureStore())
+    client = TestClient(app)
+    start = pd.Timestamp("2030-01-01")
+    hours = [
+        {"timestamp": (start + pd.Timedelta(hours=i)).isoformat(),
+         "total_kwh": float(i % 24), "n_sessions": 2, "avg_kwh": 3.5}
+        for i in range(24 * 8)
+    ]
+    res = client.post("/ingest", json={"hours": hours})
+    assert res.status_code == 200
+    assert res.json()["ready"] is True
+
+    next_ts = (start + pd.Timedelta(hours=24 * 8)).isoformat()
+    res = client.post("/predict/next", json={"timestamp": next_ts})
+    assert res.status_code == 200
+    assert len(res.json()["predictions"]) == 1
+
+    # a batch whose later hour is out of order is rejected as a whole
+    status = app_module.feature_store.status()
+    bad = [dict(hours[0], timestamp=next_ts), dict(hours[0], timestamp=start.isoformat())]
+    res = client.post("/ingest", json={"hours": bad})
+    assert res.status_code == 422
+    assert app_module.feature_store.status() == status
+    assert client.post("/predict/next", json={"timestamp": next_ts}).status_code == 200
+
+
+def _seeded_store(hourly):
+    store = OnlineFeatureStore()
+    store.ingest_frame(hourly)
+    return store
+
+
+def test_forecast_matches_step_by_step():
+    clean = pd.read_parquet(CLEAN_PATH)
+    hourly = (clean.groupby("hour").agg(total_kwh=("el_kwh", "sum"),
+                                        n_sessions=("session_id", "count"),
+                                        avg_kwh=("el_kwh", "mean")).sort_index())
+    # every hour present (the export skips hours without sessions), so each hour_dow cell has history
+    hourly = hourly.asfreq("h", fill_value=0.0).iloc[-24 * 60:]
+    weights = np.random.default_rng(0).uniform(0, 0.1, len(FEATURE_COLUMNS))
+
+    def predict_fn(X):
+        return X @ weights
+
+    # past 168 hours, so lag_168 and roll_mean_168h also come from predictions
+    horizon = 200
+    store = _seeded_store(hourly)
+    status = store.status()
+    timestamps, preds, X = store.forecast(horizon, predict_fn, FEATURE_COLUMNS)
+    assert store.status() == status
+
+    stepwise = _seeded_store(hourly)
+    n_sessions, avg_kwh = hourly.iloc[-1][["n_sessions", "avg_kwh"]]
+    for i, ts in enumerate(timestamps):
+        row = np.array([stepwise.build_features(ts)[c] for c in FEATURE_COLUMNS])
+        np.testing.assert_array_equal(X[i], row)
+        y = predict_fn(row[None, :])[0]
+        assert preds[i] == y
+        stepwise.ingest(ts, y, n_sessions, avg_kwh)
+    assert timestamps[0] == hourly.index[-1] + pd.Timedelta(hours=1)
+
+
+def test_forecast_endpoint(monkeypatch):
+    import src.api.app as app_module
+
+    monkeypatch.setattr(app_module, "feature_store", OnlineFeatureStore())
+    client = TestClient(app)
+    assert client.get("/forecast", params={"horizon": 24}).status_code == 409
+    assert client.get("/forecast", params={"horizon": 0}).status_code == 422
+
+    start = pd.Timestamp("2031-01-01")
+    hours = [
+        {"timestamp": (start + pd.Timedelta(hours=i)).isoformat(),
+         "total_kwh": float(i % 24), "n_sessions": 2, "avg_kwh": 3.5}
+        for i in range(24 * 8)
+    ]
+    assert client.post("/ingest", json={"hours": hours}).status_code == 200
+
+    res = client.get("/forecast", params={"horizon": 30})
+    assert res.status_code == 200
+    body = res.json()
+    assert len(body["timestamps"]) == len(body["predictions"]) == 30
+    assert pd.Timestamp(body["timestamps"][0]) == start + pd.Timedelta(hours=24 * 8)
+
+    # the same forecast from one /predict/next + /ingest round trip per hour
+    for ts, expected in zip(body["timestamps"], body["predictions"]):
+        pred = client.post("/predict/next", json={"timestamp": ts}).json()["predictions"][0]
+        assert pred == pytest.approx(expected, rel=1e-6)
+        client.post("/ingest", json={"hours": [{"timestamp": ts, "total_kwh": pred, "n_sessions": 2,
+                                                "avg_kwh": 3.5}]})
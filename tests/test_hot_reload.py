@@ -0,0 +1,50 @@
+import json
+
+from fastapi.testclient import TestClient
+
+import src.api.app as app_module
+from src.api.model_watcher import RegistryWatcher
+
+
+def _write_registry(path, model_name):
+    path.write_text(json.dumps({
+        "production": {
+            "model_name": model_name,
+            "model_path": f"C:\\models\\{model_name}.joblib",
+            "metrics": {},
+        }
+    }))
+
+
+def test_watcher_swaps_on_registry_change(tmp_path, monkeypatch):
+    registry = tmp_path / "registry.json"
+    _write_registry(registry, "dt_model_20251117_2233")
+    monkeypatch.setattr(app_module, "REGISTRY_PATH", registry)
+    monkeypatch.setattr(app_module, "serving", app_module.serving)
+
+    watcher = RegistryWatcher(registry, app_module.reload_if_changed, app_module.swap_serving_model)
+    old = app_module.serving
+    assert watcher.check_once() is False
+
+    _write_registry(registry, "xgb_model_20251117_2233")
+    assert watcher.check_once() is True
+    assert app_module.serving is not old
+    assert app_module.serving.info["model_name"] == "xgb_model_20251117_2233"
+
+    body = TestClient(app_module.app).get("/health").json()
+    assert body["model_name"] == "xgb_model_20251117_2233"
+    assert body["model_loaded_at"] == app_module.serving.loaded_at.isoformat()
+
+
+def test_watcher_keeps_model_when_reload_fails(tmp_path):
+    registry = tmp_path / "registry.json"
+    registry.write_text("{}")
+    swapped = []
+
+    def broken_load():
+        raise ValueError("half-written registry")
+
+    watcher = RegistryWatcher(registry, broken_load, swapped.append)
+    registry.write_text('{"production": ')
+    assert watcher.check_once() is False
+    assert swapped == []
@@ -0,0 +1,137 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pipeline import features
+
+CLEAN_PATH = Path(__file__).resolve().parents[1] / "data" / "clean" / "clean.parquet"
+
+
+def legacy_engineering(df):
+    """The original pandas shift/rolling/expanding implementation, kept as the reference."""
+    hourly_total = features.hourly_aggregates(df)
+    hourly_total['n_sessions_lag1'] = hourly_total['n_sessions'].shift(1)
+    hourly_total['avg_kwh_lag1'] = hourly_total['avg_kwh'].shift(1)
+    hourly_total = hourly_total.drop(columns=['n_sessions', 'avg_kwh'])
+    hourly_total['hour_of_day'] = hourly_total.index.hour
+    hourly_total['day_of_week'] = hourly_total.index.dayofweek
+    hourly_total['month'] = hourly_total.index.month
+    hourly_total['is_weekend'] = hourly_total.index.dayofweek.isin([5, 6]).astype(int)
+    hourly_total['hour_sin'] = np.sin(2 * np.pi * hourly_total['hour_of_day'] / 24)
+    hourly_total['hour_cos'] = np.cos(2 * np.pi * hourly_total['hour_of_day'] / 24)
+    hourly_total['dow_sin'] = np.sin(2 * np.pi * hourly_total['day_of_week'] / 7)
+    hourly_total['dow_cos'] = np.cos(2 * np.pi * hourly_total['day_of_week'] / 7)
+    hourly_total['month_sin'] = np.sin(2 * np.pi * (hourly_total['month'] - 1) / 12)
+    hourly_total['month_cos'] = np.cos(2 * np.pi * (hourly_total['month'] - 1) / 12)
+    hourly_total['lag_1'] = hourly_total['total_kwh'].shift(1)
+    hourly_total['lag_24'] = hourly_total['total_kwh'].shift(24)
+    hourly_total['lag_168'] = hourly_total['total_kwh'].shift(168)
+    hourly_total['diff_lag1'] = hourly_total['total_kwh'].shift(1) - hourly_total['total_kwh'].shift(2)
+    shifted = hourly_total['total_kwh'].shift(1)
+    hourly_total['roll_mean_3h'] = shifted.rolling(window=3).mean()
+    hourly_total['roll_mean_6h'] = shifted.rolling(window=6).mean()
+    hourly_total['roll_mean_24h'] = shifted.rolling(window=24).mean()
+    hourly_total['roll_std_24h'] = shifted.rolling(window=24).std()
+    hourly_total['roll_mean_168h'] = shifted.rolling(window=168).mean()
+    expanding_means = (
+        hourly_total
+        .groupby(['hour_of_day', 'day_of_week'])['total_kwh']
+        .apply(lambda x: x.shift(1).expanding().mean())
+    )
+    hourly_total['hour_dow_mean'] = expanding_means.reset_index(level=[0, 1], drop=True)
+    return hourly_total.dropna()
+
+
+@pytest.fixture
+def clean():
+    return pd.read_parquet(CLEAN_PATH)
+
+
+@pytest.fixture
+def dataset(monkeypatch, tmp_path):
+    """FEATURES_DATASET in tmp_path, read back as one frame; parts keep their hour index."""
+    root = tmp_path / "features"
+    monkeypatch.setattr(features, "FEATURES_DATASET", str(root))
+
+    def save(df, path, name):
+        Path(path).mkdir(parents=True, exist_ok=True)
+        df.to_parquet(Path(path) / name)
+    monkeypatch.setattr(features, "save_locally", save)
+
+    def read():
+        # part-open.parquet sorts last, so file order is time order
+        return pd.concat([pd.read_parquet(part) for part in sorted(root.glob("part-*.parquet"))])
+    return read
+
+
+def test_full_run_matches_legacy_pandas(clean, dataset):
+    written, _ = features.engineering(clean)
+    assert written[-1] == features.OPEN_PART
+    expected = legacy_engineering(clean)
+    got = dataset()
+    assert list(got.columns) == list(expected.columns)
+    pd.testing.assert_index_equal(got.index, expected.index)
+    np.testing.assert_allclose(got.to_numpy(float), expected.to_numpy(float), rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize("cuts", [[2000], [500, 501, 2500]])
+def test_incremental_runs_are_bit_identical(clean, dataset, tmp_path, cuts):
+    features.engineering(clean)
+    full = dataset()
+
+    hours = np.sort(clean['hour'].unique())
+    state = None
+    for end in cuts + [len(hours)]:
+        seen = clean[clean['hour'] <= hours[end - 1]]
+        _, state = features.engineering(seen, state)
+        # round-trip through disk like separate pipeline runs
+        features.save_state(state, tmp_path / "state.npz")
+        state = features.load_state(tmp_path / "state.npz")
+
+    incremental = dataset()
+    pd.testing.assert_frame_equal(incremental, full, check_exact=True)
+    assert incremental.to_numpy(float).tobytes() == full.to_numpy(float).tobytes()
+
+
+def test_no_new_hours_writes_nothing(clean, dataset):
+    _, state = features.engineering(clean)
+    written, same = features.engineering(clean, state)
+    assert written == []
+    assert same.last_hour == state.last_hour
+
+
+@pytest.mark.parametrize("late_hours_ago, recomputed", [(20, False), (1000, True)])
+def test_late_sessions_match_a_full_recompute(clean, dataset, tmp_path, capsys, late_hours_ago, recomputed):
+    features.engineering(clean)
+    full = dataset()
+
+    hours = np.sort(clean['hour'].unique())
+    cut = hours[2000]
+    # exported at plug-out: the partial last hour, and every session of an earlier hour
+    late = (((clean['hour'] == cut) & (clean['session_id'] % 2 == 0))
+            | (clean['hour'] == hours[hours <= cut - pd.Timedelta(hours=late_hours_ago)][-1]))
+    _, state = features.engineering(clean[(clean['hour'] <= cut) & ~late])
+    features.save_state(state, tmp_path / "state.npz")
+    capsys.readouterr()
+
+    features.engineering(clean, features.load_state(tmp_path / "state.npz"))
+    assert ("recomputing all features" in capsys.readouterr().out) == recomputed
+    incremental = dataset()
+    pd.testing.assert_frame_equal(incremental, full, check_exact=True)
+    assert incremental.to_numpy(float).tobytes() == full.to_numpy(float).tobytes()
+
+
+def test_null_session_ids_do_not_force_a_recompute(clean, dataset, tmp_path, capsys):
+    clean['session_id'] = clean['session_id'].astype('float64').mask(clean.index % 50 == 0)
+    features.engineering(clean)
+    full = dataset()
+
+    hours = np.sort(clean['hour'].unique())
+    _, state = features.engineering(clean[clean['hour'] <= hours[2000]])
+    features.save_state(state, tmp_path / "state.npz")
+    capsys.readouterr()
+    features.engineering(clean, features.load_state(tmp_path / "state.npz"))
+    assert "recomputing all features" not in capsys.readouterr().out
+    pd.testing.assert_frame_equal(dataset(), full, check_exact=True)
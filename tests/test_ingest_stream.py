@@ -0,0 +1,116 @@
+import json
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from benchmarks.synthetic_sessions import as_strings
+from src.pipeline import features
+from src.pipeline import ingest as ingest_module
+from src.pipeline.ingest import MANIFEST_NAME, ingest
+
+CSV_PATH = Path(__file__).resolve().parents[1] / "data" / "downloaded" / "ev_charging_reports.csv"
+
+
+def read_dataset(path):
+    return as_strings(pd.read_parquet(path)).sort_values("session_ID", ignore_index=True)
+
+
+def legacy_frame(csv_path):
+    """The raw export as the original pandas loader read it: the reference for the streamed dataset."""
+    df = pd.read_csv(csv_path, sep=";", encoding="utf-8", parse_dates=["Start_plugin", "End_plugout"],
+                     decimal=",", dayfirst=True)
+    df[["Start_plugin", "End_plugout"]] = df[["Start_plugin", "End_plugout"]].astype("datetime64[ns]")
+    return df
+
+
+def test_stream_matches_pandas_reader(tmp_path):
+    dataset = tmp_path / "sessions"
+    rows, files = ingest([CSV_PATH], dataset, block_size_mb=0.1)
+    expected = legacy_frame(CSV_PATH)
+
+    assert rows == len(expected)
+    # one file per month, each written as the blocks were parsed
+    months = sorted(p.name for p in dataset.iterdir() if p.is_dir())
+    assert months == sorted(expected["Start_plugin"].dt.strftime("%Y-%m").unique())
+    assert [f.parent.name for f in files] == months
+    assert sum(pq.ParquetFile(f).num_row_groups for f in files) > len(files)
+
+    streamed = pd.read_parquet(dataset)
+    assert isinstance(streamed["Garage_ID"].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(read_dataset(dataset), expected)
+
+    # the dictionary-encoded columns clean to the same sessions
+    pd.testing.assert_frame_equal(
+        as_strings(features.clean_sessions(streamed.sort_values("session_ID", ignore_index=True))),
+        as_strings(features.clean_sessions(expected)),
+    )
+
+
+def test_incremental_runs_only_append_new_sessions(tmp_path):
+    lines = CSV_PATH.read_bytes().splitlines(keepends=True)
+    export = tmp_path / "export.csv"
+    dataset = tmp_path / "sessions"
+
+    export.write_bytes(b"".join(lines[:4001]))
+    first_rows, first_files = ingest([export], dataset)
+    assert first_rows == 4000
+
+    # nothing new: nothing written
+    assert ingest([export], dataset) == (0, [])
+
+    # the export grows: only the appended bytes are parsed, into new part files
+    export.write_bytes(b"".join(lines))
+    rows, files = ingest([export], dataset)
+    assert rows == len(lines) - 4001
+    assert not set(files) & set(first_files)
+    assert all(f.exists() for f in first_files)
+    pd.testing.assert_frame_equal(read_dataset(dataset), legacy_frame(CSV_PATH))
+
+    manifest = json.loads((dataset / MANIFEST_NAME).read_text())["sources"]["export.csv"]
+    assert manifest["offset"] == export.stat().st_size
+    assert manifest["rows"] == len(lines) - 1
+
+
+def test_rewritten_export_falls_back_to_watermark(tmp_path):
+    lines = CSV_PATH.read_bytes().splitlines(keepends=True)
+    export = tmp_path / "export.csv"
+    dataset = tmp_path / "sessions"
+    export.write_bytes(b"".join(lines[:4001]))
+    ingest([export], dataset)
+
+    # re-exported with a different prefix (first session dropped): offsets are useless,
+    # the Start_plugin watermark decides what is new
+    export.write_bytes(lines[0] + b"".join(lines[2:]))
+    ingest([export], dataset)
+    expected = legacy_frame(CSV_PATH)
+    cutoff = expected["Start_plugin"].iloc[:4000].max()
+    expected = pd.concat([expected.iloc[:4000], expected.iloc[4000:][expected["Start_plugin"].iloc[4000:] > cutoff]])
+    pd.testing.assert_frame_equal(read_dataset(dataset), expected.sort_values("session_ID", ignore_index=True))
+
+
+def test_rebuild_refuses_a_directory_that_is_not_a_dataset(tmp_path):
+    (tmp_path / "notes.txt").write_text("keep me")
+    with pytest.raises(ValueError, match="refusing"):
+        ingest([CSV_PATH], tmp_path)
+    assert (tmp_path / "notes.txt").exists()
+
+
+def test_rebuilt_dataset_replaces_the_s3_prefix(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(ingest_module.storage, "upload_file", lambda path, bucket, key: calls.append(("up", key)))
+    monkeypatch.setattr(ingest_module.storage, "delete_prefix",
+                        lambda bucket, prefix, keep=(): calls.append(("delete", prefix, set(keep))))
+    dataset = tmp_path / "sessions"
+    _, files = ingest([CSV_PATH], dataset)
+
+    ingest_module.upload_to_s3(dataset, files, replace=True)
+    uploaded = {c[1] for c in calls if c[0] == "up"}
+    assert "parquets/sessions/_manifest.json" in uploaded and len(uploaded) == len(files) + 1
+    # the stale parts are deleted only after every rebuilt file is up
+    assert calls[-1] == ("delete", "parquets/sessions/", uploaded)
+
+    calls.clear()
+    ingest_module.upload_to_s3(dataset, files)
+    assert all(c[0] == "up" for c in calls)
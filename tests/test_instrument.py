@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from src.pipeline import instrument
+
+
+def _trace(metrics_dir):
+    return [json.loads(line) for line in (metrics_dir / "trace.jsonl").read_text().splitlines()]
+
+
+def test_stage_writes_steps_to_trace_and_textfile(tmp_path):
+    with instrument.stage("features", metrics_dir=tmp_path):
+        with instrument.step("load") as step:
+            step.rows_out = 100
+            with instrument.step("decode"):
+                block = bytearray(64 * 2**20)
+                block[::4096] = b"x" * len(block[::4096])
+        with instrument.step("cleaning", rows_in=100, rows_out=90):
+            pass
+
+    records = {r["step"]: r for r in _trace(tmp_path)}
+    assert list(records) == ["load/decode", "load", "cleaning", "total"]
+    assert {r["stage"] for r in records.values()} == {"features"}
+    assert len({r["run_id"] for r in records.values()}) == 1
+    assert records["load"]["rows_out"] == 100 and records["cleaning"]["rows_out"] == 90
+    # the inner step's peak is part of its parents' peaks
+    assert records["load/decode"]["peak_rss_bytes"] >= 64 * 2**20
+    assert records["total"]["peak_rss_bytes"] >= records["load"]["peak_rss_bytes"] \
+        >= records["load/decode"]["peak_rss_bytes"]
+    assert records["total"]["wall_seconds"] >= records["load"]["wall_seconds"] + records["cleaning"]["wall_seconds"]
+
+    prom = (tmp_path / "ev_pipeline_features.prom").read_text()
+    assert 'ev_pipeline_step_rows_out{stage="features",step="cleaning",target=""} 90.0' in prom
+    assert 'ev_pipeline_step_success{stage="features",step="total",target=""} 1.0' in prom
+    assert "ev_pipeline_stage_last_run_timestamp_seconds" in prom
+
+
+def test_failed_stage_is_recorded_and_steps_outside_stages_are_not(tmp_path):
+    with instrument.step("standalone"):
+        pass
+    with pytest.raises(ValueError):
+        with instrument.stage("train", target="xgb", metrics_dir=tmp_path):
+            with instrument.step("fit"):
+                raise ValueError("boom")
+
+    records = _trace(tmp_path)
+    assert [(r["step"], r["status"]) for r in records] == [("fit", "failed"), ("total", "failed")]
+    prom = (tmp_path / "ev_pipeline_train_xgb.prom").read_text()
+    assert 'ev_pipeline_step_success{stage="train",step="fit",target="xgb"} 0.0' in prom
+
+
+def test_stage_without_rss_probes(tmp_path, monkeypatch):
+    # Windows: no `resource` module and no /proc
+    monkeypatch.setattr(instrument, "resource", None)
+    monkeypatch.setattr(instrument, "peak_rss", lambda: None)
+    with instrument.stage("ingest", metrics_dir=tmp_path):
+        with instrument.step("parse", rows_out=5):
+            pass
+
+    records = {r["step"]: r for r in _trace(tmp_path)}
+    assert records["parse"]["peak_rss_bytes"] is None and records["total"]["cpu_seconds"] >= 0
+    prom = (tmp_path / "ev_pipeline_ingest.prom").read_text()
+    assert "ev_pipeline_step_peak_rss_bytes{" not in prom
+    assert 'ev_pipeline_step_rows_out{stage="ingest",step="parse",target=""} 5.0' in prom
@@ -0,0 +1,98 @@
+import io
+import json
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.aws import lambda_infer
+
+FEATURES_PATH = Path(__file__).resolve().parents[1] / "data" / "features" / "features.parquet"
+
+
+class FakeS3:
+    """In-memory stand-in for the handful of S3 calls the handler makes."""
+
+    def __init__(self):
+        self.objects, self.uploads, self.range_gets = {}, {}, 0
+
+    def head_object(self, Bucket, Key):
+        return {"ContentLength": len(self.objects[Key])}
+
+    def get_object(self, Bucket, Key, Range):
+        start, end = map(int, Range.removeprefix("bytes=").split("-"))
+        self.range_gets += 1
+        return {"Body": io.BytesIO(self.objects[Key][start:end + 1])}
+
+    def create_multipart_upload(self, Bucket, Key):
+        self.uploads[Key] = []
+        return {"UploadId": Key}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[Key].append(Body)
+        return {"ETag": str(PartNumber)}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        assert len(MultipartUpload["Parts"]) == len(self.uploads[Key])
+        self.objects[Key] = b"".join(self.uploads.pop(Key))
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(Key)
+
+
+def test_handler_streams_row_groups(tmp_path, monkeypatch):
+    registry = tmp_path / "registry.json"
+    registry.write_text(json.dumps({"production": {"model_path": "C:\\models\\xgb_model_20251117_2233.joblib"}}))
+    monkeypatch.setattr(lambda_infer, "REGISTRY_PATH", registry)
+    monkeypatch.setattr(lambda_infer, "UPLOAD_PART_SIZE", 64 * 1024)
+    monkeypatch.setattr(lambda_infer, "_model_cache", dict.fromkeys(lambda_infer._model_cache))
+    fake = FakeS3()
+    monkeypatch.setattr(lambda_infer, "s3", fake)
+
+    df = pd.read_parquet(FEATURES_PATH)
+    buf = io.BytesIO()
+    df.to_parquet(buf, index=False, row_group_size=500)
+    fake.objects["raw/in.parquet"] = buf.getvalue()
+
+    event = {"Records": [{"s3": {"object": {"key": "raw/in.parquet"}}}]}
+    result = lambda_infer.handler(event)
+    assert result["predictions_written"] == len(df)
+
+    out = pq.read_table(pa.BufferReader(fake.objects[result["result_key"]])).to_pandas()
+    assert len(out) == len(df)
+    model = joblib.load(Path(lambda_infer.MODELS_DIR) / "xgb_model_20251117_2233.joblib")
+    expected = model.predict(df[lambda_infer.FEATURE_COLUMNS])
+    np.testing.assert_allclose(out["predicted_total_kwh"], expected, rtol=1e-4, atol=1e-4)
+    assert len(fake.uploads) == 0
+
+    # warm invocation reuses the cached model
+    cached = lambda_infer._model_cache["compiled"]
+    lambda_infer.handler(event)
+    assert lambda_infer._model_cache["compiled"] is cached
+
+
+def test_stale_export_falls_back_to_estimator(tmp_path, monkeypatch):
+    # an export left over from another model must not be served for this one
+    models = Path(lambda_infer.MODELS_DIR)
+    (tmp_path / "xgb_model_20251117_2233.joblib").write_bytes((models / "xgb_model_20251117_2233.joblib").read_bytes())
+    (tmp_path / "xgb_model_20251117_2233.npz").write_bytes((models / "dt_model_20251117_2233.npz").read_bytes())
+    registry = tmp_path / "registry.json"
+    registry.write_text(json.dumps({"production": {"model_path": "xgb_model_20251117_2233.joblib"}}))
+    monkeypatch.setattr(lambda_infer, "REGISTRY_PATH", registry)
+    monkeypatch.setattr(lambda_infer, "MODELS_DIR", tmp_path)
+    monkeypatch.setattr(lambda_infer, "_model_cache", dict.fromkeys(lambda_infer._model_cache))
+
+    cache = lambda_infer.get_production_model()
+    assert cache["compiled"] is None
+
+    df = pd.read_parquet(FEATURES_PATH).head(50)
+    preds = lambda_infer.predict_batch(cache, df[lambda_infer.FEATURE_COLUMNS])
+    model = joblib.load(tmp_path / "xgb_model_20251117_2233.joblib")
+    np.testing.assert_allclose(preds, model.predict(df[lambda_infer.FEATURE_COLUMNS]), rtol=1e-5)
+
+    # the export verified for this model is served
+    (tmp_path / "xgb_model_20251117_2233.npz").write_bytes((models / "xgb_model_20251117_2233.npz").read_bytes())
+    assert lambda_infer.verified_compiled(tmp_path / "xgb_model_20251117_2233.joblib") is not None
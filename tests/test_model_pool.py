@@ -0,0 +1,78 @@
+from pathlib import Path
+
+import joblib
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api.app import app, FEATURE_COLUMNS
+from src.api.model_pool import ModelPool
+
+FEATURES_PATH = Path(__file__).resolve().parents[1] / "data" / "features" / "features.parquet"
+
+client = TestClient(app)
+
+
+def test_pool_resolves_family_and_evicts_cold_models(tmp_path):
+    for name in ["lr_model_20250101_0000", "lr_model_20250102_0000", "dt_model_20250101_0000"]:
+        joblib.dump(list(range(1000)), tmp_path / f"{name}.joblib")
+    size = (tmp_path / "dt_model_20250101_0000.joblib").stat().st_size
+    loads = []
+    pool = ModelPool(tmp_path, lambda path, name: loads.append(name) or name, budget_bytes=size)
+
+    assert pool.get("lr") == "lr_model_20250102_0000"
+    assert pool.get("lr_model_20250102_0000") == "lr_model_20250102_0000"
+    assert loads == ["lr_model_20250102_0000"]
+
+    pool.get("dt")
+    assert pool.is_loaded("dt_model_20250101_0000")
+    assert not pool.is_loaded("lr_model_20250102_0000")
+
+    with pytest.raises(KeyError):
+        pool.get("rf")
+    # no per-name load lock outlives its load
+    assert pool._load_locks == {}
+
+
+def test_loaded_models_skip_the_directory_scan(tmp_path, monkeypatch):
+    joblib.dump([0], tmp_path / "lr_model_20250101_0000.joblib")
+    pool = ModelPool(tmp_path, lambda path, name: name)
+    assert pool.get("lr") == "lr_model_20250101_0000"
+
+    scans = []
+    available = pool.available
+    monkeypatch.setattr(pool, "available", lambda segment=None: scans.append(segment) or available(segment))
+    assert pool.get("lr_model_20250101_0000") == "lr_model_20250101_0000"
+    assert pool.get("lr") == "lr_model_20250101_0000"
+    assert scans == []
+
+    # a new model in the directory is picked up by the family name
+    joblib.dump([0], tmp_path / "lr_model_20250102_0000.joblib")
+    assert pool.get("lr") == "lr_model_20250102_0000"
+
+
+def test_predict_with_challenger_model():
+    rows = pd.read_parquet(FEATURES_PATH)[FEATURE_COLUMNS].head(3).to_dict(orient="records")
+    res = client.post("/predict?model=xgb", json={"instances": rows})
+    assert res.status_code == 200
+    xgb_name = res.json()["model_name"]
+    assert xgb_name.startswith("xgb_model_")
+
+    res = client.post("/predict?model=nope", json={"instances": rows})
+    assert res.status_code == 404
+
+    listing = client.get("/models").json()
+    names = {m["model_name"]: m for m in listing["models"]}
+    assert names[listing["production"]]["production"] is True
+    assert names[xgb_name]["loaded"] is True
+
+
+def test_production_family_is_served_without_a_second_copy():
+    import src.api.app as app_module
+
+    production = app_module.serving.info["model_name"]
+    rows = pd.read_parquet(FEATURES_PATH)[FEATURE_COLUMNS].head(3).to_dict(orient="records")
+    res = client.post(f"/predict?model={production.split('_model_')[0]}", json={"instances": rows})
+    assert res.status_code == 200
+    assert res.json()["model_name"] == production
+    assert not app_module.model_pool.is_loaded(production)
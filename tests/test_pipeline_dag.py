@@ -0,0 +1,111 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from src.pipeline.dag import DagRunner, Stage, StageFailed
+from src.pipeline.run_pipeline import build_stages, run_command
+
+
+def write_cmd(path, text, sleep=0.0):
+    code = f"import time; time.sleep({sleep}); open({str(path)!r}, 'w').write({text!r})"
+    return [sys.executable, "-c", code]
+
+
+def make_stages(tmp_path, sleep=0.0):
+    source = tmp_path / "source.txt"
+    return [
+        Stage("a", write_cmd(tmp_path / "a.out", "a", sleep), inputs=[source], outputs=[tmp_path / "a.out"]),
+        Stage("b", write_cmd(tmp_path / "b.out", "b", sleep), outputs=[tmp_path / "b.out"]),
+        Stage("c", lambda outputs: write_cmd(tmp_path / "c.out", outputs["a"][0]),
+              deps=["a", "b"], outputs=lambda started_at, outputs: [tmp_path / "c.out"]),
+    ]
+
+
+def statuses(runner):
+    return {name: status for name, _, _, status in runner.timeline}
+
+
+def test_independent_stages_run_concurrently(tmp_path):
+    (tmp_path / "source.txt").write_text("v1")
+    runner = DagRunner(make_stages(tmp_path, sleep=1.0), run_command, workers=2, cache_dir=tmp_path / "cache")
+    start = time.perf_counter()
+    runner.run()
+    elapsed = time.perf_counter() - start
+
+    spans = {name: (lo, hi) for name, lo, hi, _ in runner.timeline}
+    assert spans["a"][0] < spans["b"][1] and spans["b"][0] < spans["a"][1]
+    assert spans["c"][0] >= max(spans["a"][1], spans["b"][1])
+    assert elapsed < 2.0 + 1.0
+    assert (tmp_path / "c.out").read_text() == str(tmp_path / "a.out")
+
+
+def test_unchanged_stages_are_skipped(tmp_path):
+    source = tmp_path / "source.txt"
+    source.write_text("v1")
+    cache = tmp_path / "cache"
+    DagRunner(make_stages(tmp_path), run_command, cache_dir=cache).run()
+
+    rerun = DagRunner(make_stages(tmp_path), run_command, cache_dir=cache)
+    rerun.run()
+    assert statuses(rerun) == {"a": "cached", "b": "cached", "c": "cached"}
+
+    # changed input: the stage and everything downstream of it run again
+    source.write_text("v2")
+    changed = DagRunner(make_stages(tmp_path), run_command, cache_dir=cache)
+    changed.run()
+    assert statuses(changed) == {"a": "ran", "b": "cached", "c": "ran"}
+
+    # a deleted output invalidates the stage that wrote it
+    (tmp_path / "b.out").unlink()
+    missing = DagRunner(make_stages(tmp_path), run_command, cache_dir=cache)
+    missing.run()
+    assert statuses(missing)["b"] == "ran"
+    assert (tmp_path / "b.out").exists()
+
+
+def test_stage_that_recorded_no_outputs_is_not_cached(tmp_path):
+    # e.g. a train run that exited 0 without writing a model
+    stages = lambda: [Stage("train", write_cmd(tmp_path / "log.txt", "x"), outputs=lambda started_at, _: [])]
+    DagRunner(stages(), run_command, cache_dir=tmp_path / "cache").run()
+    rerun = DagRunner(stages(), run_command, cache_dir=tmp_path / "cache")
+    rerun.run()
+    assert statuses(rerun) == {"train": "ran"}
+
+
+def test_failure_stops_downstream_stages(tmp_path):
+    stages = [
+        Stage("ok", write_cmd(tmp_path / "ok.out", "ok")),
+        Stage("bad", [sys.executable, "-c", "raise SystemExit(3)"]),
+        Stage("after", write_cmd(tmp_path / "after.out", "x"), deps=["ok", "bad"]),
+    ]
+    runner = DagRunner(stages, run_command, cache_dir=tmp_path / "cache")
+    with pytest.raises(StageFailed, match="bad"):
+        runner.run()
+    assert not (tmp_path / "after.out").exists()
+    # the failed stage records no cache entry, so the next run retries it
+    assert not (tmp_path / "cache" / "bad.json").exists()
+
+
+def test_unknown_dependency_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="unknown"):
+        DagRunner([Stage("a", ["true"], deps=["missing"])], run_command, cache_dir=tmp_path)
+
+
+def test_stage_inputs_cover_imported_src_modules(tmp_path):
+    script_dir = Path(__file__).resolve().parents[1] / "src" / "pipeline"
+    config = {"data": {"raw_path": "raw.csv", "features_path": "features.parquet", "test_path": "test.parquet"},
+              "models": ["xgb"]}
+    inputs = {s.name: {Path(p).relative_to(script_dir.parents[1]).as_posix() for p in s.inputs[1:]}
+              for s in build_stages(config, script_dir, tmp_path, tmp_path)}
+    shared = {"src/aws/storage.py", "src/pipeline/instrument.py"}
+    assert inputs["features"] == {"src/pipeline/features.py"} | shared
+    assert inputs["train:xgb"] >= {"src/pipeline/train.py", "src/pipeline/search.py",
+                                   "src/inference/tree_engine.py"} | shared
+    assert inputs["eval:xgb"] >= {"src/pipeline/eval.py"} | shared
+
+    config["pipeline"] = {"in_process": True}
+    train_eval = {s.name: s for s in build_stages(config, script_dir, tmp_path, tmp_path)}["train_eval"]
+    assert {Path(p).name for p in train_eval.inputs} >= {"train_all.py", "train.py", "eval.py", "search.py",
+                                                         "storage.py", "instrument.py", "tree_engine.py"}
@@ -0,0 +1,37 @@
+from unittest import mock
+
+import numpy as np
+
+from src.api.prediction_cache import PredictionCache
+
+
+def test_lookup_returns_only_misses():
+    cache = PredictionCache(max_entries=10, ttl_seconds=60)
+    X = np.arange(6, dtype=float).reshape(3, 2)
+    _, miss, keys = cache.lookup(X, "m1")
+    assert miss.all()
+    cache.store(keys[:2], [1.0, 2.0])
+
+    preds, miss, _ = cache.lookup(X, "m1")
+    assert miss.tolist() == [False, False, True]
+    assert preds[:2].tolist() == [1.0, 2.0]
+
+    # another model never sees these entries
+    _, miss, _ = cache.lookup(X, "m2")
+    assert miss.all()
+
+
+def test_lru_eviction_and_ttl():
+    cache = PredictionCache(max_entries=2, ttl_seconds=10)
+    rows = np.eye(3)
+    keys = cache._keys(rows, "m")
+    cache.store(keys[:2], [0.0, 1.0])
+    cache.lookup(rows[:1], "m")          # touch row 0 so row 1 is the LRU entry
+    cache.store(keys[2:], [2.0])
+    _, miss, _ = cache.lookup(rows, "m")
+    assert miss.tolist() == [False, True, False]
+
+    with mock.patch("src.api.prediction_cache.time.monotonic", return_value=1e12):
+        _, miss, _ = cache.lookup(rows, "m")
+    assert miss.all()
+    assert len(cache) == 0
@@ -0,0 +1,64 @@
+import json
+import os
+
+import pytest
+
+from src.pipeline.update_registry import ModelRegistry
+
+
+def _write_metrics(reports, name, mae):
+    path = reports / name / "metrics.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"model_path": f"C:\\models\\{name}.joblib", "test_data": "test.parquet",
+                                "mae": mae, "rmse": mae * 1.5, "r2": 0.5}))
+    return path
+
+
+@pytest.fixture
+def registry(tmp_path):
+    reg = ModelRegistry(tmp_path / "registry.db", tmp_path / "reports", tmp_path / "registry.json")
+    yield reg
+    reg.close()
+
+
+def test_update_ingests_incrementally_and_promotes_only_improvements(registry, tmp_path):
+    reports = tmp_path / "reports"
+    _write_metrics(reports, "dt_model", 20.0)
+    _write_metrics(reports, "lr_model", 25.0)
+    new_ids, promoted = registry.update()
+    assert len(new_ids) == 2 and promoted["model_name"] == "dt_model"
+    exported = json.loads((tmp_path / "registry.json").read_text())["production"]
+    assert exported["model_name"] == "dt_model" and exported["metrics"]["mae"] == 20.0
+
+    # nothing changed: nothing re-read, production kept
+    assert registry.update() == ([], None)
+
+    # a worse new run is recorded but not promoted; a better one is
+    _write_metrics(reports, "xgb_model", 30.0)
+    new_ids, promoted = registry.update()
+    assert len(new_ids) == 1 and promoted is None
+    path = _write_metrics(reports, "xgb_model", 10.0)
+    os.utime(path, ns=(1, 1))
+    new_ids, promoted = registry.update()
+    assert promoted["model_name"] == "xgb_model"
+    assert registry.production()["mae"] == 10.0
+    assert registry.conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0] == 3
+
+
+def test_promote_and_rollback(registry, tmp_path):
+    reports = tmp_path / "reports"
+    _write_metrics(reports, "dt_model", 20.0)
+    _write_metrics(reports, "lr_model", 25.0)
+    registry.update()
+
+    registry.promote("lr_model")
+    assert json.loads((tmp_path / "registry.json").read_text())["production"]["model_name"] == "lr_model"
+    assert registry.rollback()["model_name"] == "dt_model"
+    assert json.loads((tmp_path / "registry.json").read_text())["production"]["model_name"] == "dt_model"
+    assert [row["action"] for row in registry.history()] == ["promote", "promote", "rollback"]
+
+    # a failed promotion leaves production and the history untouched
+    with pytest.raises(KeyError):
+        registry.promote("missing_model")
+    assert registry.production()["model_name"] == "dt_model"
+    assert len(registry.history()) == 3
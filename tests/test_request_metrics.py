@@ -0,0 +1,73 @@
+import math
+from pathlib import Path
+
+import pandas as pd
+from fastapi.testclient import TestClient
+from prometheus_client import CollectorRegistry, generate_latest
+from prometheus_client.parser import text_string_to_metric_families
+
+import src.api.app as app_module
+from src.api.app import app, FEATURE_COLUMNS
+from src.api.request_metrics import PHASES, RequestMetrics
+
+FEATURES_PATH = Path(__file__).resolve().parents[1] / "data" / "features" / "features.parquet"
+
+client = TestClient(app)
+
+
+def _samples(text):
+    return {(s.name, tuple(sorted(s.labels.items()))): s.value
+            for family in text_string_to_metric_families(text) for s in family.samples}
+
+
+def test_collector_exports_cumulative_histograms():
+    metrics = RequestMetrics()
+    metrics.observe("predict", "dt", 16, (0.0002, 0.00003, 0.001, None, 0.0015))
+    metrics.observe("predict", "dt", 300, (0.0002, 0.00003, 0.2, None, 0.25))
+    registry = CollectorRegistry()
+    registry.register(metrics)
+    samples = _samples(generate_latest(registry).decode())
+
+    def phase(suffix, **labels):
+        labels = {"endpoint": "predict", "model_name": "dt", **labels}
+        return samples[(f"ev_request_phase_seconds_{suffix}", tuple(sorted(labels.items())))]
+
+    assert phase("bucket", phase="predict", le="0.001") == 1
+    assert phase("bucket", phase="predict", le="0.25") == 2
+    assert phase("bucket", phase="predict", le="+Inf") == 2
+    assert abs(phase("sum", phase="predict") - 0.201) < 1e-9
+    # a phase that was never observed is not exported
+    assert not any(dict(labels).get("phase") == "serialize" for _, labels in samples)
+    rows = (("endpoint", "predict"), ("model_name", "dt"))
+    assert samples[("ev_predicted_rows_total", rows)] == 316
+    assert samples[("ev_request_rows_bucket", tuple(sorted(rows + (("le", "16"),))))] == 1
+
+
+def test_predict_records_phases_rows_and_model_gauges():
+    model_name = app_module.serving.info["model_name"]
+    labels = (("endpoint", "predict"), ("model_name", model_name))
+    before = _samples(client.get("/metrics").text).get(("ev_predicted_rows_total", labels), 0)
+
+    rows = pd.read_parquet(FEATURES_PATH)[FEATURE_COLUMNS].head(7)
+    res = client.post("/predict", json={"instances": rows.to_dict(orient="records")})
+    assert res.status_code == 200 and len(res.json()["predictions"]) == 7
+
+    samples = _samples(client.get("/metrics").text)
+    assert samples[("ev_predicted_rows_total", labels)] == before + 7
+    for phase in PHASES:
+        key = ("ev_request_phase_seconds_count", tuple(sorted(dict(labels, phase=phase).items())))
+        assert samples[key] >= 1
+    assert samples[("ev_model_load_seconds", (("model_name", model_name),))] > 0
+    assert any(name == "ev_process_memory_bytes" and ("kind", "rss") in labels and value > 0
+               for (name, labels), value in samples.items())
+
+
+def test_memory_gauges_without_rss_probes(monkeypatch):
+    # Windows: no /proc and no `resource`
+    monkeypatch.setattr(app_module, "peak_rss", lambda: None)
+    monkeypatch.setattr(app_module, "open", lambda *a, **k: (_ for _ in ()).throw(OSError()), raising=False)
+    assert math.isnan(app_module.process_peak_rss()) and math.isnan(app_module.process_rss())
+    app_module.record_model_load("probe_model", 0.5, rss_before=0)
+    samples = _samples(client.get("/metrics").text)
+    assert samples[("ev_model_load_seconds", (("model_name", "probe_model"),))] == 0.5
+    assert ("ev_model_memory_bytes", (("model_name", "probe_model"),)) not in samples
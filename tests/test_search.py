@@ -0,0 +1,60 @@
+from pathlib import Path
+
+import mlflow
+import pandas as pd
+import pytest
+
+from src.pipeline import search
+from src.pipeline.train import holdout_mask
+
+FEATURES_PATH = Path(__file__).resolve().parents[1] / "data" / "features" / "features.parquet"
+
+
+@pytest.fixture(scope="module")
+def training_split():
+    df = pd.read_parquet(FEATURES_PATH)
+    train = df[~holdout_mask(df)]
+    return train.drop(columns=["total_kwh"]), train["total_kwh"]
+
+
+def test_rolling_origin_folds_expand_and_tile_the_end():
+    folds = search.rolling_origin_folds(5000, 4)
+    assert folds[-1][1] == 5000
+    for (train_end, val_end), (next_train_end, _) in zip(folds, folds[1:]):
+        assert val_end == next_train_end          # validation slices are adjacent, oldest first
+    assert all(val_end - train_end == search.FOLD_HOURS for train_end, val_end in folds)
+    # short series: slices shrink so the first fold still has as much training data as validation
+    short = search.rolling_origin_folds(600, 5)
+    assert short[0][0] >= short[0][1] - short[0][0]
+    with pytest.raises(ValueError):
+        search.rolling_origin_folds(100, 5)
+
+
+def test_successive_halving_prunes_and_scores_finalists_on_every_fold(training_split):
+    X, y = training_split
+    found = search.successive_halving("dt", X, y, n_folds=5, n_trials=9, workers=1)
+    assert len(found["trials"]) == 9
+    assert found["fits"] < 9 * 5
+    best = found["trials"][found["best"]]
+    assert sorted(best["folds"]) == list(range(5))
+    finalists = [t for t in found["trials"] if len(t["folds"]) == 5]
+    assert best["cv_mae"] == min(t["cv_mae"] for t in finalists)
+    summary = search.summary("dt", found)
+    assert summary["best_params"] == best["params"] and len(summary["folds"]) == 5
+
+
+def test_boosted_search_early_stops_and_logs_one_run_per_trial(training_split, tmp_path, monkeypatch):
+    monkeypatch.setenv("MLFLOW_ALLOW_FILE_STORE", "true")
+    X, y = training_split
+    found = search.successive_halving("xgb", X, y, n_folds=3, n_trials=3, workers=1)
+    best = found["trials"][found["best"]]
+    assert all(r["best_iteration"] < search.MAX_ROUNDS for r in best["folds"].values())
+    assert search.final_params("xgb", found)["n_estimators"] < search.MAX_ROUNDS
+
+    mlflow.set_tracking_uri((tmp_path / "mlruns").as_uri())
+    experiment_id = mlflow.set_experiment("search").experiment_id
+    with mlflow.start_run() as run:
+        search.log_trials(mlflow.tracking.MlflowClient(), run.info.run_id, experiment_id, "xgb", found)
+    trials = mlflow.search_runs([experiment_id], filter_string=f"tags.mlflow.parentRunId = '{run.info.run_id}'")
+    assert len(trials) == 3
+    assert trials["metrics.cv_mae"].notna().all()
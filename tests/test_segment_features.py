@@ -0,0 +1,66 @@
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api import app as app_module
+from src.api.app import app, FEATURE_COLUMNS
+from src.api.model_pool import ModelPool
+from src.pipeline import features
+
+ROOT = Path(__file__).resolve().parents[1]
+CLEAN_PATH = ROOT / "data" / "clean" / "clean.parquet"
+FEATURES_PATH = ROOT / "data" / "features" / "features.parquet"
+MODELS_DIR = ROOT / "src" / "models"
+
+
+def test_segment_partitions_match_single_series_build(tmp_path):
+    clean = pd.read_parquet(CLEAN_PATH)
+    written = features.segmented_engineering(clean, "garage_id", output_dir=tmp_path, workers=2)
+
+    assert set(written) == set(clean["garage_id"].unique())
+    for value, rows in written.items():
+        part_dir = tmp_path / f"garage_id={value}"
+        if not rows:
+            assert not part_dir.exists()
+            continue
+        sessions = clean[clean["garage_id"] == value]
+        expected, _ = features.build_features(features.hourly_aggregates(sessions), features.empty_state())
+        expected = expected.dropna().reset_index(drop=True)
+        pd.testing.assert_frame_equal(pd.read_parquet(part_dir), expected, check_exact=True)
+
+
+def test_pool_resolves_segment_models(tmp_path):
+    segment_dir = tmp_path / "segments" / "garage_id=Bl2"
+    segment_dir.mkdir(parents=True)
+    (tmp_path / "xgb_model_20250101_0000.joblib").write_bytes(b"global")
+    (segment_dir / "xgb_model_20250102_0000.joblib").write_bytes(b"segment")
+    pool = ModelPool(tmp_path, lambda path, name: (name, path.read_bytes()))
+
+    assert pool.get("xgb") == ("xgb_model_20250101_0000", b"global")
+    assert pool.get("xgb", "garage_id=Bl2") == ("garage_id=Bl2/xgb_model_20250102_0000", b"segment")
+    assert pool.segments() == ["garage_id=Bl2"]
+    for bad in ["garage_id=UT9", "../garage_id=Bl2", "garage_id"]:
+        with pytest.raises(KeyError):
+            pool.get("xgb", bad)
+
+
+def test_predict_with_segment_model(tmp_path, monkeypatch):
+    segment_dir = tmp_path / "segments" / "garage_id=Bl2"
+    segment_dir.mkdir(parents=True)
+    production = app_module.serving.info["model_name"]
+    shutil.copy(MODELS_DIR / f"{production}.joblib", segment_dir / f"{production}.joblib")
+    monkeypatch.setattr(app_module.model_pool, "models_dir", tmp_path)
+
+    client = TestClient(app)
+    rows = pd.read_parquet(FEATURES_PATH)[FEATURE_COLUMNS].head(3).to_dict(orient="records")
+    res = client.post("/predict?segment=garage_id=Bl2", json={"instances": rows})
+    assert res.status_code == 200
+    assert res.json()["model_name"] == f"garage_id=Bl2/{production}"
+
+    assert client.post("/predict?segment=garage_id=UT9", json={"instances": rows}).status_code == 404
+    listing = client.get("/models?segment=garage_id=Bl2").json()
+    assert listing["segments"] == ["garage_id=Bl2"]
+    assert [m["model_name"] for m in listing["models"]] == [f"garage_id=Bl2/{production}"]
@@ -0,0 +1,107 @@
+import hashlib
+import io
+import os
+
+import pandas as pd
+import pytest
+from botocore.exceptions import ClientError
+
+from src.aws import storage
+
+FEATURES_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "features", "features.parquet")
+
+
+class FakeS3:
+    """In-memory stand-in for the S3 calls storage.py makes."""
+
+    def __init__(self):
+        self.objects, self.gets, self.heads = {}, [], 0
+
+    def put(self, key, data):
+        self.objects[key] = (data, f'"{hashlib.md5(data).hexdigest()}"')
+
+    def head_object(self, Bucket, Key):
+        self.heads += 1
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        data, etag = self.objects[Key]
+        return {"ETag": etag, "ContentLength": len(data)}
+
+    def get_object(self, Bucket, Key, Range, IfMatch):
+        data, etag = self.objects[Key]
+        assert IfMatch == etag
+        start, end = map(int, Range.removeprefix("bytes=").split("-"))
+        self.gets.append((Key, start, end))
+        return {"Body": io.BytesIO(data[start:end + 1])}
+
+    def list_objects_v2(self, Bucket, Prefix, ContinuationToken=None):
+        keys = sorted(k for k in self.objects if k.startswith(Prefix))
+        # two keys per page, to exercise the continuation
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + 2]
+        result = {"Contents": [{"Key": k, "ETag": self.objects[k][1], "Size": len(self.objects[k][0])} for k in page],
+                  "IsTruncated": start + 2 < len(keys)}
+        if result["IsTruncated"]:
+            result["NextContinuationToken"] = str(start + 2)
+        return result
+
+
+@pytest.fixture
+def fake(tmp_path, monkeypatch):
+    fake = FakeS3()
+    monkeypatch.setattr(storage, "_client", fake)
+    monkeypatch.setattr(storage, "_read_cache", storage.ReadCache(tmp_path / "cache", max_bytes=10 ** 9))
+    return fake
+
+
+def test_reads_are_cached_until_the_etag_changes(fake):
+    fake.put("a.bin", b"x" * 1000)
+    first = storage.fetch("s3://ev-data/a.bin")
+    assert first.read_bytes() == b"x" * 1000 and len(fake.gets) == 1
+    assert storage.fetch("s3://ev-data/a.bin") == first
+    assert len(fake.gets) == 1                     # served from disk, only a HEAD was made
+
+    fake.put("a.bin", b"y" * 10)
+    second = storage.fetch("s3://ev-data/a.bin")
+    assert second.read_bytes() == b"y" * 10 and len(fake.gets) == 2
+    assert not first.exists()                      # the old version is dropped
+
+
+def test_large_objects_download_as_parallel_ranges(fake, monkeypatch):
+    monkeypatch.setattr(storage, "DOWNLOAD_PART_SIZE", 1000)
+    data = os.urandom(4500)
+    fake.put("big.bin", data)
+    assert storage.fetch("s3://ev-data/big.bin").read_bytes() == data
+    assert sorted(start for _, start, _ in fake.gets) == [0, 1000, 2000, 3000, 4000]
+
+
+def test_cache_evicts_least_recently_used(fake, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_read_cache", storage.ReadCache(tmp_path / "small", max_bytes=2500))
+    for name in "abc":
+        fake.put(f"{name}.bin", name.encode() * 1000)
+    a = storage.fetch("s3://ev-data/a.bin")
+    b = storage.fetch("s3://ev-data/b.bin")
+    os.utime(a, (1, 1))
+    os.utime(b, (2, 2))
+    storage.fetch("s3://ev-data/a.bin")            # a is used again: b is now the oldest
+    storage.fetch("s3://ev-data/c.bin")
+    assert a.exists() and not b.exists()
+    assert sum(p.stat().st_size for p in storage.read_cache().entries()) <= 2500
+
+
+def test_prefix_reads_like_a_dataset_directory(fake, tmp_path):
+    df = pd.read_parquet(FEATURES_PATH)
+    for i, part in enumerate([df.iloc[:1000], df.iloc[1000:2000], df.iloc[2000:]]):
+        buf = io.BytesIO()
+        part.to_parquet(buf, index=False)
+        fake.put(f"parquets/features/2024-0{i + 1}/part-{i}.parquet", buf.getvalue())
+    fake.put("parquets/features/_manifest.json", b"{}")
+
+    result = storage.read_parquet("s3://ev-data/parquets/features/")
+    pd.testing.assert_frame_equal(result, df.reset_index(drop=True))
+    gets = len(fake.gets)
+    # unchanged listing: same view, nothing downloaded; without the slash it is the same prefix
+    assert storage.fetch("s3://ev-data/parquets/features") == storage.fetch("s3://ev-data/parquets/features/")
+    assert len(fake.gets) == gets
+    with pytest.raises(FileNotFoundError):
+        storage.fetch("s3://ev-data/missing/")
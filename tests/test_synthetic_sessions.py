@@ -0,0 +1,17 @@
+import pandas as pd
+
+import benchmarks.synthetic_sessions as synthetic
+
+
+def test_write_csv_in_chunks_reads_back_like_the_export(tmp_path, monkeypatch):
+    monkeypatch.setattr(synthetic, "CHUNK_ROWS", 1000)
+    path = tmp_path / "sessions.csv"
+    synthetic.write_csv(path, 2500, missing_rate=0.05)
+
+    df = pd.read_csv(path, sep=";", decimal=",")
+    assert list(df.columns) == list(synthetic.make_sessions(1).columns)
+    assert df["session_ID"].tolist() == list(range(1, 2501))
+    missing = df["End_plugout"].isna()
+    assert 0 < missing.sum() < len(df)
+    assert df.loc[missing, ["End_plugout_hour", "Duration_hours", "Duration_category"]].isna().all().all()
+    assert pd.to_datetime(df["Start_plugin"], format="%d.%m.%Y %H:%M").notna().all()
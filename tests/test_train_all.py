@@ -0,0 +1,63 @@
+from argparse import Namespace
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import mean_absolute_error
+
+from src.pipeline import train_all
+from src.pipeline.train import build_model, holdout_mask
+
+FEATURES_PATH = Path(__file__).resolve().parents[1] / "data" / "features" / "features.parquet"
+
+
+def test_feature_matrix_is_one_float32_block():
+    df = pd.read_parquet(FEATURES_PATH)
+    X, y, columns = train_all.feature_matrix(df)
+    assert X.dtype == np.float32 and X.flags.c_contiguous
+    assert X.shape == (len(df), len(df.columns) - 1) and "total_kwh" not in columns
+    np.testing.assert_array_equal(y, df["total_kwh"].to_numpy())
+    # the per-model frames are views over the shared rows
+    view = pd.DataFrame(X[:10], columns=columns, copy=False)
+    assert np.shares_memory(view.to_numpy(), X)
+
+
+def test_shared_arrays_round_trip():
+    arrays = {"X": np.arange(12, dtype=np.float32).reshape(4, 3), "y": np.linspace(0, 1, 4)}
+    blocks, specs = train_all.share(arrays)
+    try:
+        attached_blocks, attached = train_all.attach(specs)
+        for key, array in arrays.items():
+            np.testing.assert_array_equal(attached[key], array)
+        # the mapping is the shared block itself, not a copy
+        attached["y"][0] = 5.0
+        assert np.ndarray((4,), np.float64, buffer=blocks[1].buf)[0] == 5.0
+        del attached
+        for block in attached_blocks:
+            block.close()
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def test_train_all_matches_the_per_model_split(tmp_path, monkeypatch):
+    monkeypatch.setenv("MLFLOW_ALLOW_FILE_STORE", "true")
+    args = Namespace(input=str(FEATURES_PATH), test_data=None, models=["lr", "dt"],
+                     output=str(tmp_path / "models"), reports_dir=str(tmp_path / "reports"),
+                     mlflow_uri=(tmp_path / "mlruns").as_uri(), experiment="ev", eval_experiment="evaluations",
+                     bucket="ev-data", no_upload=True, workers=1)
+    results = train_all.train_all(args)
+
+    df = pd.read_parquet(FEATURES_PATH)
+    is_test = holdout_mask(df)
+    X, y = df.drop(columns=["total_kwh"]), df["total_kwh"]
+    for name in args.models:
+        model_path, metrics, _ = results[name]
+        assert Path(model_path).exists() and Path(model_path).with_suffix(".npz").exists()
+        assert (tmp_path / "reports" / Path(model_path).stem / "metrics.json").exists()
+        # same split as train.py; float32 features only move the metric in the last digits
+        reference = build_model(name).fit(X[~is_test], y[~is_test])
+        expected = mean_absolute_error(y[is_test], reference.predict(X[is_test]))
+        assert metrics["mae"] == pytest.approx(expected, rel=1e-4)
@@ -0,0 +1,61 @@
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from lightgbm import LGBMRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.tree import DecisionTreeRegressor
+from xgboost import XGBRegressor
+
+from src.inference.tree_engine import CompiledModel, compile_model, export_matches, export_model, load_compiled
+
+rng = np.random.default_rng(0)
+X = pd.DataFrame(rng.normal(size=(500, 5)), columns=[f"c{i}" for i in range(5)])
+y = X["c0"] * 3 + np.sin(X["c1"] * 2) + rng.normal(scale=0.1, size=len(X))
+
+MODELS = {
+    "lr": lambda: LinearRegression(),
+    "dt": lambda: DecisionTreeRegressor(max_depth=6, random_state=0),
+    "xgb": lambda: XGBRegressor(n_estimators=50, max_depth=4, verbosity=0, random_state=0),
+    "lgb": lambda: LGBMRegressor(n_estimators=50, learning_rate=0.1, verbose=-1, random_state=0),
+}
+
+
+@pytest.mark.parametrize("name", MODELS)
+def test_compiled_predictions_match(name):
+    model = MODELS[name]().fit(X, y)
+    compiled = compile_model(model)
+    np.testing.assert_allclose(compiled.predict(X), model.predict(X), rtol=1e-5, atol=1e-5)
+    np.testing.assert_allclose(compiled.predict(X.to_numpy()), model.predict(X), rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize("name", ["xgb", "lgb"])
+def test_missing_values_follow_default_direction(name):
+    X_nan = X.copy()
+    X_nan.iloc[::3, 0] = np.nan
+    model = MODELS[name]().fit(X_nan, y)
+    X_check = X.copy()
+    X_check.iloc[::4, 0] = np.nan
+    np.testing.assert_allclose(compile_model(model).predict(X_check), model.predict(X_check),
+                               rtol=1e-5, atol=1e-5)
+
+
+def test_export_roundtrip(tmp_path):
+    model = MODELS["xgb"]().fit(X, y)
+    model_path = tmp_path / "xgb_model_20250101_0000.joblib"
+    joblib.dump(model, model_path)
+    out = export_model(model, model_path, X_check=X)
+    assert out == tmp_path / "xgb_model_20250101_0000.npz"
+
+    loaded = load_compiled(model_path)
+    assert isinstance(loaded, CompiledModel)
+    assert loaded.feature_names == list(X.columns)
+    assert not loaded.nodes.flags.writeable    # mapped from the file
+    np.testing.assert_allclose(loaded.predict(X), model.predict(X), rtol=1e-5, atol=1e-5)
+    np.testing.assert_array_equal(loaded.predict(X), CompiledModel.load(out).predict(X))
+    assert load_compiled(tmp_path / "missing.joblib") is None
+
+    # the export vouches for this joblib only
+    assert export_matches(loaded, model_path)
+    joblib.dump(MODELS["xgb"]().fit(X, y * 2), model_path)
+    assert not export_matches(loaded, model_path)